@@ -0,0 +1,107 @@
+"""
+Run a view's independent queries concurrently.
+
+    results = gather({
+        "metrics": get_dashboard_metrics,
+        "feed": lambda: activity_log.feed(before=cursor),
+    }, defaults={"feed": ([], None)})
+
+Each callable runs on a process-wide pool of QUERY_FANOUT_WORKERS threads
+that share the MongoClient connection pool, so the view waits roughly as
+long as its slowest query instead of the sum of all of them.
+
+Every query gets QUERY_FANOUT_TIMEOUT seconds (or its own value from
+`timeouts`). It runs under pymongo.timeout(), so the driver also gives up
+on the server side. A query that raises or runs out of time is printed and
+replaced by its entry in `defaults` (None if there is none); the other
+results are still returned.
+
+Keep the pool well below MONGO_MAX_POOL_SIZE: its threads hold connections
+alongside the request threads.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import pymongo
+from django.conf import settings
+
+_lock = threading.Lock()
+_executor = None
+_executor_pid = None
+_local = threading.local()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _get_executor():
+    """The process-wide pool, created on first use (and again after a fork)."""
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is not None and _executor_pid == pid:
+        return _executor
+    with _lock:
+        if _executor is None or _executor_pid != pid:
+            # Threads of the parent's pool do not exist in a forked child
+            _executor = ThreadPoolExecutor(
+                max_workers=_setting("QUERY_FANOUT_WORKERS", 8),
+                thread_name_prefix="query-fanout",
+            )
+            _executor_pid = pid
+    return _executor
+
+
+def _run(fn, timeout):
+    _local.in_pool = True
+    try:
+        with pymongo.timeout(timeout):
+            return fn()
+    finally:
+        _local.in_pool = False
+
+
+def gather(tasks, defaults=None, timeout=None, timeouts=None):
+    """
+    Run the callables of `tasks` ({name: callable}) concurrently and return
+    {name: result}. Failed or timed out queries get their default.
+    """
+    defaults = defaults or {}
+    timeouts = timeouts or {}
+    if timeout is None:
+        timeout = _setting("QUERY_FANOUT_TIMEOUT", 5)
+    limits = {name: timeouts.get(name, timeout) for name in tasks}
+
+    # A task that fans out itself runs its queries inline: waiting on the
+    # same bounded pool from inside it could deadlock.
+    if getattr(_local, "in_pool", False) or len(tasks) < 2:
+        results = {}
+        for name, fn in tasks.items():
+            try:
+                with pymongo.timeout(limits[name]):
+                    results[name] = fn()
+            except Exception as e:
+                print(f"Query '{name}' failed: {e}")
+                results[name] = defaults.get(name)
+        return results
+
+    executor = _get_executor()
+    started = time.monotonic()
+    futures = {name: executor.submit(_run, fn, limits[name]) for name, fn in tasks.items()}
+
+    results = {}
+    for name, future in futures.items():
+        remaining = max(0, limits[name] - (time.monotonic() - started))
+        try:
+            results[name] = future.result(timeout=remaining)
+        except TimeoutError:
+            future.cancel()
+            print(f"Query '{name}' timed out after {limits[name]}s")
+            results[name] = defaults.get(name)
+        except Exception as e:
+            print(f"Query '{name}' failed: {e}")
+            results[name] = defaults.get(name)
+    return results
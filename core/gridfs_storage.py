@@ -0,0 +1,112 @@
+"""
+Django file storage on GridFS in the project database.
+
+With MEDIA_STORAGE = 'gridfs' every upload (photos, image variants,
+course files) is kept in the `<GRIDFS_BUCKET>.files`/`.chunks`
+collections instead of MEDIA_ROOT, so any number of app nodes share the
+same media through MongoDB. Files keep their MEDIA_ROOT-style names
+("course_photos/3f/3fa9...c1.jpg") as the GridFS filename; the media
+views (core.views.serve_media, courses.downloads) stream them back.
+
+`manage.py migrate_media` copies existing files between MEDIA_ROOT and
+GridFS.
+"""
+
+import datetime
+import mimetypes
+import re
+
+import gridfs
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.storage import Storage
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+from django.utils.encoding import filepath_to_uri
+
+from core.mongo import get_db
+
+
+@deconstructible
+class GridFSStorage(Storage):
+    def __init__(self, bucket_name=None, base_url=None, chunk_size=None):
+        self.bucket_name = bucket_name or getattr(settings, "GRIDFS_BUCKET", "media")
+        self.base_url = base_url if base_url is not None else settings.MEDIA_URL
+        self.chunk_size = chunk_size or getattr(settings, "GRIDFS_CHUNK_SIZE", 255 * 1024)
+
+    @property
+    def bucket(self):
+        # Built on every use so it always sits on this process's client (core.mongo)
+        return gridfs.GridFSBucket(get_db(), self.bucket_name, chunk_size_bytes=self.chunk_size)
+
+    @property
+    def files(self):
+        return get_db()[f"{self.bucket_name}.files"]
+
+    def _latest(self, name, projection=None):
+        return self.files.find_one({"filename": name}, projection, sort=[("uploadDate", -1)])
+
+    def _open(self, name, mode="rb"):
+        if "w" in mode or "a" in mode or "+" in mode:
+            raise ValueError("GridFS files are read-only; save a new file instead.")
+        try:
+            return File(self.bucket.open_download_stream_by_name(name), name)
+        except gridfs.errors.NoFile:
+            raise FileNotFoundError(f"No such file in GridFS: {name}")
+
+    def _save(self, name, content):
+        if hasattr(content, "seek") and getattr(content, "seekable", lambda: True)():
+            content.seek(0)
+        content_type = getattr(content, "content_type", None) or mimetypes.guess_type(name)[0]
+        self.bucket.upload_from_stream(name, content, metadata={"contentType": content_type})
+        # Keep one revision per name (a rebuilt image variant replaces the old one)
+        latest = self._latest(name, {"_id": 1})
+        for old in self.files.find({"filename": name, "_id": {"$ne": latest["_id"]}}, {"_id": 1}):
+            self._delete_id(old["_id"])
+        return name
+
+    def _delete_id(self, file_id):
+        try:
+            self.bucket.delete(file_id)
+        except gridfs.errors.NoFile:
+            pass  # Deleted concurrently
+
+    def delete(self, name):
+        for doc in self.files.find({"filename": name}, {"_id": 1}):
+            self._delete_id(doc["_id"])
+
+    def exists(self, name):
+        return self.files.count_documents({"filename": name}, limit=1) > 0
+
+    def listdir(self, path):
+        prefix = path.strip("/") + "/" if path.strip("/") else ""
+        directories, files = set(), set()
+        names = self.files.distinct("filename", {"filename": {"$regex": f"^{re.escape(prefix)}"}})
+        for name in names:
+            rest = name[len(prefix):]
+            if "/" in rest:
+                directories.add(rest.split("/", 1)[0])
+            else:
+                files.add(rest)
+        return sorted(directories), sorted(files)
+
+    def size(self, name):
+        doc = self._latest(name, {"length": 1})
+        if doc is None:
+            raise FileNotFoundError(f"No such file in GridFS: {name}")
+        return doc["length"]
+
+    def url(self, name):
+        return self.base_url + filepath_to_uri(name).lstrip("/")
+
+    def get_modified_time(self, name):
+        doc = self._latest(name, {"uploadDate": 1})
+        if doc is None:
+            raise FileNotFoundError(f"No such file in GridFS: {name}")
+        modified = doc["uploadDate"]
+        if modified.tzinfo is None:
+            modified = modified.replace(tzinfo=datetime.timezone.utc)
+        return modified if settings.USE_TZ else timezone.make_naive(modified)
+
+    get_created_time = get_modified_time
+    get_accessed_time = get_modified_time
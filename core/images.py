@@ -0,0 +1,156 @@
+"""
+Thumbnails and WebP variants of uploaded photos.
+
+When a course photo or profile photo is uploaded, make_variants() writes
+next to the original (in a `variants/` subfolder):
+
+    thumb       fixed-size JPEG crop for cards and avatars (IMAGE_THUMBNAIL_SIZES)
+    thumb_webp  the same crop as WebP
+    webp        the whole image as WebP, at most IMAGE_WEBP_MAX_SIZE pixels
+
+and record_variants() stores their MEDIA_ROOT-relative paths on the
+document, together with the original they were made from:
+
+    course["course_photo_variants"] = {"source": "course_photos/x.jpg",
+                                       "thumb": ..., "thumb_webp": ..., "webp": ...}
+
+List pages use variant() and fall back to the original while a document
+has no (or outdated) variants. `manage.py build_image_variants` processes
+photos uploaded before this existed.
+"""
+
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from core.mongo import db
+
+VARIANTS_SUFFIX = "_variants"
+VARIANTS_DIR = "variants"
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def thumbnail_size(kind):
+    sizes = _setting("IMAGE_THUMBNAIL_SIZES", {"course": (480, 320), "profile": (160, 160)})
+    return tuple(sizes.get(kind, (320, 320)))
+
+
+def _variant_path(rel_path, name, ext):
+    folder, filename = os.path.split(rel_path)
+    stem = os.path.splitext(filename)[0]
+    return "/".join(p for p in (folder, VARIANTS_DIR, f"{stem}_{name}.{ext}") if p)
+
+
+def _rgb(img):
+    if img.mode in ("RGBA", "LA", "P"):
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[-1])
+        return background
+    return img.convert("RGB")
+
+
+def variant_paths(rel_path):
+    """Paths make_variants() writes for the photo at `rel_path`."""
+    return [
+        _variant_path(rel_path, "thumb", "jpg"),
+        _variant_path(rel_path, "thumb", "webp"),
+        _variant_path(rel_path, "full", "webp"),
+    ]
+
+
+def _store(img, rel_path, fmt, **options):
+    buffer = io.BytesIO()
+    img.save(buffer, fmt, **options)
+    default_storage.delete(rel_path)  # Rebuilt variants keep their name
+    default_storage.save(rel_path, ContentFile(buffer.getvalue()))
+
+
+def make_variants(rel_path, kind, force=False):
+    """
+    Write the variants of the photo `rel_path` (a default_storage name).
+    Returns {"source", "thumb", "thumb_webp", "webp"}, or None when the
+    file is missing or not an image.
+    """
+    if not rel_path or not default_storage.exists(rel_path):
+        return None
+    quality = _setting("IMAGE_VARIANT_QUALITY", 80)
+    variants = dict(zip(("thumb", "thumb_webp", "webp"), variant_paths(rel_path)), source=rel_path)
+    if not force and all(default_storage.exists(variants[name]) for name in ("thumb", "thumb_webp", "webp")):
+        # Same content as an earlier upload (core.media_store names files by hash)
+        return variants
+    try:
+        with default_storage.open(rel_path, "rb") as source, Image.open(source) as original:
+            # Respect the camera orientation before resizing
+            img = ImageOps.exif_transpose(original)
+
+            thumb = ImageOps.fit(_rgb(img), thumbnail_size(kind), Image.LANCZOS)
+            _store(thumb, variants["thumb"], "JPEG", quality=quality, optimize=True, progressive=True)
+            _store(thumb, variants["thumb_webp"], "WEBP", quality=quality, method=6)
+
+            full = img.convert("RGBA") if img.mode in ("RGBA", "LA", "P") else img.convert("RGB")
+            full.thumbnail(_setting("IMAGE_WEBP_MAX_SIZE", (1600, 1600)), Image.LANCZOS)
+            _store(full, variants["webp"], "WEBP", quality=quality, method=6)
+    except Exception as e:
+        print(f"Error creating image variants for {rel_path}: {e}")
+        delete_variants(variants)
+        return None
+    return variants
+
+
+def record_variants(collection, doc_id, field, rel_path, kind):
+    """Make the variants of a freshly saved photo and store their paths on the document."""
+    variants = make_variants(rel_path, kind)
+    if variants:
+        db[collection].update_one(
+            {"_id": doc_id, field: rel_path},  # Skip if the photo was replaced meanwhile
+            {"$set": {field + VARIANTS_SUFFIX: variants}},
+        )
+    return variants
+
+
+def variant(doc, field, name="thumb"):
+    """Path of a variant of the document's photo, or the original if it has none yet."""
+    original = doc.get(field)
+    variants = doc.get(field + VARIANTS_SUFFIX) or {}
+    if original and variants.get("source") == original and variants.get(name):
+        return variants[name]
+    return original if name in ("thumb", "webp") else None
+
+
+def delete_variants(variants):
+    """Remove variant files (not the original) from storage."""
+    for name, rel_path in (variants or {}).items():
+        if name != "source" and rel_path:
+            default_storage.delete(rel_path)
+
+
+def build_missing(collection, field, kind, query=None, force=False):
+    """Make variants for documents whose photo has none or outdated ones. Returns (processed, failed)."""
+    processed = failed = 0
+    query = dict(query or {})
+    query[field] = {"$nin": [None, ""]}
+    made = {}  # Default photos are shared by many documents; process each file once
+    for doc in db[collection].find(query, {field: 1, field + VARIANTS_SUFFIX: 1}):
+        current = doc.get(field + VARIANTS_SUFFIX) or {}
+        if not force and current.get("source") == doc[field]:
+            continue
+        if doc[field] not in made:
+            made[doc[field]] = make_variants(doc[field], kind, force=force)
+        variants = made[doc[field]]
+        if variants:
+            db[collection].update_one(
+                {"_id": doc["_id"], field: doc[field]},
+                {"$set": {field + VARIANTS_SUFFIX: variants}},
+            )
+            processed += 1
+        else:
+            failed += 1
+    return processed, failed
@@ -0,0 +1,28 @@
+"""MongoDB indexes owned by the core app (see `manage.py ensure_mongo_indexes`)."""
+
+INDEXES = {
+    "sessions": [
+        # Same name/options as core.session_backend.ensure_ttl_index()
+        {"keys": [("expire_at", 1)], "name": "expire_at_ttl", "expireAfterSeconds": 0},
+    ],
+    "email_outbox": [
+        # Claim queries in core.outbox.claim_batch()
+        {"keys": [("status", 1), ("next_attempt_at", 1)], "name": "status_next_attempt_at"},
+        {"keys": [("status", 1), ("lease_until", 1)], "name": "status_lease_until"},
+        # Emails queued by a background job are queued once (enqueue_mass_mail keys)
+        {"keys": [("key", 1)], "name": "key_unique", "unique": True, "sparse": True},
+    ],
+    "jobs": [
+        # One queued/running job per key (core.jobs.enqueue_job)
+        {"keys": [("active_key", 1)], "name": "active_key_unique", "unique": True, "sparse": True},
+        # Claim query in core.jobs.claim_job()
+        {"keys": [("status", 1), ("next_attempt_at", 1)], "name": "status_next_attempt_at"},
+        {"keys": [("status", 1), ("lease_until", 1)], "name": "status_lease_until"},
+        # Finished jobs are kept a week for their progress pages
+        {"keys": [("finished_at", 1)], "name": "finished_at_ttl", "expireAfterSeconds": 7 * 24 * 3600},
+    ],
+    "media_refs": [
+        # Released files for core.media_store.collect_garbage()
+        {"keys": [("refs", 1), ("released_at", 1)], "name": "refs_released_at"},
+    ],
+}
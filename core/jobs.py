@@ -0,0 +1,197 @@
+"""
+Background jobs for work that fans out over many documents.
+
+A view calls enqueue_job() and returns straight away; the
+`manage.py run_jobs` worker claims queued jobs from the `jobs` collection
+and runs their handler (HANDLERS, dotted paths resolved on first use):
+
+    {"_id", "kind", "params": {...}, "key": "ban_instructor:<id>",
+     "status": "queued" | "running" | "done" | "failed",
+     "progress": {"done": n, "total": n}, "state": {...handler cursor...},
+     "attempts", "lease_until", "next_attempt_at", "last_error", ...}
+
+Handlers work in batches and call checkpoint() after each one, which
+saves their cursor and progress and extends the lease. A job whose worker
+died is claimed again once its lease expires and resumes from the last
+checkpoint; a job that raised is retried with backoff up to
+JOB_MAX_ATTEMPTS. Each claim gets a new `lease_id`, and checkpoint() and
+the final status update only apply while the job still carries it, so a
+worker that was too slow and lost its lease stops at its next checkpoint
+(LeaseLost) instead of writing over the worker that took over. Handlers
+must still be safe to run again from a checkpoint, including one batch
+run by both workers (see courses.cascades).
+
+`key` makes enqueueing idempotent: while a job with the same key is queued
+or running (`active_key` is set), enqueue_job() returns that job instead of
+adding another, so a double-submitted form doesn't run a cascade twice.
+"""
+
+import datetime
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from core.mongo import db
+
+JOBS_COLLECTION = "jobs"
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+HANDLERS = {
+    "ban_instructor": "courses.cascades.ban_instructor",
+    "course_deleted": "courses.cascades.course_deleted",
+}
+
+
+class LeaseLost(Exception):
+    """The job was taken over by another worker after this one's lease expired."""
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _lease_until():
+    return datetime.datetime.utcnow() + datetime.timedelta(seconds=_setting("JOB_LEASE_SECONDS", 300))
+
+
+def enqueue_job(kind, params, key=None):
+    """Queue a job (or return the queued/running one with the same key). Returns the job document."""
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    now = datetime.datetime.utcnow()
+    job = {
+        "kind": kind,
+        "params": params,
+        "key": key,
+        "status": QUEUED,
+        "progress": {"done": 0, "total": None},
+        "state": {},
+        "attempts": 0,
+        "created_at": now,
+        "updated_at": now,
+        "next_attempt_at": now,
+        "last_error": None,
+    }
+    if key is None:
+        job["_id"] = db[JOBS_COLLECTION].insert_one(job).inserted_id
+        return job
+    try:
+        return db[JOBS_COLLECTION].find_one_and_update(
+            {"active_key": key},
+            {"$setOnInsert": job},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # Inserted concurrently by another request (unique index on active_key)
+        return db[JOBS_COLLECTION].find_one({"active_key": key})
+
+
+def get_job(job_id):
+    return db[JOBS_COLLECTION].find_one({"_id": job_id})
+
+
+def progress(job):
+    """JSON-friendly status of a job for polling pages."""
+    done, total = job["progress"]["done"], job["progress"]["total"]
+    return {
+        "job_id": str(job["_id"]),
+        "kind": job["kind"],
+        "status": job["status"],
+        "done": done,
+        "total": total,
+        "percent": 100 if job["status"] == DONE else (int(done * 100 / total) if total else 0),
+        "error": job.get("last_error"),
+    }
+
+
+def claim_job():
+    """Move the next due job to "running" (or take over one whose lease expired)."""
+    now = datetime.datetime.utcnow()
+    return db[JOBS_COLLECTION].find_one_and_update(
+        {"$or": [
+            {"status": QUEUED, "next_attempt_at": {"$lte": now}},
+            {"status": RUNNING, "lease_until": {"$lte": now}},
+        ]},
+        {"$set": {"status": RUNNING, "lease_id": ObjectId(), "lease_until": _lease_until(), "updated_at": now},
+         "$inc": {"attempts": 1}},
+        sort=[("next_attempt_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def _held(job):
+    # Matches the job only while this worker's claim is current
+    return {"_id": job["_id"], "lease_id": job["lease_id"]}
+
+
+def checkpoint(job, state, done, total=None):
+    """Save a handler's cursor and progress and extend the lease. Raises LeaseLost if it was taken over."""
+    update = {
+        "state": state,
+        "progress.done": done,
+        "lease_until": _lease_until(),
+        "updated_at": datetime.datetime.utcnow(),
+    }
+    if total is not None:
+        update["progress.total"] = total
+        job["progress"]["total"] = total
+    if not db[JOBS_COLLECTION].update_one(_held(job), {"$set": update}).matched_count:
+        raise LeaseLost(f"Job {job['_id']} was taken over by another worker")
+    job["state"] = state
+    job["progress"]["done"] = done
+
+
+def _finish(job, status, **fields):
+    fields.update({"status": status, "updated_at": datetime.datetime.utcnow()})
+    db[JOBS_COLLECTION].update_one(
+        _held(job), {"$set": fields, "$unset": {"lease_id": "", "lease_until": "", "active_key": ""}}
+    )
+
+
+def run_job(job):
+    """Run a claimed job's handler and record the outcome. Returns the new status (None if taken over)."""
+    try:
+        import_string(HANDLERS[job["kind"]])(job)
+    except LeaseLost as e:
+        print(e)
+        return None
+    except Exception as e:
+        print(f"Job {job['_id']} ({job['kind']}) failed: {e}")
+        if job["attempts"] >= _setting("JOB_MAX_ATTEMPTS", 5):
+            _finish(job, FAILED, finished_at=datetime.datetime.utcnow(), last_error=str(e)[:500])
+            return FAILED
+        base = _setting("JOB_RETRY_BASE_SECONDS", 30)
+        delay = min(_setting("JOB_RETRY_MAX_SECONDS", 3600), base * 2 ** (job["attempts"] - 1))
+        db[JOBS_COLLECTION].update_one(_held(job), {
+            "$set": {
+                "status": QUEUED,
+                "last_error": str(e)[:500],
+                "next_attempt_at": datetime.datetime.utcnow() + datetime.timedelta(seconds=delay),
+            },
+            "$unset": {"lease_id": "", "lease_until": ""},
+        })
+        return QUEUED
+    _finish(job, DONE, finished_at=datetime.datetime.utcnow(), last_error=None,
+            **{"progress.total": job["progress"]["total"] or job["progress"]["done"]})
+    return DONE
+
+
+def process_jobs(limit=None):
+    """Claim and run due jobs until none are left (or `limit` ran). Returns {status: count}."""
+    counts = {DONE: 0, QUEUED: 0, FAILED: 0}
+    while limit is None or sum(counts.values()) < limit:
+        job = claim_job()
+        if job is None:
+            break
+        status = run_job(job)
+        if status:
+            counts[status] += 1
+    return counts
@@ -0,0 +1,76 @@
+"""
+Keyset ("load more") pagination on a (field, _id) sort.
+
+Pages are sorted descending on (field, _id) and the cursor for the next
+page is the position of the last row shown: "<epoch millis>-<object id>"
+for a datetime field, "n<number>-<object id>" for a numeric one (counters),
+"z-<object id>" for a row without the field (null or missing), which the
+descending sort puts after every value:
+
+    query.update(older_than("timestamp", request.GET.get("before")))
+    rows = list(collection.find(query).sort(newest_first("timestamp")).limit(limit + 1))
+    rows, cursor = page(rows, "timestamp", limit)
+
+Unlike skip(), each page costs the same no matter how deep it is, and rows
+inserted while paging do not shift later pages.
+"""
+
+import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def encode_cursor(at, _id):
+    if at is None:
+        return f"z-{_id}"
+    if not isinstance(at, datetime.datetime):
+        return f"n{at}-{_id}"
+    millis = (at - _EPOCH) // datetime.timedelta(milliseconds=1)
+    return f"{millis}-{_id}"
+
+
+def _decode_number(value):
+    return int(value) if value.lstrip("-").isdigit() else float(value)
+
+
+def decode_cursor(cursor):
+    """(datetime, number or None, ObjectId) from a cursor string, or None if it is missing or malformed."""
+    try:
+        value, _id = cursor.rsplit("-", 1)
+        if value == "z":
+            return None, ObjectId(_id)
+        if value.startswith("n"):
+            return _decode_number(value[1:]), ObjectId(_id)
+        return _EPOCH + datetime.timedelta(milliseconds=int(value)), ObjectId(_id)
+    except (AttributeError, ValueError, InvalidId):
+        return None
+
+
+def descending(field):
+    return [(field, -1), ("_id", -1)]
+
+
+newest_first = descending
+
+
+def older_than(field, cursor):
+    """Query clause selecting rows after the cursor in descending order ({} for the first page)."""
+    position = decode_cursor(cursor) if cursor else None
+    if position is None:
+        return {}
+    at, _id = position
+    if at is None:
+        # Only rows without the field are left ({field: None} also matches missing)
+        return {field: None, "_id": {"$lt": _id}}
+    return {"$or": [{field: {"$lt": at}}, {field: at, "_id": {"$lt": _id}}, {field: None}]}
+
+
+def page(rows, field, limit):
+    """Trim rows fetched with limit + 1 to one page. Returns (rows, cursor for the next page or None)."""
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        return rows[:limit], encode_cursor(last.get(field), last["_id"])
+    return rows, None
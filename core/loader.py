@@ -0,0 +1,88 @@
+"""
+Request-scoped batching loader for documents referenced by id.
+
+List views collect the ids they need (students of enrollments, courses of
+conversations, ...) and resolve them with one `$in` query per collection:
+
+    loader = get_loader(request)
+    students = loader.load_many("users", [e["student_id"] for e in rows], ["username", "is_active"])
+    for e in rows:
+        student = students.get(e["student_id"])
+
+The loader keeps an identity map, so a document already fetched during the
+request (with at least the requested fields) is never queried again.
+"""
+
+from bson import ObjectId
+
+from core.mongo import get_db
+
+
+def _normalize_id(value):
+    if isinstance(value, str) and ObjectId.is_valid(value):
+        return ObjectId(value)
+    return value
+
+
+class Loader:
+    def __init__(self, db=None):
+        self._db = db
+        # collection -> {_id: (doc or None, fields or None for the whole document)}
+        self._identity_map = {}
+
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = get_db()
+        return self._db
+
+    def _is_cached(self, entry, fields):
+        if entry is None:
+            return False
+        cached_fields = entry[1]
+        return cached_fields is None or (fields is not None and set(fields) <= cached_fields)
+
+    def load_many(self, collection, ids, fields=None):
+        """Return {id: doc} for the given ids (missing documents are left out). fields=None loads whole documents."""
+        cache = self._identity_map.setdefault(collection, {})
+        # Unique ids in first-seen order
+        wanted = list(dict.fromkeys(v for v in map(_normalize_id, ids) if v is not None))
+
+        missing = [value for value in wanted if not self._is_cached(cache.get(value), fields)]
+        if missing:
+            projection = None
+            if fields is not None:
+                # Fetch the union with what is already cached so the entry stays complete
+                merged = set(fields)
+                for value in missing:
+                    entry = cache.get(value)
+                    if entry is not None and entry[1] is not None:
+                        merged |= entry[1]
+                projection = {field: 1 for field in merged}
+            found = {doc["_id"]: doc for doc in self.db[collection].find({"_id": {"$in": missing}}, projection)}
+            stored_fields = None if projection is None else set(projection)
+            for value in missing:
+                cache[value] = (found.get(value), stored_fields)
+
+        result = {}
+        for value in wanted:
+            doc = cache[value][0]
+            if doc is not None:
+                result[value] = doc
+        return result
+
+    def load(self, collection, _id, fields=None):
+        """Single-id form of load_many(); returns the document or None."""
+        _id = _normalize_id(_id)
+        if _id is None:
+            return None
+        return self.load_many(collection, [_id], fields).get(_id)
+
+
+def get_loader(request):
+    """The Loader for this request, created on first use."""
+    loader = getattr(request, "_mongo_loader", None)
+    if loader is None:
+        loader = Loader()
+        request._mongo_loader = loader
+    return loader
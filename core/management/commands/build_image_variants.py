@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from core.images import build_missing
+
+
+class Command(BaseCommand):
+    help = "Create thumbnails and WebP variants for course and profile photos that do not have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Rebuild variants that already exist.")
+
+    def handle(self, *args, **options):
+        for collection, field, kind in (("courses", "course_photo", "course"), ("users", "profile_photo", "profile")):
+            processed, failed = build_missing(collection, field, kind, force=options["force"])
+            self.stdout.write(f"{collection}: {processed} photos processed, {failed} missing or unreadable")
+        self.stdout.write(self.style.SUCCESS("Image variants are up to date"))
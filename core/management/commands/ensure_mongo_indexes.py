@@ -0,0 +1,158 @@
+"""
+Create the MongoDB indexes declared in each app's `indexes.py` and report
+drift between that spec and the live database.
+
+Each app may define `<app>/indexes.py` with:
+
+    INDEXES = {
+        "collection": [
+            {"keys": [("field", 1), ("other", -1)], "name": "field_other", "unique": True},
+        ],
+    }
+
+Any extra keys besides "keys" and "name" are passed to create_index()
+(unique, expireAfterSeconds, partialFilterExpression, sparse).
+"""
+
+from importlib import import_module
+from importlib.util import find_spec
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from pymongo.errors import OperationFailure
+
+from core.mongo import get_db
+
+# Options that change what an index does; anything else (v, ns, background) is ignored for drift
+COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+
+def load_index_specs():
+    """Collect INDEXES from every installed app as {collection: [(app_label, spec), ...]}."""
+    specs = {}
+    for app_config in apps.get_app_configs():
+        module_name = f"{app_config.name}.indexes"
+        if find_spec(module_name) is None:
+            continue
+        module = import_module(module_name)
+        for collection_name, indexes in getattr(module, "INDEXES", {}).items():
+            for spec in indexes:
+                specs.setdefault(collection_name, []).append((app_config.label, spec))
+    return specs
+
+
+def _normalize_keys(keys):
+    normalized = []
+    for field, direction in keys:
+        if isinstance(direction, float):
+            direction = int(direction)
+        normalized.append((field, direction))
+    return normalized
+
+
+def _options(index):
+    # expireAfterSeconds=0 is meaningful, so only None/False count as "not set"
+    return {opt: index[opt] for opt in COMPARED_OPTIONS if index.get(opt) is not None and index.get(opt) is not False}
+
+
+def _describe(keys, options):
+    fields = ", ".join(f"{field}:{direction}" for field, direction in keys)
+    extras = "".join(f" {opt}={value}" for opt, value in sorted(options.items()))
+    return f"({fields}){extras}"
+
+
+class Command(BaseCommand):
+    help = "Create the MongoDB indexes declared in <app>/indexes.py and report drift from the live database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Only report drift; do not create or drop anything.",
+        )
+        parser.add_argument(
+            "--drop-extra", action="store_true",
+            help="Drop live indexes that are not declared in any spec.",
+        )
+        parser.add_argument(
+            "--replace-changed", action="store_true",
+            help="Drop and rebuild indexes whose keys or options differ from the spec.",
+        )
+
+    def handle(self, *args, **options):
+        db = get_db()
+        dry_run = options["dry_run"]
+        specs = load_index_specs()
+        failures = []
+        drift = 0
+
+        existing_collections = set(db.list_collection_names())
+        for collection_name in sorted(specs):
+            collection = db[collection_name]
+            live = collection.index_information() if collection_name in existing_collections else {}
+            live.pop("_id_", None)
+            declared_names = set()
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{collection_name}:"))
+
+            for app_label, spec in specs[collection_name]:
+                keys = _normalize_keys(spec["keys"])
+                name = spec["name"]
+                create_options = {k: v for k, v in spec.items() if k not in ("keys", "name")}
+                wanted = _options(create_options)
+                declared_names.add(name)
+
+                current = live.get(name)
+                if current is not None:
+                    if _normalize_keys(current["key"]) == keys and _options(current) == wanted:
+                        self.stdout.write(f"  ok       {name} {_describe(keys, wanted)}")
+                        continue
+                    drift += 1
+                    self.stdout.write(self.style.WARNING(
+                        f"  changed  {name}: live {_describe(_normalize_keys(current['key']), _options(current))}"
+                        f", spec ({app_label}) {_describe(keys, wanted)}"
+                    ))
+                    if dry_run or not options["replace_changed"]:
+                        continue
+                    collection.drop_index(name)
+                else:
+                    # Same index under another name counts as present (Mongo refuses a duplicate anyway)
+                    same = [
+                        live_name for live_name, info in live.items()
+                        if _normalize_keys(info["key"]) == keys and _options(info) == wanted
+                    ]
+                    if same:
+                        declared_names.add(same[0])
+                        self.stdout.write(self.style.WARNING(
+                            f"  renamed  {name} exists as {same[0]} {_describe(keys, wanted)}"
+                        ))
+                        drift += 1
+                        continue
+                    drift += 1
+                    self.stdout.write(self.style.WARNING(f"  missing  {name} {_describe(keys, wanted)} ({app_label})"))
+                    if dry_run:
+                        continue
+
+                try:
+                    # background is ignored by MongoDB 4.2+, which always uses the non-blocking build
+                    collection.create_index(keys, name=name, background=True, **create_options)
+                    self.stdout.write(self.style.SUCCESS(f"  created  {name}"))
+                except OperationFailure as e:
+                    failures.append(f"{collection_name}.{name}: {e}")
+                    self.stdout.write(self.style.ERROR(f"  failed   {name}: {e}"))
+
+            for live_name in sorted(set(live) - declared_names):
+                drift += 1
+                info = live[live_name]
+                self.stdout.write(self.style.WARNING(
+                    f"  extra    {live_name} {_describe(_normalize_keys(info['key']), _options(info))}"
+                ))
+                if options["drop_extra"] and not dry_run:
+                    collection.drop_index(live_name)
+                    self.stdout.write(self.style.SUCCESS(f"  dropped  {live_name}"))
+
+        summary = f"{sum(len(v) for v in specs.values())} declared indexes, {drift} drifted"
+        if failures:
+            raise CommandError(
+                f"{summary}; {len(failures)} could not be built (duplicate data must be cleaned up first):\n"
+                + "\n".join(failures)
+            )
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.media_store import collect_garbage, scan_orphans
+
+
+class Command(BaseCommand):
+    help = "Delete uploaded media that no course or user references any more."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scan", action="store_true",
+            help="Also walk the upload folders for files no document references "
+                 "(uploads from before the media store) and rebuild the reference counts.",
+        )
+        parser.add_argument(
+            "--grace-hours", type=float, default=getattr(settings, "MEDIA_GC_GRACE_HOURS", 1),
+            help="Keep files released or written less than this many hours ago.",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="List the files without deleting them.")
+
+    def handle(self, *args, **options):
+        removed = collect_garbage(options["grace_hours"], dry_run=options["dry_run"])
+        if options["scan"]:
+            removed += scan_orphans(options["grace_hours"], dry_run=options["dry_run"])
+        for path in removed:
+            self.stdout.write(path)
+        verb = "Would delete" if options["dry_run"] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(removed)} unreferenced files"))
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+
+from core.gridfs_storage import GridFSStorage
+from core.media_store import copy_media
+
+
+class Command(BaseCommand):
+    help = "Copy uploaded media between MEDIA_ROOT and GridFS before switching MEDIA_STORAGE."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--to", choices=("gridfs", "filesystem"), required=True,
+                            help="Backend to copy the files into.")
+        parser.add_argument("--dry-run", action="store_true", help="List the files without copying them.")
+
+    def handle(self, *args, **options):
+        filesystem = FileSystemStorage(location=settings.MEDIA_ROOT, base_url=settings.MEDIA_URL)
+        gridfs = GridFSStorage()
+        source, target = (filesystem, gridfs) if options["to"] == "gridfs" else (gridfs, filesystem)
+
+        copied = skipped = 0
+        for name, was_copied in copy_media(source, target, dry_run=options["dry_run"]):
+            if was_copied:
+                copied += 1
+                self.stdout.write(name)
+            else:
+                skipped += 1
+        verb = "Would copy" if options["dry_run"] else "Copied"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {copied} files to {options['to']} ({skipped} already there)"
+        ))
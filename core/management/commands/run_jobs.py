@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.jobs import process_jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (runs until interrupted unless --once is given)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Run the due jobs once and exit.")
+        parser.add_argument(
+            "--interval", type=float, default=getattr(settings, "JOB_POLL_SECONDS", 5),
+            help="Seconds to wait when no job is due.",
+        )
+
+    def handle(self, *args, **options):
+        totals = {"done": 0, "queued": 0, "failed": 0}
+        try:
+            while True:
+                counts = process_jobs()
+                for key in totals:
+                    totals[key] += counts[key]
+                if any(counts.values()):
+                    self.stdout.write(
+                        f"done {counts['done']}, retrying {counts['queued']}, failed {counts['failed']}"
+                    )
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(
+            f"Job worker done: {totals['done']} finished, {totals['queued']} scheduled for retry, {totals['failed']} failed"
+        ))
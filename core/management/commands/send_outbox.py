@@ -0,0 +1,43 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.outbox import process_outbox
+
+
+class Command(BaseCommand):
+    help = "Send queued emails from the email outbox (runs until interrupted unless --once is given)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Drain the due messages once and exit.")
+        parser.add_argument(
+            "--batch-size", type=int, default=getattr(settings, "OUTBOX_BATCH_SIZE", 50),
+            help="Messages sent per connection.",
+        )
+        parser.add_argument(
+            "--interval", type=float, default=getattr(settings, "OUTBOX_POLL_SECONDS", 5),
+            help="Seconds to wait when the outbox is empty.",
+        )
+        parser.add_argument("--backend", help="Email backend to send with (defaults to OUTBOX_EMAIL_BACKEND).")
+
+    def handle(self, *args, **options):
+        totals = {"sent": 0, "retry": 0, "failed": 0}
+        try:
+            while True:
+                counts = process_outbox(batch_size=options["batch_size"], backend=options["backend"])
+                for key in totals:
+                    totals[key] += counts[key]
+                if any(counts.values()):
+                    self.stdout.write(
+                        f"sent {counts['sent']}, retrying {counts['retry']}, failed {counts['failed']}"
+                    )
+                    continue
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(
+            f"Outbox worker done: {totals['sent']} sent, {totals['retry']} scheduled for retry, {totals['failed']} failed"
+        ))
@@ -0,0 +1,338 @@
+"""
+Content-addressed store for uploaded media.
+
+Uploads are written under the SHA-256 of their content, computed while
+the upload is streamed to disk:
+
+    course_photos/3f/3fa9...c1.jpg
+
+so the same photo or course file uploaded twice is stored once. Every
+stored path has a reference count in `media_refs`:
+
+    {"_id": "course_photos/3f/3fa9...c1.jpg", "refs": 2, "size": n,
+     "created_at": ..., "released_at": None}
+
+save() counts the document that is about to point at the file; release()
+is called when a course or user stops pointing at it (photo replaced,
+course deleted, failed save). A file whose count drops to zero is left on
+disk until `manage.py gc_media` deletes it (with its image variants) after
+MEDIA_GC_GRACE_HOURS, so a concurrent upload of the same content can still
+take it back. `gc_media --scan` also finds files that no document
+references at all (uploads from before this store, files left by old
+delete paths), deletes them and rebuilds the counts.
+
+Paths that aren't in `media_refs` (legacy uploads, default images) are
+left alone by release().
+
+Deleting a file and counting it again can race, so the collector claims a
+path first (`collecting` on its refs document, only while refs <= 0),
+deletes the file, and then removes the document if it is still
+unreferenced. An upload whose count lands on a claimed path waits until
+the collector is done (the claim is cleared or, after
+MEDIA_GC_CLAIM_SECONDS, considered abandoned) and then stores its file
+again.
+
+Files live in Django's default storage: MEDIA_ROOT, or GridFS with
+MEDIA_STORAGE = 'gridfs' (core.gridfs_storage). Uploads are hashed into a
+local temporary file first; on the filesystem backend that file is
+renamed into place, on GridFS it is streamed into the bucket.
+"""
+
+import datetime
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from core import images
+from core.mongo import db
+
+REFS_COLLECTION = "media_refs"
+
+# Folders that hold uploads, and the document fields that point into them
+FOLDERS = ("course_photos", "course_files", "users_profile_photos", "users")
+REFERENCES = {
+    "courses": ("course_photo", "file"),
+    "users": ("profile_photo",),
+}
+
+
+def local_path(rel_path):
+    """Path on this node's disk for the filesystem backend, None for remote storage."""
+    try:
+        return default_storage.path(rel_path)
+    except NotImplementedError:
+        return None
+
+
+def _temp_dir(folder):
+    # Next to the final location on the filesystem backend, so adopt() is a rename
+    folder_path = local_path(folder)
+    if folder_path:
+        os.makedirs(folder_path, exist_ok=True)
+        return folder_path
+    return getattr(settings, "FILE_UPLOAD_TEMP_DIR", None)
+
+
+def walk(storage=None, path=""):
+    """MEDIA_ROOT-relative names of every file below `path` in the storage."""
+    storage = storage or default_storage
+    try:
+        directories, files = storage.listdir(path)
+    except FileNotFoundError:
+        return
+    for name in files:
+        yield f"{path}/{name}" if path else name
+    for directory in directories:
+        yield from walk(storage, f"{path}/{directory}" if path else directory)
+
+
+def copy_media(source, target, exclude=("uploads_tmp",), dry_run=False):
+    """
+    Copy every file (outside the `exclude` folders) from one storage to
+    another under the same name, skipping files the target already has with
+    the same size. Yields (name, copied).
+    """
+    for name in walk(source):
+        if name.split("/", 1)[0] in exclude:
+            continue
+        if target.exists(name) and target.size(name) == source.size(name):
+            yield name, False
+            continue
+        if not dry_run:
+            target.delete(name)
+            with source.open(name, "rb") as content:
+                target.save(name, content)
+        yield name, True
+
+
+def keep_paths():
+    """Default images that documents point at but that were never uploaded."""
+    return set(getattr(settings, "MEDIA_GC_KEEP", ()))
+
+
+def content_path(folder, digest, filename=""):
+    ext = os.path.splitext(filename or "")[1].lower()
+    return f"{folder}/{digest[:2]}/{digest}{ext}"
+
+
+def adopt(tmp_path, folder, digest, filename="", size=None):
+    """
+    Move a finished local temporary file into the store under `digest` and
+    count one reference. Returns the storage name.
+    """
+    rel_path = content_path(folder, digest, filename)
+    now = datetime.datetime.utcnow()
+    ref = db[REFS_COLLECTION].find_one_and_update(
+        {"_id": rel_path},
+        {
+            "$inc": {"refs": 1},
+            # touched_at keeps scan_orphans() from resetting a count taken during its scan
+            "$set": {"released_at": None, "touched_at": now},
+            "$setOnInsert": {"size": size if size is not None else os.path.getsize(tmp_path), "created_at": now},
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    collecting = ref.get("collecting")
+    if collecting:
+        # A garbage collection is deleting this file; store ours once it is done
+        _wait_for_collector(rel_path, collecting)
+    target = local_path(rel_path)
+    if target:
+        # Replacing an identical file is harmless
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.move(tmp_path, target)
+        return rel_path
+    try:
+        if collecting or not default_storage.exists(rel_path):
+            with open(tmp_path, "rb") as tmp:
+                saved = default_storage.save(rel_path, File(tmp))
+            if saved != rel_path:
+                # Stored concurrently by another request under the same name
+                default_storage.delete(saved)
+    finally:
+        os.remove(tmp_path)
+    return rel_path
+
+
+def _claim_seconds():
+    return getattr(settings, "MEDIA_GC_CLAIM_SECONDS", 60)
+
+
+def _wait_for_collector(rel_path, token):
+    deadline = time.monotonic() + _claim_seconds()
+    while time.monotonic() < deadline:
+        if not db[REFS_COLLECTION].count_documents({"_id": rel_path, "collecting": token}, limit=1):
+            return
+        time.sleep(0.05)
+    # The collector stopped half way; take the claim back
+    db[REFS_COLLECTION].update_one(
+        {"_id": rel_path, "collecting": token}, {"$unset": {"collecting": "", "collecting_at": ""}}
+    )
+
+
+def _collect(rel_path, query, delete, upsert=False):
+    """
+    Delete a stored file whose refs document matches `query` (refs <= 0),
+    claiming it first so a concurrent upload of the same content waits and
+    stores it again. With upsert, paths without a refs document are claimed
+    too. Returns True if the file and its document were removed.
+    """
+    now = datetime.datetime.utcnow()
+    token = ObjectId()
+    unclaimed = {"$or": [
+        {"collecting": None},
+        {"collecting_at": {"$lt": now - datetime.timedelta(seconds=_claim_seconds())}},
+    ]}
+    update = {"$set": {"collecting": token, "collecting_at": now}}
+    if upsert:
+        update["$setOnInsert"] = {"refs": 0, "released_at": now, "created_at": now}
+    try:
+        ref = db[REFS_COLLECTION].find_one_and_update(
+            {"_id": rel_path, **query, **unclaimed}, update, upsert=upsert, return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        return False  # Referenced (or claimed) meanwhile, so the upsert tried to insert
+    if not ref or ref.get("collecting") != token:
+        return False
+    delete(rel_path)
+    if db[REFS_COLLECTION].delete_one({"_id": rel_path, "refs": {"$lte": 0}, "collecting": token}).deleted_count:
+        return True
+    # Counted again while the file was deleted: let the waiting upload store it
+    db[REFS_COLLECTION].update_one(
+        {"_id": rel_path, "collecting": token}, {"$unset": {"collecting": "", "collecting_at": ""}}
+    )
+    return False
+
+
+def save(uploaded_file, folder):
+    """Store a Django UploadedFile (streamed and hashed chunk by chunk). Returns its path."""
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=_temp_dir(folder), suffix=".upload")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            for chunk in uploaded_file.chunks():
+                digest.update(chunk)
+                tmp.write(chunk)
+                size += len(chunk)
+        return adopt(tmp_path, folder, digest.hexdigest(), uploaded_file.name, size)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def release(*paths):
+    """Drop one reference to each stored path (None, legacy and default paths are ignored)."""
+    for path in paths:
+        if not path or path in keep_paths():
+            continue
+        result = db[REFS_COLLECTION].find_one_and_update(
+            {"_id": path, "refs": {"$gt": 0}}, {"$inc": {"refs": -1}}, projection={"refs": 1},
+        )
+        if result and result["refs"] <= 1:
+            db[REFS_COLLECTION].update_one(
+                {"_id": path, "refs": {"$lte": 0}}, {"$set": {"released_at": datetime.datetime.utcnow()}}
+            )
+
+
+def _delete_file(rel_path):
+    variants = images.variant_paths(rel_path)
+    for path in [rel_path, *variants]:
+        default_storage.delete(path)
+    # Drop the shard folder (and its variants/) once empty
+    for folder in (os.path.dirname(variants[0]), os.path.dirname(rel_path)):
+        try:
+            if local_path(folder):
+                os.rmdir(local_path(folder))
+        except OSError:
+            pass
+
+
+def collect_garbage(grace_hours=None, dry_run=False):
+    """Delete stored files released more than grace_hours ago. Returns the paths removed."""
+    if grace_hours is None:
+        grace_hours = getattr(settings, "MEDIA_GC_GRACE_HOURS", 1)
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(hours=grace_hours)
+    query = {"refs": {"$lte": 0}, "released_at": {"$ne": None, "$lt": cutoff}}
+    paths = [doc["_id"] for doc in db[REFS_COLLECTION].find(query, {"_id": 1})]
+    if dry_run or not paths:
+        return paths
+    return [path for path in paths if _collect(path, query, _delete_file)]
+
+
+def referenced_paths():
+    """{path: number of references} over every document field that points at media."""
+    counts = {}
+    for collection, fields in REFERENCES.items():
+        projection = {field: 1 for field in fields}
+        for doc in db[collection].find({"$or": [{f: {"$nin": [None, ""]}} for f in fields]}, projection):
+            for field in fields:
+                if doc.get(field):
+                    counts[doc[field]] = counts.get(doc[field], 0) + 1
+    # Files of chunked uploads that a course form hasn't claimed yet
+    for upload in db["course_uploads"].find({"file": {"$exists": True}}, {"file": 1}):
+        counts[upload["file"]] = counts.get(upload["file"], 0) + 1
+    return counts
+
+
+def scan_orphans(grace_hours=None, dry_run=False, batch_size=500):
+    """
+    Delete files in the upload folders that no document references and
+    rebuild the reference counts. Returns the paths removed.
+    """
+    if grace_hours is None:
+        grace_hours = getattr(settings, "MEDIA_GC_GRACE_HOURS", 1)
+    started = datetime.datetime.utcnow()
+    counts = referenced_paths()
+    live = set(counts) | keep_paths()
+    # Variants belong to their source
+    for path in list(live):
+        live.update(images.variant_paths(path))
+    cutoff = timezone.now() - datetime.timedelta(hours=grace_hours)
+
+    orphans = []
+    for folder in FOLDERS:
+        for rel_path in walk(path=folder):
+            # Recent files may belong to a request that hasn't saved its document yet
+            if rel_path not in live and default_storage.get_modified_time(rel_path) < cutoff:
+                orphans.append(rel_path)
+    if dry_run:
+        return orphans
+
+    # Skips paths counted by an upload of the same content since referenced_paths() ran
+    removed = [
+        rel_path for rel_path in orphans
+        if _collect(rel_path, {"refs": {"$lte": 0}}, default_storage.delete, upsert=True)
+    ]
+    ref_paths = [doc["_id"] for doc in db[REFS_COLLECTION].find({}, {"_id": 1})]
+    # Counts of stored files follow the documents again; newly unreferenced
+    # ones are collected by a later gc after the grace period. Paths counted
+    # since the scan started keep their count
+    now = datetime.datetime.utcnow()
+    gone = set(removed)
+    batch = []
+    for path in ref_paths:
+        if path in gone:
+            continue
+        refs = counts.get(path, 0)
+        batch.append(UpdateOne(
+            {"_id": path, "refs": {"$ne": refs}, "touched_at": {"$not": {"$gte": started}}},
+            {"$set": {"refs": refs, "released_at": None if refs else now}},
+        ))
+        if len(batch) >= batch_size:
+            db[REFS_COLLECTION].bulk_write(batch, ordered=False)
+            batch = []
+    if batch:
+        db[REFS_COLLECTION].bulk_write(batch, ordered=False)
+    return removed
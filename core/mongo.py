@@ -0,0 +1,186 @@
+"""
+Shared MongoDB client for the whole project.
+
+Every view, form and helper goes through get_db() (or the lazy `db` handle)
+instead of building its own MongoClient. The client is created on first use,
+is re-created in a child process after a fork, and its pool size and timeouts
+come from the MONGO_* settings.
+"""
+
+import os
+import threading
+
+import pymongo
+from pymongo import monitoring
+from django.conf import settings
+
+_lock = threading.Lock()
+_client = None
+_client_pid = None
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Counts connection pool events so the pool can be sized from real numbers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {
+                "connections_created": 0,
+                "connections_closed": 0,
+                "checkouts": 0,
+                "checkout_failures": 0,
+                "pool_clears": 0,
+                "in_use": 0,
+                "peak_in_use": 0,
+            }
+
+    def _inc(self, key, amount=1):
+        with self._lock:
+            self.counters[key] += amount
+            if key == "in_use" and self.counters["in_use"] > self.counters["peak_in_use"]:
+                self.counters["peak_in_use"] = self.counters["in_use"]
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counters)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._inc("pool_clears")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._inc("connections_created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._inc("connections_closed")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._inc("checkout_failures")
+
+    def connection_checked_out(self, event):
+        self._inc("checkouts")
+        self._inc("in_use")
+
+    def connection_checked_in(self, event):
+        self._inc("in_use", -1)
+
+
+pool_listener = PoolStatsListener()
+
+
+def _client_options():
+    return {
+        "maxPoolSize": getattr(settings, "MONGO_MAX_POOL_SIZE", 50),
+        "minPoolSize": getattr(settings, "MONGO_MIN_POOL_SIZE", 0),
+        "maxIdleTimeMS": getattr(settings, "MONGO_MAX_IDLE_TIME_MS", 60000),
+        "waitQueueTimeoutMS": getattr(settings, "MONGO_WAIT_QUEUE_TIMEOUT_MS", 5000),
+        "serverSelectionTimeoutMS": getattr(settings, "MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000),
+        "connectTimeoutMS": getattr(settings, "MONGO_CONNECT_TIMEOUT_MS", 5000),
+        "socketTimeoutMS": getattr(settings, "MONGO_SOCKET_TIMEOUT_MS", 20000),
+    }
+
+
+def get_client():
+    """Return the process-wide MongoClient, creating it on first use (and again after a fork)."""
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+    with _lock:
+        if _client is None or _client_pid != pid:
+            # A client inherited from the parent process must not be reused or closed here
+            pool_listener.reset()
+            _client = pymongo.MongoClient(
+                getattr(settings, "MONGO_URI", "mongodb://localhost:27017/"),
+                event_listeners=[pool_listener],
+                **_client_options()
+            )
+            _client_pid = pid
+    return _client
+
+
+def get_db():
+    """Return the project database on the shared client."""
+    return get_client()[getattr(settings, "MONGO_DB_NAME", "Peer_to_Peer_Education")]
+
+
+def close_client():
+    """Close the shared client (used on shutdown and by management commands)."""
+    global _client, _client_pid
+    with _lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+
+def _forget_client_after_fork():
+    global _client, _client_pid
+    _client = None
+    _client_pid = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_client_after_fork)
+
+
+def pool_stats():
+    """Connection pool settings plus live counters for this process."""
+    stats = pool_listener.snapshot()
+    stats.update({
+        "pid": os.getpid(),
+        "client_created": _client is not None and _client_pid == os.getpid(),
+        "max_pool_size": _client_options()["maxPoolSize"],
+        "min_pool_size": _client_options()["minPoolSize"],
+    })
+    return stats
+
+
+class LazyCollection:
+    """Collection handle that resolves against the shared client on every use."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(get_db()[self.name], attr)
+
+    def __getitem__(self, sub_name):
+        return LazyCollection(f"{self.name}.{sub_name}")
+
+    def __repr__(self):
+        return f"LazyCollection({self.name!r})"
+
+
+class LazyDatabase:
+    """Database handle that is safe to keep at module level across forks."""
+
+    def __getitem__(self, name):
+        return LazyCollection(name)
+
+    def __getattr__(self, attr):
+        return getattr(get_db(), attr)
+
+    def __repr__(self):
+        return "LazyDatabase()"
+
+
+db = LazyDatabase()
@@ -0,0 +1,196 @@
+"""
+Outgoing email outbox.
+
+Views call enqueue_mail() (same arguments as django.core.mail.send_mail),
+which only inserts a document into the `email_outbox` collection. The
+`manage.py send_outbox` worker claims pending messages in batches, sends
+each batch over one reused connection of OUTBOX_EMAIL_BACKEND, retries
+failures with exponential backoff and records the delivery status:
+
+    pending -> sending -> sent
+                       -> pending (retry, next_attempt_at pushed back)
+                       -> failed  (after OUTBOX_MAX_ATTEMPTS)
+
+Point OUTBOX_EMAIL_BACKEND at the console or file-based backend to run the
+worker without an SMTP server.
+"""
+
+import datetime
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+
+from core.mongo import db
+
+OUTBOX_COLLECTION = "email_outbox"
+
+DUPLICATE_KEY = 11000
+
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _outbox_doc(subject, message, from_email, recipient_list, html_message=None):
+    now = datetime.datetime.utcnow()
+    return {
+        "subject": subject,
+        "message": message,
+        "html_message": html_message,
+        "from_email": from_email or settings.DEFAULT_FROM_EMAIL,
+        "to": list(recipient_list),
+        "status": PENDING,
+        "attempts": 0,
+        "created_at": now,
+        "next_attempt_at": now,
+        "last_error": None,
+    }
+
+
+def enqueue_mail(subject, message, from_email, recipient_list, fail_silently=False, html_message=None):
+    """Queue one email for the outbox worker. Returns the outbox document id."""
+    try:
+        return db[OUTBOX_COLLECTION].insert_one(
+            _outbox_doc(subject, message, from_email, recipient_list, html_message)
+        ).inserted_id
+    except Exception:
+        if not fail_silently:
+            raise
+        return None
+
+
+def enqueue_mass_mail(datatuple, fail_silently=False, keys=None):
+    """
+    Queue several (subject, message, from_email, recipient_list) emails with one insert.
+    With `keys` (one per email), emails whose key is already in the outbox are
+    skipped (unique index on `key`), so a background job that re-runs a batch,
+    or two workers running the same batch, don't send it twice. Returns the
+    number of emails queued.
+    """
+    docs = [_outbox_doc(subject, message, from_email, recipients) for subject, message, from_email, recipients in datatuple]
+    if keys is not None:
+        queued = {doc["key"] for doc in db[OUTBOX_COLLECTION].find({"key": {"$in": list(keys)}}, {"key": 1})}
+        for doc, key in zip(docs, keys):
+            doc["key"] = key
+        docs = [doc for doc in docs if doc["key"] not in queued]
+    if not docs:
+        return 0
+    try:
+        return len(db[OUTBOX_COLLECTION].insert_many(docs, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        if all(error.get("code") == DUPLICATE_KEY for error in e.details.get("writeErrors", [])):
+            return e.details.get("nInserted", 0)
+        if not fail_silently:
+            raise
+        return e.details.get("nInserted", 0)
+    except Exception:
+        if not fail_silently:
+            raise
+        return 0
+
+
+def claim_batch(batch_size, lease_seconds=300):
+    """
+    Atomically move up to batch_size due messages to "sending". Messages left in
+    "sending" by a worker that died are picked up again once their lease expires.
+    """
+    outbox = db[OUTBOX_COLLECTION]
+    now = datetime.datetime.utcnow()
+    lease_until = now + datetime.timedelta(seconds=lease_seconds)
+    claimed = []
+    while len(claimed) < batch_size:
+        doc = outbox.find_one_and_update(
+            {"$or": [
+                {"status": PENDING, "next_attempt_at": {"$lte": now}},
+                {"status": SENDING, "lease_until": {"$lte": now}},
+            ]},
+            {"$set": {"status": SENDING, "lease_until": lease_until}, "$inc": {"attempts": 1}},
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc is None:
+            break
+        claimed.append(doc)
+    return claimed
+
+
+def retry_delay(attempts):
+    """Backoff before the next attempt: base * 2^(attempts-1), capped."""
+    base = _setting("OUTBOX_RETRY_BASE_SECONDS", 60)
+    cap = _setting("OUTBOX_RETRY_MAX_SECONDS", 3600)
+    return min(cap, base * (2 ** max(attempts - 1, 0)))
+
+
+def _mark_sent(doc):
+    db[OUTBOX_COLLECTION].update_one(
+        {"_id": doc["_id"]},
+        {"$set": {"status": SENT, "sent_at": datetime.datetime.utcnow(), "last_error": None},
+         "$unset": {"lease_until": ""}},
+    )
+
+
+def _mark_failed(doc, error):
+    attempts = doc.get("attempts", 1)
+    if attempts >= _setting("OUTBOX_MAX_ATTEMPTS", 5):
+        update = {"status": FAILED, "failed_at": datetime.datetime.utcnow()}
+    else:
+        update = {
+            "status": PENDING,
+            "next_attempt_at": datetime.datetime.utcnow() + datetime.timedelta(seconds=retry_delay(attempts)),
+        }
+    update["last_error"] = str(error)[:500]
+    db[OUTBOX_COLLECTION].update_one({"_id": doc["_id"]}, {"$set": update, "$unset": {"lease_until": ""}})
+    return update["status"]
+
+
+def _to_message(doc, connection):
+    email = EmailMultiAlternatives(
+        subject=doc.get("subject", ""),
+        body=doc.get("message", ""),
+        from_email=doc.get("from_email"),
+        to=doc.get("to", []),
+        connection=connection,
+    )
+    if doc.get("html_message"):
+        email.attach_alternative(doc["html_message"], "text/html")
+    return email
+
+
+def send_batch(docs, backend=None):
+    """Send claimed messages over one connection. Returns {"sent": n, "retry": n, "failed": n}."""
+    counts = {"sent": 0, "retry": 0, "failed": 0}
+    if not docs:
+        return counts
+    connection = get_connection(backend=backend or _setting("OUTBOX_EMAIL_BACKEND", settings.EMAIL_BACKEND))
+    try:
+        connection.open()
+    except Exception as e:
+        # Could not reach the mail server at all: every message in the batch is retried
+        for doc in docs:
+            counts["failed" if _mark_failed(doc, e) == FAILED else "retry"] += 1
+        return counts
+    try:
+        for doc in docs:
+            try:
+                connection.send_messages([_to_message(doc, connection)])
+            except Exception as e:
+                counts["failed" if _mark_failed(doc, e) == FAILED else "retry"] += 1
+            else:
+                _mark_sent(doc)
+                counts["sent"] += 1
+    finally:
+        connection.close()
+    return counts
+
+
+def process_outbox(batch_size=None, backend=None):
+    """Claim and send one batch. Returns the counts from send_batch()."""
+    docs = claim_batch(batch_size or _setting("OUTBOX_BATCH_SIZE", 50))
+    return send_batch(docs, backend=backend)
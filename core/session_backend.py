@@ -0,0 +1,129 @@
+"""
+Django session engine backed by the MongoDB `sessions` collection.
+
+Enable it with SESSION_ENGINE = 'core.session_backend'. Django's
+SessionMiddleware loads the session at most once per request (request.session)
+and only calls save() when it was modified; save() additionally skips the
+write when the data is unchanged from what was loaded. Expired sessions are
+removed by a TTL index on `expire_at`.
+"""
+
+import copy
+import datetime
+import threading
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import CreateError, SessionBase, UpdateError
+from django.utils import timezone
+from pymongo.errors import DuplicateKeyError
+
+from core.mongo import get_db
+
+_ttl_index_lock = threading.Lock()
+_ttl_index_ready = False
+
+
+def get_sessions_collection():
+    return get_db()[getattr(settings, "MONGO_SESSION_COLLECTION", "sessions")]
+
+
+def ensure_ttl_index():
+    """Create the TTL index that expires sessions (once per process)."""
+    global _ttl_index_ready
+    if _ttl_index_ready:
+        return
+    with _ttl_index_lock:
+        if not _ttl_index_ready:
+            get_sessions_collection().create_index(
+                "expire_at", expireAfterSeconds=0, name="expire_at_ttl"
+            )
+            _ttl_index_ready = True
+
+
+class SessionStore(SessionBase):
+    """Stores session data as a plain document: {_id, data, expire_at, updated}."""
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._loaded_data = None
+
+    def _live_query(self, session_key):
+        # Sessions written before this engine existed have no expire_at yet
+        return {
+            "_id": session_key,
+            "$or": [
+                {"expire_at": {"$gt": timezone.now()}},
+                {"expire_at": {"$exists": False}},
+            ],
+        }
+
+    def load(self):
+        doc = None
+        if self.session_key:
+            try:
+                doc = get_sessions_collection().find_one(self._live_query(self.session_key), {"data": 1})
+            except Exception as e:
+                print(f"Error loading session: {e}")
+        if doc is None:
+            self._session_key = None
+            self._loaded_data = None
+            return {}
+        data = doc.get("data") or {}
+        self._loaded_data = copy.deepcopy(data)
+        return data
+
+    def exists(self, session_key):
+        return get_sessions_collection().find_one({"_id": session_key}, {"_id": 1}) is not None
+
+    def create(self):
+        while True:
+            self._session_key = self._get_new_session_key()
+            try:
+                self.save(must_create=True)
+            except CreateError:
+                continue
+            self.modified = True
+            return
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        data = self._get_session(no_load=must_create)
+        if not must_create and self._loaded_data is not None and data == self._loaded_data:
+            return
+
+        ensure_ttl_index()
+        fields = {
+            "data": data,
+            "expire_at": self.get_expiry_date(),
+            "updated": datetime.datetime.utcnow(),
+        }
+        collection = get_sessions_collection()
+        if must_create:
+            try:
+                collection.insert_one({"_id": self.session_key, **fields})
+            except DuplicateKeyError:
+                raise CreateError
+        else:
+            result = collection.update_one({"_id": self.session_key}, {"$set": fields})
+            if result.matched_count == 0:
+                raise UpdateError
+        self._loaded_data = copy.deepcopy(data)
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        get_sessions_collection().delete_one({"_id": session_key})
+
+    @classmethod
+    def clear_expired(cls):
+        # The TTL index does this continuously; this also covers pre-TTL documents
+        stale_before = datetime.datetime.utcnow() - datetime.timedelta(seconds=settings.SESSION_COOKIE_AGE)
+        get_sessions_collection().delete_many({
+            "$or": [
+                {"expire_at": {"$lt": timezone.now()}},
+                {"expire_at": {"$exists": False}, "updated": {"$lt": stale_before}},
+            ]
+        })
@@ -0,0 +1,125 @@
+"""
+Public media served from Django's default storage.
+
+With MEDIA_STORAGE = 'gridfs' there is no MEDIA_ROOT for the web server to
+serve, so /media/ and /users_media/ are routed here. Small files
+(thumbnails, avatars; up to MEDIA_CACHE_MAX_OBJECT_BYTES) are kept in a
+per-process LRU cache of MEDIA_CACHE_MAX_BYTES for MEDIA_CACHE_SECONDS,
+which takes the MongoDB round trips off list pages full of cards. Larger
+files and Range requests are streamed by courses.downloads.serve_file.
+
+Course files are not public and only go through download_course_file;
+serve_local_media() applies the same rule to MEDIA_ROOT in development.
+"""
+
+import mimetypes
+import posixpath
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date
+from django.views.static import serve
+
+from courses.downloads import check_name, file_etag, serve_file
+
+PRIVATE_FOLDERS = ("course_files", "uploads_tmp")
+
+
+def is_private(path):
+    """True for paths in the folders only download_course_file may serve."""
+    name = posixpath.normpath((path or "").replace("\\", "/")).lstrip("/")
+    return name.split("/", 1)[0] in PRIVATE_FOLDERS
+
+
+def serve_local_media(request, path, document_root):
+    """MEDIA_ROOT files with the filesystem backend (development), without the private folders."""
+    if is_private(path):
+        raise Http404("File not found")
+    return serve(request, path, document_root=document_root)
+
+
+class _LRUCache:
+    """Byte-bounded LRU of {name: (expires, etag, modified, body)}."""
+
+    def __init__(self):
+        self.items = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, name):
+        with self.lock:
+            entry = self.items.get(name)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._remove(name)
+                return None
+            self.items.move_to_end(name)
+            return entry
+
+    def put(self, name, etag, modified, body):
+        max_bytes = getattr(settings, "MEDIA_CACHE_MAX_BYTES", 32 * 1024 * 1024)
+        expires = time.monotonic() + getattr(settings, "MEDIA_CACHE_SECONDS", 300)
+        with self.lock:
+            if name in self.items:
+                self._remove(name)
+            self.items[name] = (expires, etag, modified, body)
+            self.size += len(body)
+            while self.size > max_bytes and self.items:
+                self._remove(next(iter(self.items)))
+
+    def _remove(self, name):
+        self.size -= len(self.items.pop(name)[3])
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.size = 0
+
+
+media_cache = _LRUCache()
+
+
+def _cache_control():
+    return f"public, max-age={getattr(settings, 'MEDIA_CACHE_SECONDS', 300)}"
+
+
+def _cached_response(request, name, etag, modified, body):
+    if request.headers.get("If-None-Match") == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type=mimetypes.guess_type(name)[0] or "application/octet-stream")
+        response["Content-Length"] = len(body)
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(modified)
+    response["Accept-Ranges"] = "bytes"
+    response["Cache-Control"] = _cache_control()
+    return response
+
+
+def serve_media(request, path):
+    if is_private(path):
+        raise Http404("File not found")
+
+    entry = media_cache.get(path)
+    if entry and not request.headers.get("Range"):
+        return _cached_response(request, path, *entry[1:])
+
+    name = check_name(path)
+    size = default_storage.size(name)
+    modified = default_storage.get_modified_time(name)
+    etag = file_etag(size, modified)
+    if request.headers.get("If-None-Match") == etag:
+        return _cached_response(request, name, etag, modified.timestamp(), b"")
+
+    if request.headers.get("Range") or size > getattr(settings, "MEDIA_CACHE_MAX_OBJECT_BYTES", 256 * 1024):
+        return serve_file(request, name, as_attachment=False, cache_control=_cache_control())
+
+    with default_storage.open(name, "rb") as file:
+        body = file.read()
+    media_cache.put(name, etag, modified.timestamp(), body)
+    return _cached_response(request, name, etag, modified.timestamp(), body)
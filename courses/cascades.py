@@ -0,0 +1,117 @@
+"""
+Background cascades over a course's enrolled students (core.jobs handlers).
+
+ban_user and the two course delete views do the cheap, immediate part
+themselves (deactivate the account, hide or delete the course, one
+update_many) and queue one of these jobs for the fan-out:
+
+    ban_instructor   email every approved student of the banned
+                     instructor's courses
+    course_deleted   email every approved student of a deleted course
+
+Both walk `enrollments` in _id order, CASCADE_BATCH_SIZE at a time, with
+one users query per batch and one outbox insert per batch. The cursor is
+checkpointed after each batch and every email has an outbox key
+("<job id>:<enrollment id>"), so a job that is retried or taken over
+after a crash continues where it stopped without emailing anyone twice.
+"""
+
+from bson.objectid import ObjectId
+from django.conf import settings
+
+from core.jobs import checkpoint
+from core.mongo import db
+from core.outbox import enqueue_mass_mail
+
+
+def batch_size():
+    return getattr(settings, "CASCADE_BATCH_SIZE", 500)
+
+
+def _notify_enrolled(job, course_ids, make_email):
+    """
+    Queue make_email(student, course_id) -> (subject, message) for each
+    approved enrollment of `course_ids`, resuming from the job's cursor.
+    """
+    query = {"course_id": {"$in": course_ids}, "approval_status": "Approved"}
+    total = job["progress"]["total"]
+    if total is None:
+        total = db["enrollments"].count_documents(query)
+    done = job["progress"]["done"]
+    after = job["state"].get("after")
+    while True:
+        page_query = dict(query, _id={"$gt": ObjectId(after)}) if after else query
+        enrollments = list(
+            db["enrollments"].find(page_query, {"student_id": 1, "course_id": 1}).sort("_id", 1).limit(batch_size())
+        )
+        if not enrollments:
+            break
+        student_ids = list({e["student_id"] for e in enrollments})
+        students = {
+            s["_id"]: s for s in db["users"].find({"_id": {"$in": student_ids}}, {"username": 1, "email": 1})
+        }
+        emails, keys = [], []
+        for enrollment in enrollments:
+            student = students.get(enrollment["student_id"])
+            if student and student.get("email"):
+                subject, message = make_email(student, enrollment["course_id"])
+                emails.append((subject, message, settings.EMAIL_HOST_USER, [student["email"]]))
+                keys.append(f"{job['_id']}:{enrollment['_id']}")
+        enqueue_mass_mail(emails, keys=keys)
+        after = str(enrollments[-1]["_id"])
+        done += len(enrollments)
+        checkpoint(job, {"after": after}, done, total)
+    if job["progress"]["total"] is None:
+        checkpoint(job, {"after": after}, done, total)
+    return done
+
+
+def ban_instructor(job):
+    """Tell the students of a banned instructor's courses that the courses are closed."""
+    courses = {
+        c["_id"]: c["title"]
+        for c in db["courses"].find({"instructor_id": ObjectId(job["params"]["instructor_id"])}, {"title": 1})
+    }
+
+    def make_email(student, course_id):
+        title = courses.get(course_id, "")
+        return (
+            f"Important Notice: Course '{title}' Access Update",
+            f"""Dear {student['username']},
+
+We regret to inform you that the instructor for your enrolled course '{title}' has been banned from our platform due to policy violations.
+
+As a result:
+- The course is no longer available for new enrollments
+- You can still download and access all course materials you were enrolled in
+- Your enrollment status remains valid for downloading purposes
+
+You can download your course materials from your student dashboard.
+
+We apologize for any inconvenience caused.
+
+Best regards,
+Peer to Peer Education Team""",
+        )
+
+    return _notify_enrolled(job, list(courses), make_email)
+
+
+def course_deleted(job):
+    """Tell the students of a deleted course that it has been removed."""
+    title = job["params"]["title"]
+
+    def make_email(student, course_id):
+        return (
+            f"Course Removed: '{title}'",
+            f"""Dear {student['username']},
+
+The course '{title}' you were enrolled in has been removed from Peer to Peer Education and is no longer available.
+
+If you have questions about your enrollment or payment, please contact the platform support.
+
+Best regards,
+Peer to Peer Education Team""",
+        )
+
+    return _notify_enrolled(job, [ObjectId(job["params"]["course_id"])], make_email)
@@ -0,0 +1,146 @@
+"""
+Course catalog queries for the admin and student catalog pages.
+
+Filtering, sorting and paging happen in MongoDB on fields kept on each
+course document:
+
+    {"instructor_name": ..., "search_keywords": ["java", "for", ...]}
+
+plus the enrollment counters maintained by enrollments.counters.
+
+search_keywords holds the lowercase words of the title and instructor name;
+a search matches courses having a keyword that starts with every typed
+word, an anchored regex that walks the multikey index. The fields are set
+when a course is saved (catalog_fields) and when its instructor is renamed
+(rename_instructor). `manage.py rebuild_catalog_fields` fills them in for
+existing courses.
+
+Pages are sorted by created_at ("newest") or enrollment_count
+("most_enrolled"), with _id as tie-breaker, and continue from a keyset
+`before` cursor (core.keyset).
+"""
+
+import datetime
+import re
+
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from pymongo import UpdateOne
+
+from core import keyset
+from core.mongo import db
+from courses.snapshot import bump_catalog_version
+from enrollments import counters
+
+SORTS = {
+    "newest": "created_at",
+    "most_enrolled": counters.TOTAL,
+}
+
+
+def page_size():
+    return getattr(settings, "CATALOG_PAGE_SIZE", 20)
+
+
+def keywords(*texts):
+    """Distinct lowercase words of the given texts."""
+    return sorted(set(re.findall(r"\w+", " ".join(t for t in texts if t).lower())))
+
+
+def catalog_fields(title, instructor_name):
+    """Catalog fields to $set on a course with this title and instructor."""
+    return {
+        "instructor_name": instructor_name,
+        "search_keywords": keywords(title, instructor_name),
+    }
+
+
+def instructor_name(instructor_id):
+    user = db["users"].find_one({"_id": instructor_id}, {"username": 1}) if instructor_id else None
+    return user.get("username", "Unknown") if user else "Unknown"
+
+
+def rename_instructor(instructor_id, username):
+    """Refresh instructor_name and search keywords on the instructor's courses."""
+    courses = db["courses"].find({"instructor_id": instructor_id}, {"title": 1})
+    updates = [
+        UpdateOne({"_id": c["_id"]}, {"$set": catalog_fields(c.get("title", ""), username)})
+        for c in courses
+    ]
+    if updates:
+        db["courses"].bulk_write(updates, ordered=False)
+        bump_catalog_version()
+
+
+def _price(value):
+    try:
+        return float(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def search(text=None, category=None, min_price=None, max_price=None, sort="newest",
+           available_only=False, limit=None, before=None, projection=None):
+    """
+    One page of approved courses. Returns (courses, cursor for the next page
+    or None). Prices may be given as strings; unparsable ones are ignored.
+    """
+    limit = limit or page_size()
+    field = SORTS.get(sort, SORTS["newest"])
+
+    query = {"status": "approved"}
+    terms = keywords(text)
+    if terms:
+        query["$and"] = [{"search_keywords": {"$regex": f"^{re.escape(term)}"}} for term in terms]
+    if category:
+        query["category"] = category
+    price = {}
+    if _price(min_price) is not None:
+        price["$gte"] = _price(min_price)
+    if _price(max_price) is not None:
+        price["$lte"] = _price(max_price)
+    if price:
+        query["price"] = price
+    if available_only:
+        # Courses created before the ban feature have no is_available field
+        query["is_available"] = {"$ne": False}
+    query.update(keyset.older_than(field, before))
+
+    rows = list(
+        db["courses"].find(query, projection)
+        .sort(keyset.descending(field))
+        .limit(limit + 1)
+    )
+    return keyset.page(rows, field, limit)
+
+
+def rebuild_catalog_fields(batch_size=500):
+    """
+    Recompute instructor_name and search keywords on every course, and store
+    string created_at values as dates. Returns the number of courses updated.
+    """
+    names = {}
+    updated = 0
+    batch = []
+    for course in db["courses"].find({}, {"title": 1, "instructor_id": 1, "created_at": 1}):
+        instructor_id = course.get("instructor_id")
+        if instructor_id not in names:
+            names[instructor_id] = instructor_name(instructor_id)
+        fields = catalog_fields(course.get("title", ""), names[instructor_id])
+        created_at = course.get("created_at")
+        if isinstance(created_at, str):
+            parsed = parse_datetime(created_at)
+            if parsed is not None and parsed.tzinfo is not None:
+                parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+            fields["created_at"] = parsed or datetime.datetime.min
+        elif created_at is None:
+            fields["created_at"] = datetime.datetime.min
+        batch.append(UpdateOne({"_id": course["_id"]}, {"$set": fields}))
+        if len(batch) >= batch_size:
+            db["courses"].bulk_write(batch, ordered=False)
+            updated += len(batch)
+            batch = []
+    if batch:
+        db["courses"].bulk_write(batch, ordered=False)
+        updated += len(batch)
+    return updated
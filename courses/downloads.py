@@ -0,0 +1,158 @@
+"""
+Serving stored files with Range support.
+
+serve_file() answers a GET for a file in the default storage in one of
+three ways, chosen by COURSE_FILE_SERVING:
+
+    "django"            FileResponse from the open file. Requests for the
+                        rest of a file ("bytes=N-", i.e. resumed downloads)
+                        hand the file object itself to the WSGI server, so
+                        servers with wsgi.file_wrapper (gunicorn, uWSGI)
+                        send local files with sendfile(); bounded ranges are
+                        read in blocks. GridFS files are streamed chunk by
+                        chunk from MongoDB.
+    "x-accel-redirect"  An empty response with X-Accel-Redirect pointing at
+                        COURSE_FILE_ACCEL_PREFIX + path; nginx serves the
+                        file (and ranges) from an `internal` location.
+    "x-sendfile"        The same with X-Sendfile and the absolute path, for
+                        Apache mod_xsendfile and lighttpd.
+
+The offloaded modes need files on local disk and fall back to "django"
+with the GridFS backend. The view does the permission check either way;
+the front end only sees the file after Django has allowed it.
+"""
+
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse, Http404
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe, quote_etag
+
+from core.media_store import local_path
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def check_name(rel_path):
+    """The storage name, refusing absolute paths, `..` and files that don't exist."""
+    parts = (rel_path or "").replace("\\", "/").split("/")
+    if not rel_path or rel_path.startswith("/") or ".." in parts or not default_storage.exists(rel_path):
+        raise Http404("File not found")
+    return rel_path
+
+
+def parse_range(header, size):
+    """
+    (start, end) of a single "bytes=" range, inclusive; None to send the
+    whole file (no header, several ranges, or a syntax we don't handle);
+    False when the range can't be satisfied.
+    """
+    match = RANGE_RE.match((header or "").replace(" ", ""))
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+class _RangeFile:
+    """Read at most `length` bytes of an open file from its current position."""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b""
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def file_etag(size, modified):
+    return quote_etag(f"{int(modified.timestamp() * 1e6):x}-{size:x}")
+
+
+def _if_range_matches(request, etag, modified):
+    """A Range only applies if If-Range (when given) still names this version of the file."""
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    since = parse_http_date_safe(if_range)
+    return since is not None and int(modified.timestamp()) <= since
+
+
+def _open(rel_path):
+    # A real file on the filesystem backend, so WSGI servers can use sendfile()
+    path = local_path(rel_path)
+    return open(path, "rb") if path else default_storage.open(rel_path, "rb")
+
+
+def serve_file(request, rel_path, filename=None, as_attachment=True, cache_control="private"):
+    """Response for the stored file `rel_path`, honouring Range and If-Range."""
+    rel_path = check_name(rel_path)
+    filename = filename or os.path.basename(rel_path)
+    mode = getattr(settings, "COURSE_FILE_SERVING", "django")
+    full_path = local_path(rel_path)
+
+    if mode in ("x-accel-redirect", "x-sendfile") and full_path:
+        response = HttpResponse(content_type=mimetypes.guess_type(filename)[0] or "application/octet-stream")
+        if mode == "x-accel-redirect":
+            prefix = getattr(settings, "COURSE_FILE_ACCEL_PREFIX", "/protected-media/")
+            response["X-Accel-Redirect"] = prefix.rstrip("/") + "/" + rel_path
+        else:
+            response["X-Sendfile"] = full_path
+        response["Content-Disposition"] = content_disposition_header(as_attachment, filename)
+        return response
+
+    size = default_storage.size(rel_path)
+    modified = default_storage.get_modified_time(rel_path)
+    etag = file_etag(size, modified)
+    byte_range = parse_range(request.headers.get("Range"), size)
+    if byte_range is not None and not _if_range_matches(request, etag, modified):
+        byte_range = None
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    file = _open(rel_path)
+    if byte_range is None:
+        response = FileResponse(file, as_attachment=as_attachment, filename=filename)
+    else:
+        start, end = byte_range
+        file.seek(start)
+        if end == size - 1:
+            # The rest of the file: keep the real file object so sendfile() can be used
+            response = FileResponse(file, as_attachment=as_attachment, filename=filename, status=206)
+        else:
+            response = FileResponse(_RangeFile(file, end - start + 1), as_attachment=as_attachment,
+                                    filename=filename, status=206)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    # FileResponse can't measure every file object (GridFS, partial ranges)
+    response["Content-Length"] = end - start + 1 if byte_range else size
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(modified.timestamp())
+    response["Cache-Control"] = cache_control
+    return response
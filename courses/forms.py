@@ -5,8 +5,13 @@ import datetime
 import os
 from django.conf import settings  # Import settings to get MEDIA_ROOT
 
-# Assuming get_db is available from users.views as per previous conversation
-from users.views import get_db
+from core.mongo import get_db
+from courses.catalog import catalog_fields, instructor_name
+from courses.snapshot import bump_catalog_version
+from courses.uploads import claim_upload, get_upload
+from enrollments import counters
+from messages_app.summaries import rename_course
+from dashboard.metrics import invalidate_dashboard_metrics
 
 
 class CourseForm(forms.Form):
@@ -16,6 +21,8 @@ class CourseForm(forms.Form):
     category = forms.CharField(max_length=100, required=True)
     course_photo = forms.ImageField(required=False, help_text="Upload a cover photo for your course.")
     file = forms.FileField(required=False, help_text="Upload the main course material (e.g., ZIP, PDF).")
+    # Set by the page when the file was sent in chunks beforehand (courses.uploads)
+    file_upload_id = forms.CharField(required=False, widget=forms.HiddenInput)
 
     def __init__(self, *args, **kwargs):
         self.instructor_id = kwargs.pop('instructor_id', None)
@@ -24,10 +31,8 @@ class CourseForm(forms.Form):
 
     def clean_title(self):
         title = self.cleaned_data['title']
-        conn = None
         try:
-            db, conn = get_db()
-            courses_collection = db['courses']
+            courses_collection = get_db()['courses']
 
             query = {"title": title, "instructor_id": ObjectId(self.instructor_id)}
             if self.instance_id:  # Exclude current instance if updating
@@ -38,12 +43,32 @@ class CourseForm(forms.Form):
         except Exception as e:
             # Re-raise ValidationError or add a non-field error
             raise forms.ValidationError(f"Database error during title validation: {e}")
-        finally:
-            if conn:
-                conn.close()
         return title
 
-    def save(self, courses_collection, instructor_id, course_photo_path=None, file_path=None):
+    def clean_file_upload_id(self):
+        upload_id = self.cleaned_data.get('file_upload_id', '').strip()
+        if upload_id:
+            upload = get_upload(upload_id, self.instructor_id)
+            if not upload or upload.get("status") != "complete":
+                raise forms.ValidationError("The course file upload did not finish. Please choose the file again.")
+        return upload_id
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # The view stores `file` before save() claims the upload; one of them would be left unreferenced
+        if cleaned_data.get('file') and cleaned_data.get('file_upload_id'):
+            raise forms.ValidationError("Send the course file either directly or as a chunked upload, not both.")
+        return cleaned_data
+
+    def save(self, courses_collection, instructor_id, course_photo_path=None, file_path=None, file_name=None):
+        self.claimed_upload = None
+        if self.cleaned_data.get('file_upload_id'):
+            # The file is already in the media store; take its path from the upload
+            self.claimed_upload = claim_upload(self.cleaned_data['file_upload_id'], instructor_id)
+            if not self.claimed_upload:
+                # Used by another submit of this form since clean(), or purged as stale
+                raise forms.ValidationError("The course file upload is no longer available. Please choose the file again.")
+            file_path, file_name = self.claimed_upload["file"], self.claimed_upload["filename"]
         course_doc = {
             "title": self.cleaned_data['title'],
             "description": self.cleaned_data['description'],
@@ -51,11 +76,14 @@ class CourseForm(forms.Form):
             "category": self.cleaned_data['category'],
             "course_photo": course_photo_path if course_photo_path else 'courses/default_course.jpg',
             "file": file_path if file_path else None,  # Can be None if no file uploaded
+            "file_name": file_name if file_path else None,  # Download name; stored files are named by content
             "instructor_id": ObjectId(instructor_id),
             "created_at": datetime.datetime.utcnow(),
             "updated_at": datetime.datetime.utcnow(),
             "status": "pending",  # Set default status to pending for admin approval
         }
+        # Instructor name and search keywords for the catalog pages
+        course_doc.update(catalog_fields(course_doc["title"], instructor_name(ObjectId(instructor_id))))
 
         if self.instance_id:
             # Update existing course
@@ -63,8 +91,13 @@ class CourseForm(forms.Form):
                 {"_id": ObjectId(self.instance_id)},
                 {"$set": course_doc}
             )
+            rename_course(ObjectId(self.instance_id), course_doc["title"])
+            # An edited course goes back to pending approval
+            invalidate_dashboard_metrics()
+            bump_catalog_version()
             return self.instance_id
         else:
             # Insert new course
+            course_doc.update({counters.TOTAL: 0, counters.APPROVED: 0, counters.PENDING: 0})
             result = courses_collection.insert_one(course_doc)
             return str(result.inserted_id)
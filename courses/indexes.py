@@ -0,0 +1,19 @@
+"""MongoDB indexes for the courses collection (see `manage.py ensure_mongo_indexes`)."""
+
+INDEXES = {
+    "courses": [
+        {"keys": [("instructor_id", 1)], "name": "instructor_id"},
+        {"keys": [("category", 1), ("status", 1)], "name": "category_status"},
+        # Catalog pages (courses.catalog): one index per sort, with and without a category
+        {"keys": [("status", 1), ("created_at", -1), ("_id", -1)], "name": "catalog_newest"},
+        {"keys": [("status", 1), ("enrollment_count", -1), ("_id", -1)], "name": "catalog_most_enrolled"},
+        {"keys": [("status", 1), ("category", 1), ("created_at", -1), ("_id", -1)], "name": "catalog_category_newest"},
+        {"keys": [("status", 1), ("category", 1), ("enrollment_count", -1), ("_id", -1)], "name": "catalog_category_most_enrolled"},
+        # Word-prefix search
+        {"keys": [("search_keywords", 1), ("status", 1)], "name": "catalog_search_keywords"},
+    ],
+    "course_uploads": [
+        # Abandoned sessions for `manage.py purge_course_uploads`
+        {"keys": [("updated_at", 1)], "name": "updated_at"},
+    ],
+}
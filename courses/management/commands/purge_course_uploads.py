@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from courses.uploads import purge_stale_uploads
+
+
+class Command(BaseCommand):
+    help = "Delete chunked course file uploads that were abandoned, and their files."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours", type=float, default=getattr(settings, "COURSE_UPLOAD_EXPIRE_HOURS", 24),
+            help="Remove uploads not touched for this many hours.",
+        )
+
+    def handle(self, *args, **options):
+        removed = purge_stale_uploads(options["hours"])
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} abandoned uploads"))
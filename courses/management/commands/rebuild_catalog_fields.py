@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from courses.catalog import rebuild_catalog_fields
+
+
+class Command(BaseCommand):
+    help = "Recompute the instructor name and search keywords stored on every course."
+
+    def handle(self, *args, **options):
+        updated = rebuild_catalog_fields()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt catalog fields for {updated} courses"))
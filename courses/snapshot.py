@@ -0,0 +1,115 @@
+"""
+Per-worker snapshot of the public course catalog.
+
+The home page and the category filters read approved, available courses
+(with instructor names and ratings) and the category list from memory:
+
+    catalog = get_catalog()
+    catalog.courses[:6], catalog.categories
+
+The snapshot is keyed by a version counter in `catalog_version`:
+
+    {"_id": "courses", "version": n}
+
+Course write paths (approve, reject, update, delete, instructor ban or
+rename, reviews) call bump_catalog_version(). A worker re-reads the
+version at most every CATALOG_SNAPSHOT_CHECK_SECONDS and rebuilds only
+when it changed, so in the steady state pages are served without MongoDB
+reads. Other workers pick up a change within that interval; the worker
+that made it rebuilds on its next request.
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+
+from core import images
+from core.mongo import db
+from reviews.ratings import average_rating
+
+VERSION_COLLECTION = "catalog_version"
+VERSION_ID = "courses"
+
+Catalog = namedtuple("Catalog", ["version", "courses", "categories"])
+
+_PROJECTION = {
+    "title": 1, "category": 1, "price": 1, "course_photo": 1, "course_photo_variants": 1,
+    "description": 1, "instructor_id": 1, "instructor_name": 1, "rating_summary": 1,
+}
+
+
+def current_version():
+    doc = db[VERSION_COLLECTION].find_one({"_id": VERSION_ID})
+    return doc.get("version", 0) if doc else 0
+
+
+def _load(version):
+    courses = list(
+        db["courses"].find({"status": "approved", "is_available": {"$ne": False}}, _PROJECTION)
+        .sort([("created_at", -1), ("_id", -1)])
+    )
+    # Courses saved before instructor_name existed (see courses.catalog)
+    missing = {c.get("instructor_id") for c in courses if not c.get("instructor_name")}
+    names = {
+        u["_id"]: u.get("username", "Unknown")
+        for u in db["users"].find({"_id": {"$in": list(missing)}}, {"username": 1})
+    } if missing else {}
+
+    rows = [{
+        "id": str(c["_id"]),
+        "title": c.get("title", ""),
+        "category": c.get("category", ""),
+        "price": c.get("price", 0),
+        "photo": c.get("course_photo", ""),
+        "thumb": images.variant(c, "course_photo"),
+        "thumb_webp": images.variant(c, "course_photo", "thumb_webp"),
+        "rating": average_rating(c),
+        "description": c.get("description", "No description available"),
+        "instructor": c.get("instructor_name") or names.get(c.get("instructor_id"), "Unknown"),
+    } for c in courses]
+    categories = sorted({c["category"] for c in rows if c["category"]})
+    return Catalog(version, rows, categories)
+
+
+class CatalogSnapshot:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._catalog = None
+        self._checked_at = 0.0
+
+    def get(self):
+        interval = getattr(settings, "CATALOG_SNAPSHOT_CHECK_SECONDS", 5)
+        if self._catalog is not None and time.monotonic() - self._checked_at < interval:
+            return self._catalog
+        with self._lock:
+            if self._catalog is None or time.monotonic() - self._checked_at >= interval:
+                # Read the version before the courses: a bump in between only causes another rebuild
+                version = current_version()
+                if self._catalog is None or self._catalog.version != version:
+                    self._catalog = _load(version)
+                self._checked_at = time.monotonic()
+        return self._catalog
+
+    def expire(self):
+        """Re-check the version on the next get()."""
+        self._checked_at = 0.0
+
+
+snapshot = CatalogSnapshot()
+
+
+def get_catalog():
+    """This worker's catalog snapshot, rebuilt if the catalog version changed."""
+    return snapshot.get()
+
+
+def bump_catalog_version():
+    """Mark the catalog as changed for every worker."""
+    try:
+        db[VERSION_COLLECTION].update_one({"_id": VERSION_ID}, {"$inc": {"version": 1}}, upsert=True)
+    except Exception as e:
+        # Workers still rebuild once the version moves again
+        print(f"Error bumping catalog version: {e}")
+    snapshot.expire()
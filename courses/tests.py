@@ -1,3 +1,104 @@
-from django.test import TestCase
+import datetime
+from unittest import mock
 
-# Create your tests here.
+from bson.objectid import ObjectId
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase
+from django.utils.http import http_date
+
+from core.views import is_private, serve_local_media
+from courses import views
+from courses.downloads import _if_range_matches, file_etag, parse_range
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_no_header_or_unsupported(self):
+        self.assertIsNone(parse_range(None, 1000))
+        self.assertIsNone(parse_range("bytes=-", 1000))
+        self.assertIsNone(parse_range("bytes=0-1,5-6", 1000))
+        self.assertIsNone(parse_range("items=0-1", 1000))
+
+    def test_bounded_and_open_ranges(self):
+        self.assertEqual(parse_range("bytes=0-99", 1000), (0, 99))
+        self.assertEqual(parse_range("bytes=900-", 1000), (900, 999))
+        # An end past the file is clamped
+        self.assertEqual(parse_range("bytes=900-5000", 1000), (900, 999))
+
+    def test_suffix_ranges(self):
+        self.assertEqual(parse_range("bytes=-100", 1000), (900, 999))
+        self.assertEqual(parse_range("bytes=-5000", 1000), (0, 999))
+        self.assertIs(parse_range("bytes=-0", 1000), False)
+        self.assertIs(parse_range("bytes=-10", 0), False)
+
+    def test_unsatisfiable_ranges(self):
+        self.assertIs(parse_range("bytes=1000-", 1000), False)
+        self.assertIs(parse_range("bytes=1500-1600", 1000), False)
+        self.assertIs(parse_range("bytes=50-10", 1000), False)
+
+
+class IfRangeTests(SimpleTestCase):
+    def setUp(self):
+        self.modified = datetime.datetime(2025, 8, 1, 12, 0, tzinfo=datetime.timezone.utc)
+        self.etag = file_etag(1000, self.modified)
+
+    def matches(self, if_range=None):
+        headers = {"HTTP_IF_RANGE": if_range} if if_range else {}
+        request = RequestFactory().get("/", HTTP_RANGE="bytes=0-9", **headers)
+        return _if_range_matches(request, self.etag, self.modified)
+
+    def test_without_if_range(self):
+        self.assertTrue(self.matches())
+
+    def test_etag(self):
+        self.assertTrue(self.matches(self.etag))
+        self.assertFalse(self.matches('"other"'))
+
+    def test_date(self):
+        self.assertTrue(self.matches(http_date(self.modified.timestamp())))
+        self.assertFalse(self.matches(http_date(self.modified.timestamp() - 60)))
+        self.assertFalse(self.matches("not a date"))
+
+
+class DownloadPermissionTests(SimpleTestCase):
+    def setUp(self):
+        self.course_id = ObjectId()
+        self.course = {"_id": self.course_id, "file": "course_files/ab/abc.pdf", "instructor_id": ObjectId()}
+
+    def download(self, session):
+        request = RequestFactory().get(f"/courses/{self.course_id}/download/")
+        request.session = session
+        with mock.patch.object(views, "courses_col") as courses_col, \
+                mock.patch.object(views, "enrollments_col") as enrollments_col, \
+                mock.patch.object(views, "serve_file") as serve_file:
+            courses_col.find_one.return_value = self.course
+            enrollments_col.count_documents.return_value = 0
+            response = views.download_course_file(request, str(self.course_id))
+            serve_file.assert_not_called()
+        return response
+
+    def test_unenrolled_student_is_refused(self):
+        self.assertEqual(self.download({"student_id": str(ObjectId())}).status_code, 403)
+
+    def test_other_instructor_is_refused(self):
+        session = {"role": "instructor", "user_id": str(ObjectId())}
+        self.assertEqual(self.download(session).status_code, 302)
+
+    def test_anonymous_is_sent_to_login(self):
+        response = self.download({})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("login", response["Location"])
+
+
+class PrivateMediaTests(SimpleTestCase):
+    def test_private_folders(self):
+        self.assertTrue(is_private("course_files/ab/abc.pdf"))
+        self.assertTrue(is_private("/uploads_tmp/x.part"))
+        self.assertTrue(is_private("course_photos/../course_files/ab/abc.pdf"))
+        self.assertFalse(is_private("course_photos/ab/abc.jpg"))
+
+    def test_media_view_refuses_course_files(self):
+        request = RequestFactory().get("/media/course_files/ab/abc.pdf")
+        with mock.patch("core.views.serve") as serve:
+            with self.assertRaises(Http404):
+                serve_local_media(request, "course_files/ab/abc.pdf", "/tmp")
+            serve.assert_not_called()
@@ -0,0 +1,208 @@
+"""
+Chunked, resumable uploads of course files.
+
+Instead of one multipart POST, the course form sends the main file in
+chunks before submitting:
+
+    POST instructor/uploads/                 {"filename", "size"} -> {"upload_id", "chunk_size", "received"}
+    PUT  instructor/uploads/<id>/?offset=N   raw chunk, X-Chunk-SHA256: <hex digest of the chunk>
+    GET  instructor/uploads/<id>/            {"received": N, ...} to resume after a dropped connection
+    POST instructor/uploads/<id>/complete/   -> {"upload_id", "status": "complete"}
+
+and then posts the form with only the upload id (CourseForm.file_upload_id).
+
+Each session is a document in `course_uploads`:
+
+    {"_id", "instructor_id", "filename", "size", "received", "digests": [chunk SHA-256, ...],
+     "status": "uploading" | "complete", "part": "uploads_tmp/<id>.part",
+     "file": "course_files/<aa>/<hash>.<ext>" once complete}
+
+Chunks are written straight into the .part file at their offset while
+their checksum is computed, and `received` only moves forward when the
+digest matches and the chunk starts where the previous one ended; a
+repeated chunk (a retry whose response was lost) is acknowledged without
+writing. complete() moves the .part file into the media store
+(core.media_store) without reading it back: its content key is the
+SHA-256 of the chunk digests, so re-uploads of the same file in the same
+chunk size are stored once. The course form claims (and deletes) the
+session when it saves. `manage.py purge_course_uploads` removes sessions
+that were abandoned.
+"""
+
+import datetime
+import hashlib
+import os
+import re
+
+from bson.objectid import ObjectId
+from django.conf import settings
+
+from core import media_store
+from core.mongo import db
+
+uploads_col = db["course_uploads"]
+
+PART_DIR = "uploads_tmp"
+FILES_DIR = "course_files"
+READ_BLOCK = 64 * 1024
+
+
+def chunk_size():
+    return getattr(settings, "COURSE_UPLOAD_CHUNK_SIZE", 4 * 1024 * 1024)
+
+
+def max_size():
+    return getattr(settings, "COURSE_UPLOAD_MAX_SIZE", 2 * 1024 * 1024 * 1024)
+
+
+def _abs(rel_path):
+    # .part files are always on local disk, also when media is stored in GridFS
+    return os.path.join(getattr(settings, "COURSE_UPLOAD_TEMP_DIR", None) or settings.MEDIA_ROOT, rel_path)
+
+
+def _safe_name(filename):
+    name = os.path.basename((filename or "").replace("\\", "/"))
+    return re.sub(r"[^\w.\- ]", "_", name).strip() or "course_file"
+
+
+def get_upload(upload_id, instructor_id):
+    """The instructor's upload session, or None (also for malformed ids)."""
+    try:
+        return uploads_col.find_one({"_id": ObjectId(upload_id), "instructor_id": ObjectId(instructor_id)})
+    except Exception:
+        return None
+
+
+def start_upload(instructor_id, filename, size):
+    """Create an upload session and its empty .part file. Raises ValueError for a bad size."""
+    size = int(size)
+    if size <= 0 or size > max_size():
+        raise ValueError(f"File size must be between 1 byte and {max_size()} bytes.")
+    upload_id = ObjectId()
+    part = f"{PART_DIR}/{upload_id}.part"
+    os.makedirs(_abs(PART_DIR), exist_ok=True)
+    open(_abs(part), "wb").close()
+    now = datetime.datetime.utcnow()
+    upload = {
+        "_id": upload_id,
+        "instructor_id": ObjectId(instructor_id),
+        "filename": _safe_name(filename),
+        "size": size,
+        "received": 0,
+        "digests": [],
+        "status": "uploading",
+        "part": part,
+        "created_at": now,
+        "updated_at": now,
+    }
+    uploads_col.insert_one(upload)
+    return upload
+
+
+def write_chunk(upload, offset, stream, length, checksum):
+    """
+    Write `length` bytes from `stream` at `offset` and verify their SHA-256
+    against `checksum` (hex). Returns the number of bytes received so far.
+    Raises ValueError for a chunk that can't be accepted; a chunk at the
+    wrong offset is not written, and the caller reports `received` so the
+    client can continue from there.
+    """
+    if upload["status"] != "uploading":
+        raise ValueError("Upload is already complete.")
+    if not checksum:
+        raise ValueError("Missing X-Chunk-SHA256 header.")
+    if length <= 0 or length > chunk_size() or offset + length > upload["size"]:
+        raise ValueError("Chunk is empty, too large or past the end of the file.")
+    received = upload["received"]
+    if offset + length <= received:
+        return received  # Already have it: the client is retrying
+    if offset != received:
+        return received
+
+    digest = hashlib.sha256()
+    remaining = length
+    with open(_abs(upload["part"]), "r+b") as part:
+        part.seek(offset)
+        while remaining:
+            block = stream.read(min(READ_BLOCK, remaining))
+            if not block:
+                break
+            digest.update(block)
+            part.write(block)
+            remaining -= len(block)
+    if remaining:
+        raise ValueError("Chunk ended before Content-Length bytes.")
+    if digest.hexdigest() != checksum.strip().lower():
+        raise ValueError("Chunk checksum does not match.")
+
+    # Only the request that wrote from the current end moves it forward
+    uploads_col.update_one(
+        {"_id": upload["_id"], "received": offset},
+        {
+            "$set": {"received": offset + length, "updated_at": datetime.datetime.utcnow()},
+            "$push": {"digests": digest.hexdigest()},
+        },
+    )
+    return offset + length
+
+
+def complete_upload(upload):
+    """Move the finished .part file into the media store. Returns the updated session."""
+    if upload["status"] == "complete":
+        return upload
+    if upload["received"] != upload["size"]:
+        raise ValueError(f"Upload is incomplete: {upload['received']} of {upload['size']} bytes received.")
+    # Only one request may move the .part file
+    claimed = uploads_col.find_one_and_update(
+        {"_id": upload["_id"], "status": "uploading"},
+        {"$set": {"status": "completing", "updated_at": datetime.datetime.utcnow()}},
+    )
+    if not claimed:
+        return uploads_col.find_one({"_id": upload["_id"]})
+    digest = hashlib.sha256("".join(upload["digests"]).encode()).hexdigest()
+    file_path = media_store.adopt(_abs(upload["part"]), FILES_DIR, digest, upload["filename"], upload["size"])
+    uploads_col.update_one(
+        {"_id": upload["_id"]},
+        {"$set": {"status": "complete", "file": file_path, "updated_at": datetime.datetime.utcnow()}},
+    )
+    return {**upload, "status": "complete", "file": file_path}
+
+
+def claim_upload(upload_id, instructor_id):
+    """
+    A completed upload, removed so it is used only once. The reference
+    counted by complete() passes to the course. None if there is none.
+    """
+    return uploads_col.find_one_and_delete({
+        "_id": ObjectId(upload_id),
+        "instructor_id": ObjectId(instructor_id),
+        "status": "complete",
+    })
+
+
+def status(upload):
+    return {
+        "upload_id": str(upload["_id"]),
+        "filename": upload["filename"],
+        "size": upload["size"],
+        "received": upload["received"],
+        "status": upload["status"],
+        "chunk_size": chunk_size(),
+    }
+
+
+def purge_stale_uploads(max_age_hours=None):
+    """Delete sessions (and their files) not touched for max_age_hours. Returns the number removed."""
+    if max_age_hours is None:
+        max_age_hours = getattr(settings, "COURSE_UPLOAD_EXPIRE_HOURS", 24)
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(hours=max_age_hours)
+    removed = 0
+    for upload in uploads_col.find({"updated_at": {"$lt": cutoff}}):
+        # Only delete what we still own: a claimed upload's file belongs to its course
+        if uploads_col.delete_one({"_id": upload["_id"], "updated_at": upload["updated_at"]}).deleted_count:
+            if upload.get("file"):
+                media_store.release(upload["file"])
+            elif os.path.exists(_abs(upload["part"])):
+                os.remove(_abs(upload["part"]))
+            removed += 1
+    return removed
@@ -1,9 +1,13 @@
 from django.shortcuts import render, redirect
-from pymongo import MongoClient
 from bson.objectid import ObjectId
-
-client = MongoClient("localhost", 27017)
-db = client["Peer_to_Peer_Education"]
+from core.mongo import db
+from core.loader import get_loader
+from dashboard.metrics import invalidate_dashboard_metrics
+from core import images, media_store
+from core.jobs import enqueue_job
+from enrollments.counters import delete_course
+from courses.snapshot import bump_catalog_version
+from courses.downloads import serve_file
 enrollments_col = db["enrollments"]
 courses_col = db["courses"]
 users_col = db["users"]
@@ -17,19 +21,28 @@ def my_courses(request):
     # Fetch student info for header/profile
     student = users_col.find_one(
         {"_id": student_id, "role": "student"},
-        {"username": 1, "profile_photo": 1}
+        {"username": 1, "profile_photo": 1, "profile_photo_variants": 1}
     )
     student_name = student.get("username", "Unknown") if student else "Unknown"
-    student_profile_pic = student.get("profile_photo") if student else None
+    student_profile_pic = images.variant(student, "profile_photo") if student else None
 
     # Only show courses after instructor approval
-    enrollments = enrollments_col.find({"student_id": student_id, "approval_status": "Approved"})
+    enrollments = list(enrollments_col.find({"student_id": student_id, "approval_status": "Approved"}))
+
+    # Courses, then their instructors, one query each
+    loader = get_loader(request)
+    courses_by_id = loader.load_many(
+        "courses", [e["course_id"] for e in enrollments], ["title", "instructor_id", "category", "file"]
+    )
+    instructors_by_id = loader.load_many(
+        "users", [c.get("instructor_id") for c in courses_by_id.values()], ["username"]
+    )
 
     enrolled_courses = []
     for enroll in enrollments:
-        course = courses_col.find_one({"_id": enroll["course_id"]})
+        course = courses_by_id.get(enroll["course_id"])
         if course:
-            instructor = users_col.find_one({"_id": course["instructor_id"]}, {"username": 1})
+            instructor = instructors_by_id.get(course.get("instructor_id"))
             enrolled_courses.append({
                 "title": course.get("title", ""),
                 "instructor": instructor.get("username", "Unknown") if instructor else "Unknown",
@@ -48,19 +61,56 @@ def my_courses(request):
     return render(request, "courses/my_courses.html", context)
 
 
+def download_course_file(request, course_id):
+    """
+    The course's main file, for students with an approved enrollment, the
+    course's instructor and admins. Supports Range requests (see courses.downloads).
+    """
+    try:
+        course_oid = ObjectId(course_id)
+    except Exception:
+        raise Http404("Course not found")
+    course = courses_col.find_one({"_id": course_oid}, {"file": 1, "file_name": 1, "instructor_id": 1})
+    if not course or not course.get("file"):
+        raise Http404("Course file not found")
+
+    allowed = bool(request.session.get("admin_name"))
+    if not allowed and request.session.get("role") == "instructor" and request.session.get("user_id"):
+        allowed = str(course.get("instructor_id")) == request.session["user_id"]
+    if not allowed and request.session.get("student_id"):
+        allowed = enrollments_col.count_documents({
+            "student_id": ObjectId(request.session["student_id"]),
+            "course_id": course_oid,
+            "approval_status": "Approved",
+        }, limit=1) > 0
+    if not allowed:
+        if not request.session.get("student_id"):
+            return redirect("student_login")
+        return HttpResponse("Access Denied: you are not enrolled in this course.", status=403)
+
+    # Stored files are named by content (core.media_store); older uploads
+    # as "<uuid hex>_<original name>". Offer the original name
+    filename = course.get("file_name") or os.path.basename(course["file"])
+    prefix, _, original = filename.partition("_")
+    if len(prefix) == 32 and original:
+        filename = original
+    return serve_file(request, course["file"], filename)
+
+
 # Instructor Part
 from django.shortcuts import render, redirect, get_object_or_404
+from django.core.exceptions import ValidationError
 from django.http import HttpResponse, Http404
 from django.views.decorators.csrf import csrf_protect
 import pymongo
 from bson.objectid import ObjectId, InvalidId
 import datetime
 import os
-import uuid
 from django.conf import settings
 
 # Import custom session and DB functions from users.views
-from users.views import get_db, load_session, save_session, manual_login_required, manual_instructor_required
+from users.views import manual_login_required, manual_instructor_required
+from core.mongo import get_db
 
 from .forms import CourseForm  # Import the new CourseForm
 
@@ -68,7 +118,7 @@ from .forms import CourseForm  # Import the new CourseForm
 # --- Helper function for common context data ---
 def get_instructor_context(request):
     """Returns common instructor session data for templates."""
-    session_data = request.session_data if hasattr(request, 'session_data') else load_session(request)[1]
+    session_data = request.session
     return {
         'instructor_name': session_data.get('instructor_name', ''),
         'instructor_photo': session_data.get('instructor_photo', ''),
@@ -81,22 +131,15 @@ def get_instructor_context(request):
 @manual_login_required
 @manual_instructor_required
 def instructor_course_list(request):
-    db, conn = get_db()
-    if db is None:
-        return HttpResponse("Database connection failed.", status=500)
+    db = get_db()
 
     try:
-        session_id, session_data = load_session(request)
-        request.session_data = session_data
-        request.session_id = session_id
 
         courses_collection = db['courses']
-        instructor_id = request.session_data.get('user_id')
+        instructor_id = request.session.get('user_id')
 
         if not instructor_id:
-            response = HttpResponse("Instructor ID not found in session.", status=400)
-            save_session(response, request.session_id, request.session_data)
-            return response
+            return HttpResponse("Instructor ID not found in session.", status=400)
 
         # Fetch courses for the logged-in instructor
         courses_cursor = courses_collection.find({"instructor_id": ObjectId(instructor_id)}).sort("created_at", -1)
@@ -105,41 +148,31 @@ def instructor_course_list(request):
         # Fix: Convert ObjectId to string for template access
         for course in courses_list:
             course['id_str'] = str(course['_id'])
+            course['thumb'] = images.variant(course, 'course_photo')
+            course['thumb_webp'] = images.variant(course, 'course_photo', 'thumb_webp')
 
         context = {
             'courses': courses_list,
             **get_instructor_context(request)  # Add common instructor data
         }
-        response = render(request, 'courses/instructor_course_list.html', context)
-        save_session(response, request.session_id, request.session_data)
-        return response
+        return render(request, 'courses/instructor_course_list.html', context)
     except Exception as e:
         return HttpResponse(f"Database connection error: {e}", status=500)
-    finally:
-        if conn:
-            conn.close()
 
 
 @csrf_protect
 @manual_login_required
 @manual_instructor_required
 def instructor_course_create(request):
-    db, conn = get_db()
-    if db is None:
-        return HttpResponse("Database connection failed.", status=500)
+    db = get_db()
 
     try:
-        session_id, session_data = load_session(request)
-        request.session_data = session_data
-        request.session_id = session_id
 
         courses_collection = db['courses']
-        instructor_id = request.session_data.get('user_id')
+        instructor_id = request.session.get('user_id')
 
         if not instructor_id:
-            response = HttpResponse("Instructor ID not found in session.", status=400)
-            save_session(response, request.session_id, request.session_data)
-            return response
+            return HttpResponse("Instructor ID not found in session.", status=400)
 
         if request.method == 'POST':
             form = CourseForm(request.POST, request.FILES, instructor_id=instructor_id)
@@ -149,35 +182,25 @@ def instructor_course_create(request):
                 course_photo_path = None
                 file_path = None
 
-                # Handle course photo upload
+                # Uploads go to the content-addressed media store (core.media_store)
                 if course_photo_file:
-                    upload_dir = os.path.join(settings.MEDIA_ROOT, 'course_photos')
-                    os.makedirs(upload_dir, exist_ok=True)
-                    unique_filename = f"{uuid.uuid4().hex}_{course_photo_file.name}"
-                    file_path_on_disk = os.path.join(upload_dir, unique_filename)
-                    with open(file_path_on_disk, 'wb+') as destination:
-                        for chunk in course_photo_file.chunks():
-                            destination.write(chunk)
-                    course_photo_path = os.path.join('course_photos', unique_filename).replace('\\', '/')
-
-                # Handle main course file upload
+                    course_photo_path = media_store.save(course_photo_file, 'course_photos')
                 if main_file:
-                    upload_dir = os.path.join(settings.MEDIA_ROOT, 'course_files')
-                    os.makedirs(upload_dir, exist_ok=True)
-                    unique_filename = f"{uuid.uuid4().hex}_{main_file.name}"
-                    file_path_on_disk = os.path.join(upload_dir, unique_filename)
-                    with open(file_path_on_disk, 'wb+') as destination:
-                        for chunk in main_file.chunks():
-                            destination.write(chunk)
-                    file_path = os.path.join('course_files', unique_filename).replace('\\', '/')
+                    file_path = media_store.save(main_file, 'course_files')
 
                 try:
-                    form.save(courses_collection, instructor_id, course_photo_path, file_path)
-                    response = redirect('instructor_course_list')
-                    save_session(response, request.session_id, request.session_data)
-                    return response
+                    course_id = form.save(courses_collection, instructor_id, course_photo_path, file_path,
+                                          main_file.name if main_file else None)
+                    if course_photo_path:
+                        # Thumbnail and WebP variants for the catalog cards (core.images)
+                        images.record_variants("courses", ObjectId(course_id), "course_photo", course_photo_path, "course")
+                    return redirect('instructor_course_list')
                 except Exception as e:
-                    form.add_error(None, str(e))  # Add a non-field error for database issues
+                    # The claimed upload's reference passed to the course that wasn't saved
+                    claimed = form.claimed_upload
+                    media_store.release(course_photo_path, file_path, claimed and claimed["file"])
+                    # Add a non-field error for database issues or an upload that is gone
+                    form.add_error(None, e if isinstance(e, ValidationError) else str(e))
             # If form is not valid, it falls through to render with errors
         else:
             form = CourseForm(instructor_id=instructor_id)  # Pass instructor_id for initial form setup
@@ -187,31 +210,21 @@ def instructor_course_create(request):
             'form_type': 'Create',
             **get_instructor_context(request)  # Add common instructor data
         }
-        response = render(request, 'courses/instructor_course_form.html', context)
-        save_session(response, request.session_id, request.session_data)
-        return response
+        return render(request, 'courses/instructor_course_form.html', context)
     except Exception as e:
         return HttpResponse(f"Database connection error: {e}", status=500)
-    finally:
-        if conn:
-            conn.close()
 
 
 @manual_login_required
 @manual_instructor_required
 def instructor_course_detail(request, pk):
-    db, conn = get_db()
-    if db is None:
-        return HttpResponse("Database connection failed.", status=500)
+    db = get_db()
 
     try:
-        session_id, session_data = load_session(request)
-        request.session_data = session_data
-        request.session_id = session_id
 
         courses_collection = db['courses']
         course = courses_collection.find_one(
-            {"_id": ObjectId(pk), "instructor_id": ObjectId(request.session_data['user_id'])})
+            {"_id": ObjectId(pk), "instructor_id": ObjectId(request.session['user_id'])})
         if not course:
             raise Http404("Course not found or you don't have permission to view it.")
 
@@ -222,31 +235,21 @@ def instructor_course_detail(request, pk):
             'course': course,
             **get_instructor_context(request)
         }
-        response = render(request, 'courses/instructor_course_detail.html', context)
-        save_session(response, request.session_id, request.session_data)
-        return response
+        return render(request, 'courses/instructor_course_detail.html', context)
     except Exception as e:
         return HttpResponse(f"Database connection error: {e}", status=500)
-    finally:
-        if conn:
-            conn.close()
 
 
 @csrf_protect
 @manual_login_required
 @manual_instructor_required
 def instructor_course_update(request, pk):
-    db, conn = get_db()
-    if db is None:
-        return HttpResponse("Database connection failed.", status=500)
+    db = get_db()
 
     try:
-        session_id, session_data = load_session(request)
-        request.session_data = session_data
-        request.session_id = session_id
 
         courses_collection = db['courses']
-        instructor_id = request.session_data.get('user_id')
+        instructor_id = request.session.get('user_id')
         course = courses_collection.find_one({"_id": ObjectId(pk), "instructor_id": ObjectId(instructor_id)})
         if not course:
             raise Http404("Course not found or you don't have permission to edit it.")
@@ -261,33 +264,31 @@ def instructor_course_update(request, pk):
                 main_file = form.cleaned_data.get('file')
                 course_photo_path = course.get('course_photo')  # Keep existing if not new upload
                 file_path = course.get('file')  # Keep existing if not new upload
+                file_name = course.get('file_name')
 
-                # Handle course photo upload (if new file is provided)
+                # New uploads go to the content-addressed media store (core.media_store)
                 if course_photo_file:
-                    upload_dir = os.path.join(settings.MEDIA_ROOT, 'course_photos')
-                    os.makedirs(upload_dir, exist_ok=True)
-                    unique_filename = f"{uuid.uuid4().hex}_{course_photo_file.name}"
-                    file_path_on_disk = os.path.join(upload_dir, unique_filename)
-                    with open(file_path_on_disk, 'wb+') as destination:
-                        for chunk in course_photo_file.chunks():
-                            destination.write(chunk)
-                    course_photo_path = os.path.join('course_photos', unique_filename).replace('\\', '/')
-
-                # Handle main course file upload (if new file is provided)
+                    course_photo_path = media_store.save(course_photo_file, 'course_photos')
                 if main_file:
-                    upload_dir = os.path.join(settings.MEDIA_ROOT, 'course_files')
-                    os.makedirs(upload_dir, exist_ok=True)
-                    unique_filename = f"{uuid.uuid4().hex}_{main_file.name}"
-                    file_path_on_disk = os.path.join(upload_dir, unique_filename)
-                    with open(file_path_on_disk, 'wb+') as destination:
-                        for chunk in main_file.chunks():
-                            destination.write(chunk)
-                    file_path = os.path.join('course_files', unique_filename).replace('\\', '/')
-
-                form.save(courses_collection, instructor_id, course_photo_path, file_path)
-                response = redirect('instructor_course_detail', pk=pk)
-                save_session(response, request.session_id, request.session_data)
-                return response
+                    file_path = media_store.save(main_file, 'course_files')
+                    file_name = main_file.name
+
+                try:
+                    form.save(courses_collection, instructor_id, course_photo_path, file_path, file_name)
+                except ValidationError as e:
+                    # Nothing was saved: drop the new uploads again
+                    media_store.release(course_photo_file and course_photo_path, main_file and file_path)
+                    form.add_error(None, e)
+                else:
+                    if course_photo_file:
+                        images.record_variants("courses", ObjectId(pk), "course_photo", course_photo_path, "course")
+                    # The course no longer points at the files it replaced (or, for a
+                    # re-upload of the same content, points at them once, not twice)
+                    if course_photo_file:
+                        media_store.release(course.get('course_photo'))
+                    if main_file or form.claimed_upload:
+                        media_store.release(course.get('file'))
+                    return redirect('instructor_course_detail', pk=pk)
             # If form is not valid, it falls through to render with errors
         else:
             # Prepare initial data for the form from the existing course document
@@ -308,31 +309,21 @@ def instructor_course_update(request, pk):
             'course': course,  # Pass course object for template context
             **get_instructor_context(request)
         }
-        response = render(request, 'courses/instructor_course_form.html', context)
-        save_session(response, request.session_id, request.session_data)
-        return response
+        return render(request, 'courses/instructor_course_form.html', context)
     except Exception as e:
         return HttpResponse(f"Database connection error: {e}", status=500)
-    finally:
-        if conn:
-            conn.close()
 
 
 @csrf_protect
 @manual_login_required
 @manual_instructor_required
 def instructor_course_delete(request, pk):
-    db, conn = get_db()
-    if db is None:
-        return HttpResponse("Database connection failed.", status=500)
+    db = get_db()
 
     try:
-        session_id, session_data = load_session(request)
-        request.session_data = session_data
-        request.session_id = session_id
 
         courses_collection = db['courses']
-        instructor_id = request.session_data.get('user_id')
+        instructor_id = request.session.get('user_id')
         course = courses_collection.find_one({"_id": ObjectId(pk), "instructor_id": ObjectId(instructor_id)})
         if not course:
             raise Http404("Course not found or you don't have permission to delete it.")
@@ -341,31 +332,81 @@ def instructor_course_delete(request, pk):
         course['id_str'] = str(course['_id'])
 
         if request.method == 'POST':
-            # Optionally delete associated files from disk
-            if course.get('course_photo') and course['course_photo'] != 'courses/default_course.jpg':
-                file_path = os.path.join(settings.MEDIA_ROOT, course['course_photo'])
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-            if course.get('file'):
-                file_path = os.path.join(settings.MEDIA_ROOT, course['file'])
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-
-            courses_collection.delete_one({"_id": ObjectId(pk)})
-            response = redirect('instructor_course_list')
-            save_session(response, request.session_id, request.session_data)
-            return response
+            # Also takes the course's approved enrollments off the instructor total
+            if delete_course(ObjectId(pk)):
+                # Files shared with other courses stay; `manage.py gc_media` removes unreferenced ones
+                media_store.release(course.get('course_photo'), course.get('file'))
+                # Enrolled students are notified by the `manage.py run_jobs` worker
+                enqueue_job('course_deleted', {'course_id': pk, 'title': course['title']},
+                            key=f'course_deleted:{pk}')
+            invalidate_dashboard_metrics()
+            bump_catalog_version()
+            return redirect('instructor_course_list')
 
         context = {
             'course': course,
             **get_instructor_context(request)
         }
-        response = render(request, 'courses/instructor_course_confirm_delete.html', context)
-        save_session(response, request.session_id, request.session_data)
-        return response
+        return render(request, 'courses/instructor_course_confirm_delete.html', context)
     except Exception as e:
         return HttpResponse(f"Database connection error: {e}", status=500)
-    finally:
-        if conn:
-            conn.close()
 
+
+
+# --- Chunked course file uploads (courses.uploads) ---
+from django.http import JsonResponse
+from django.views.decorators.http import require_http_methods, require_POST
+from courses import uploads
+
+
+@require_POST
+@csrf_protect
+@manual_login_required
+@manual_instructor_required
+def course_file_upload_start(request):
+    try:
+        upload = uploads.start_upload(
+            request.session['user_id'], request.POST.get('filename', ''), request.POST.get('size', 0)
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse(uploads.status(upload), status=201)
+
+
+@require_http_methods(["GET", "PUT"])
+@csrf_protect
+@manual_login_required
+@manual_instructor_required
+def course_file_upload_chunk(request, upload_id):
+    upload = uploads.get_upload(upload_id, request.session['user_id'])
+    if not upload:
+        return JsonResponse({"error": "Upload not found"}, status=404)
+    if request.method == 'GET':
+        return JsonResponse(uploads.status(upload))
+
+    try:
+        offset = int(request.GET.get('offset', ''))
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+        # Stream the body to disk; request.body would hold the whole chunk in memory
+        received = uploads.write_chunk(upload, offset, request, length, request.headers.get('X-Chunk-SHA256'))
+    except ValueError as e:
+        return JsonResponse({"error": str(e), "received": upload["received"]}, status=400)
+    if received < offset + length:
+        # Not where the upload stands: tell the client where to continue
+        return JsonResponse({"error": "Unexpected offset", "received": received}, status=409)
+    return JsonResponse({"received": received})
+
+
+@require_POST
+@csrf_protect
+@manual_login_required
+@manual_instructor_required
+def course_file_upload_complete(request, upload_id):
+    upload = uploads.get_upload(upload_id, request.session['user_id'])
+    if not upload:
+        return JsonResponse({"error": "Upload not found"}, status=404)
+    try:
+        upload = uploads.complete_upload(upload)
+    except ValueError as e:
+        return JsonResponse({"error": str(e), "received": upload["received"]}, status=409)
+    return JsonResponse(uploads.status(upload))
@@ -0,0 +1,262 @@
+"""
+Buffered writer for the `user_activity_logs` collection.
+
+log_user_activity() only appends to an in-process buffer. The buffer is
+written with one insert_many() when it holds ACTIVITY_LOG_BUFFER_SIZE
+entries, every ACTIVITY_LOG_FLUSH_SECONDS from a background thread, and
+once more when the process exits. Inserts use the relaxed
+ACTIVITY_LOG_WRITE_CONCERN: losing a log line is acceptable, making a
+request wait for the journal is not. Entries can take up to
+ACTIVITY_LOG_FLUSH_SECONDS to show up on the dashboard.
+
+Entries get a `category` when they are logged (see categorize()), so the
+dashboard feed filters with an index on (category, timestamp, _id) and
+pages with a keyset cursor instead of filtering in Python.
+
+Each flush also adds the number of inserted entries to a counter document
+in `activity_log_stats`, so the dashboard total is a single-document read:
+
+    {"_id": "total", "count": ...}
+
+Retention (ACTIVITY_LOG_RETENTION_DAYS, None keeps everything):
+
+    "prune" - `manage.py prune_activity_logs` deletes old entries in batches
+              and takes them off the counter (run it from cron)
+    "ttl"   - a TTL index on timestamp expires entries; prune_activity_logs
+              then only re-reads the counter from the collection metadata
+"""
+
+import atexit
+import datetime
+import logging
+import os
+import threading
+
+from django.conf import settings
+from pymongo import WriteConcern
+from pymongo.errors import BulkWriteError
+
+from core import keyset
+from core.mongo import db
+
+LOG_COLLECTION = "user_activity_logs"
+STATS_COLLECTION = "activity_log_stats"
+TOTAL_ID = "total"
+DUPLICATE_KEY = 11000
+
+log = logging.getLogger(__name__)
+
+# Feed filters: category -> label. "admin" is anything done by an admin.
+CATEGORIES = {
+    "login": "Logins",
+    "logout": "Logouts",
+    "register": "Registrations",
+    "profile": "Profile updates",
+    "enrollment": "Enrollments",
+    "admin": "Admin actions",
+}
+OTHER = "other"
+
+# Phrases of the actions logged with performed_by="system"
+_ACTION_CATEGORIES = [
+    ("logged in", "login"),
+    ("logged out", "logout"),
+    ("account created", "register"),
+    ("profile updated", "profile"),
+    ("Enrolled in course", "enrollment"),
+]
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def retention_days():
+    return _setting("ACTIVITY_LOG_RETENTION_DAYS", None)
+
+
+def retention_mode():
+    return _setting("ACTIVITY_LOG_RETENTION_MODE", "prune")
+
+
+def _collection():
+    write_concern = WriteConcern(**_setting("ACTIVITY_LOG_WRITE_CONCERN", {"w": 1, "j": False}))
+    return db[LOG_COLLECTION].with_options(write_concern=write_concern)
+
+
+def _add_to_total(amount):
+    db[STATS_COLLECTION].update_one({"_id": TOTAL_ID}, {"$inc": {"count": amount}}, upsert=True)
+
+
+class ActivityLogWriter:
+    """Per-process buffer of activity log entries, flushed with insert_many()."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._pid = None
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def _check_process(self):
+        # A forked worker must not re-write entries buffered by its parent
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._buffer = []
+            self._thread = None
+
+    def _start_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="activity-log-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(_setting("ACTIVITY_LOG_FLUSH_SECONDS", 5))
+            self._wakeup.clear()
+            self.flush()
+
+    def write(self, entry):
+        with self._lock:
+            self._check_process()
+            self._buffer.append(entry)
+            full = len(self._buffer) >= _setting("ACTIVITY_LOG_BUFFER_SIZE", 100)
+            self._start_thread()
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """Write everything buffered so far. Returns the number of entries inserted."""
+        with self._lock:
+            self._check_process()
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return 0
+        retry = []
+        try:
+            _collection().insert_many(batch, ordered=False)
+            inserted = len(batch)
+        except BulkWriteError as e:
+            log.exception("Error writing activity logs")
+            inserted = e.details.get("nInserted", 0)
+            # Entries already written by an earlier, partly failed flush come
+            # back as duplicate keys (insert_many gave them their _id); only
+            # the others are tried again
+            retry = [
+                batch[error["index"]] for error in e.details.get("writeErrors", [])
+                if error.get("code") != DUPLICATE_KEY
+            ]
+        except Exception:
+            log.exception("Error writing activity logs")
+            # Unknown how much was written; a retry reports those rows as duplicates
+            inserted, retry = 0, batch
+        if inserted:
+            _add_to_total(inserted)
+        if retry:
+            with self._lock:
+                # Keep the entries for the next flush, but never grow without bound
+                limit = 10 * _setting("ACTIVITY_LOG_BUFFER_SIZE", 100)
+                self._buffer = (retry + self._buffer)[-limit:]
+        return inserted
+
+    def discard(self):
+        """Drop buffered entries that were not written yet."""
+        with self._lock:
+            self._buffer = []
+
+
+writer = ActivityLogWriter()
+atexit.register(writer.flush)
+
+
+def categorize(action, performed_by=None):
+    """Feed category of a log entry."""
+    if performed_by and performed_by != "system":
+        return "admin"
+    for phrase, category in _ACTION_CATEGORIES:
+        if phrase in (action or ""):
+            return category
+    return OTHER
+
+
+def log_activity(entry):
+    """Buffer one activity log entry; "timestamp" and "category" are added if missing."""
+    entry.setdefault("timestamp", datetime.datetime.utcnow())
+    entry.setdefault("category", categorize(entry.get("action"), entry.get("performed_by")))
+    writer.write(entry)
+
+
+def feed(category=None, limit=None, before=None):
+    """
+    One page of the activity feed, newest first, optionally limited to a
+    category. Returns (entries, cursor for the next page or None).
+    """
+    limit = limit or _setting("ACTIVITY_FEED_PAGE_SIZE", 10)
+    query = {"category": category} if category else {}
+    query.update(keyset.older_than("timestamp", before))
+    projection = {"username": 1, "role": 1, "action": 1, "performed_by": 1, "timestamp": 1, "category": 1}
+    rows = list(
+        db[LOG_COLLECTION].find(query, projection)
+        .sort(keyset.newest_first("timestamp"))
+        .limit(limit + 1)
+    )
+    return keyset.page(rows, "timestamp", limit)
+
+
+def backfill_categories(batch_size=1000):
+    """Set `category` on entries logged before it existed. Returns the number updated."""
+    logs = db[LOG_COLLECTION]
+    updated = 0
+    while True:
+        batch = list(logs.find({"category": {"$exists": False}}, {"action": 1, "performed_by": 1}).limit(batch_size))
+        if not batch:
+            break
+        by_category = {}
+        for entry in batch:
+            by_category.setdefault(categorize(entry.get("action"), entry.get("performed_by")), []).append(entry["_id"])
+        for category, ids in by_category.items():
+            updated += logs.update_many({"_id": {"$in": ids}}, {"$set": {"category": category}}).modified_count
+    return updated
+
+
+def total_count():
+    """Number of stored activity log entries, from the maintained counter."""
+    doc = db[STATS_COLLECTION].find_one({"_id": TOTAL_ID})
+    if doc is None:
+        return recount()
+    return doc.get("count", 0)
+
+
+def recount():
+    """Reset the counter from the collection metadata (no collection scan). Returns the new total."""
+    count = db[LOG_COLLECTION].estimated_document_count()
+    db[STATS_COLLECTION].update_one({"_id": TOTAL_ID}, {"$set": {"count": count}}, upsert=True)
+    return count
+
+
+def clear_logs():
+    """Delete every activity log entry, including ones still buffered."""
+    writer.discard()
+    db[LOG_COLLECTION].delete_many({})
+    db[STATS_COLLECTION].update_one({"_id": TOTAL_ID}, {"$set": {"count": 0}}, upsert=True)
+
+
+def prune(days=None, batch_size=1000):
+    """
+    Delete entries older than `days` (default ACTIVITY_LOG_RETENTION_DAYS) in
+    batches, taking them off the counter. Returns the number deleted.
+    """
+    days = days if days is not None else retention_days()
+    if days is None:
+        return 0
+    logs = db[LOG_COLLECTION]
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    deleted = 0
+    while True:
+        ids = [doc["_id"] for doc in logs.find({"timestamp": {"$lt": cutoff}}, {"_id": 1}).limit(batch_size)]
+        if not ids:
+            break
+        removed = logs.delete_many({"_id": {"$in": ids}}).deleted_count
+        _add_to_total(-removed)
+        deleted += removed
+    return deleted
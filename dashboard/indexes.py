@@ -0,0 +1,30 @@
+"""MongoDB indexes for the activity log and chart rollups (see `manage.py ensure_mongo_indexes`)."""
+
+from django.conf import settings
+
+_activity_log_indexes = [
+    {"keys": [("action", 1), ("timestamp", -1)], "name": "action_timestamp"},
+    # Dashboard feed, unfiltered and per category, keyset-paged on (timestamp, _id);
+    # timestamp_id also serves timestamp-only queries (counts, pruning)
+    {"keys": [("timestamp", -1), ("_id", -1)], "name": "timestamp_id"},
+    {"keys": [("category", 1), ("timestamp", -1), ("_id", -1)], "name": "category_timestamp_id"},
+]
+if (getattr(settings, "ACTIVITY_LOG_RETENTION_MODE", "prune") == "ttl"
+        and getattr(settings, "ACTIVITY_LOG_RETENTION_DAYS", None) is not None):
+    # Retention by TTL (see dashboard.activity_log), which needs a single-field index
+    _activity_log_indexes.insert(0, {
+        "keys": [("timestamp", -1)], "name": "timestamp",
+        "expireAfterSeconds": settings.ACTIVITY_LOG_RETENTION_DAYS * 86400,
+    })
+
+INDEXES = {
+    "user_activity_logs": _activity_log_indexes,
+    "daily_rollups": [
+        # Chart ranges (user growth)
+        {"keys": [("date", 1)], "name": "date"},
+    ],
+    "instructor_daily_payouts": [
+        # An instructor's earnings chart
+        {"keys": [("instructor_id", 1), ("date", 1)], "name": "instructor_date"},
+    ],
+}
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.activity_log import backfill_categories
+
+
+class Command(BaseCommand):
+    help = "Set the feed category on activity log entries written before categories were stored."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Entries read per batch.")
+
+    def handle(self, *args, **options):
+        updated = backfill_categories(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Categorized {updated} activity log entries"))
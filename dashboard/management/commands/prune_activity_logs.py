@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.activity_log import prune, recount, retention_days, retention_mode
+
+
+class Command(BaseCommand):
+    help = "Apply the activity log retention policy and keep the total counter in step."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, help="Delete entries older than this (defaults to ACTIVITY_LOG_RETENTION_DAYS).")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Entries deleted per batch.")
+        parser.add_argument("--recount", action="store_true", help="Only reset the counter from the collection.")
+
+    def handle(self, *args, **options):
+        if options["recount"] or (retention_mode() == "ttl" and options["days"] is None):
+            # The TTL monitor deletes entries behind the counter's back
+            total = recount()
+            self.stdout.write(self.style.SUCCESS(f"Activity log counter reset to {total}"))
+            return
+        days = options["days"] if options["days"] is not None else retention_days()
+        if days is None:
+            self.stdout.write("No retention configured (ACTIVITY_LOG_RETENTION_DAYS is None); nothing to do.")
+            return
+        deleted = prune(days=days, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} activity log entries older than {days} days"))
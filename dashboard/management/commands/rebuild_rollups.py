@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily chart rollups from users, enrollments and payouts."
+
+    def handle(self, *args, **options):
+        days, instructor_days = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {days} daily rollups and {instructor_days} instructor payout days"
+        ))
@@ -0,0 +1,99 @@
+"""
+Cached KPIs for the admin dashboard.
+
+dashboard_home reads its numbers with one get_many() from the
+METRICS_CACHE_ALIAS cache. They are kept in two groups:
+
+    totals   - users, approved courses and revenue; cached for
+               METRICS_TOTALS_TTL seconds and dropped by
+               invalidate_dashboard_metrics(), which the registration,
+               enrollment, course approval/removal and payout paths call
+    activity - logins today, signups this week, activity log total;
+               cached for METRICS_ACTIVITY_TTL seconds only (they change
+               on every login, so they simply expire)
+
+A group that is missing is recomputed and stored on the next read. With a
+per-process cache (LocMemCache) an invalidation only reaches the worker
+that made the write; point the alias at a shared backend (Redis,
+Memcached) to invalidate everywhere.
+"""
+
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+
+from core.mongo import db
+from dashboard import activity_log
+from payments import ledger
+
+TOTALS_KEY = "dashboard:metrics:totals"
+ACTIVITY_KEY = "dashboard:metrics:activity"
+
+
+def _cache():
+    return caches[getattr(settings, "METRICS_CACHE_ALIAS", "default")]
+
+
+def _start_of_week(now):
+    return now - timedelta(days=now.weekday())
+
+
+def compute_totals(now=None):
+    now = now or datetime.utcnow()
+    users = db["users"]
+    courses = db["courses"]
+    return {
+        "total_students": users.count_documents({"role": "student"}),
+        "total_instructors": users.count_documents({"role": "instructor"}),
+        "total_users": users.count_documents({"role": {"$in": ["student", "instructor"]}}),
+        "total_courses": courses.count_documents({"status": "approved"}),
+        "new_this_week": courses.count_documents({
+            "status": "approved",
+            "created_at": {"$gte": _start_of_week(now)},
+        }),
+        "total_revenue": ledger.total_revenue(),
+        "month_revenue": ledger.month_revenue(now.year, now.month),
+    }
+
+
+def compute_activity(now=None):
+    now = now or datetime.utcnow()
+    logs = db[activity_log.LOG_COLLECTION]
+    return {
+        # Today's logins (both student and instructor)
+        "today_logins": logs.count_documents({
+            "action": {"$in": ["🔐 Student logged in", "🔐 Instructor logged in"]},
+            "timestamp": {"$gte": datetime(now.year, now.month, now.day)},
+        }),
+        # New users this week
+        "new_users_week": logs.count_documents({
+            "action": {"$in": ["🆕 New student account created", "🆕 New instructor account created"]},
+            "timestamp": {"$gte": _start_of_week(now)},
+        }),
+        "total_activities": activity_log.total_count(),
+    }
+
+
+def get_dashboard_metrics():
+    """All dashboard KPIs as one dict; a single cache read when both groups are cached."""
+    cache = _cache()
+    cached = cache.get_many([TOTALS_KEY, ACTIVITY_KEY])
+    totals = cached.get(TOTALS_KEY)
+    if totals is None:
+        totals = compute_totals()
+        cache.set(TOTALS_KEY, totals, getattr(settings, "METRICS_TOTALS_TTL", 300))
+    activity = cached.get(ACTIVITY_KEY)
+    if activity is None:
+        activity = compute_activity()
+        cache.set(ACTIVITY_KEY, activity, getattr(settings, "METRICS_ACTIVITY_TTL", 60))
+    return {**totals, **activity}
+
+
+def invalidate_dashboard_metrics():
+    """Drop the cached totals after a write that changes them."""
+    try:
+        _cache().delete(TOTALS_KEY)
+    except Exception as e:
+        # A cache outage must not fail the write; the TTL bounds the staleness
+        print(f"Error invalidating dashboard metrics: {e}")
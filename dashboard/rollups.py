@@ -0,0 +1,163 @@
+"""
+Daily rollups behind the admin and instructor charts.
+
+One document per UTC day in `daily_rollups`:
+
+    {"_id": "2025-08-23", "date": datetime(2025, 8, 23),
+     "signups": {"student": n, "instructor": n},
+     "enrollments": n, "revenue": ..., "payouts": ...}
+
+and one per instructor and day with payouts in `instructor_daily_payouts`:
+
+    {"_id": "<instructor_id>:2025-08-23", "instructor_id": ..., "date": ...,
+     "amount": ..., "count": n}
+
+The write paths add to the day's bucket with $inc (record_signup,
+record_enrollment, record_payout), so charts sum a bounded number of small
+documents instead of grouping whole collections. Signups count active
+accounts, like the user growth page always did: banning a user takes them
+off their signup day and unbanning puts them back.
+
+`manage.py rebuild_rollups` recomputes every bucket from users, enrollments
+and payouts.
+"""
+
+import datetime
+
+from pymongo import UpdateOne
+
+from core.mongo import db
+
+ROLLUPS_COLLECTION = "daily_rollups"
+INSTRUCTOR_PAYOUTS_COLLECTION = "instructor_daily_payouts"
+
+
+def day_key(when):
+    return when.strftime("%Y-%m-%d")
+
+
+def _day_start(when):
+    return datetime.datetime(when.year, when.month, when.day)
+
+
+def _inc_day(when, inc):
+    when = when or datetime.datetime.utcnow()
+    db[ROLLUPS_COLLECTION].update_one(
+        {"_id": day_key(when)},
+        {"$inc": inc, "$setOnInsert": {"date": _day_start(when)}},
+        upsert=True,
+    )
+
+
+def record_signup(role, date_joined=None, amount=1):
+    """Count a new (or, with amount=-1, deactivated) student or instructor on their join day."""
+    if role in ("student", "instructor"):
+        _inc_day(date_joined, {f"signups.{role}": amount})
+
+
+def record_enrollment(price, enrolled_at=None):
+    _inc_day(enrolled_at, {"enrollments": 1, "revenue": price})
+
+
+def record_payout(instructor_id, amount, paid_at=None):
+    paid_at = paid_at or datetime.datetime.utcnow()
+    _inc_day(paid_at, {"payouts": amount})
+    if instructor_id is not None:
+        db[INSTRUCTOR_PAYOUTS_COLLECTION].update_one(
+            {"_id": f"{instructor_id}:{day_key(paid_at)}"},
+            {
+                "$inc": {"amount": amount, "count": 1},
+                "$setOnInsert": {"instructor_id": instructor_id, "date": _day_start(paid_at)},
+            },
+            upsert=True,
+        )
+
+
+def daily(since=None):
+    """Platform buckets from `since` (a datetime) on, oldest first."""
+    query = {"date": {"$gte": _day_start(since)}} if since else {}
+    return list(db[ROLLUPS_COLLECTION].find(query).sort("date", 1))
+
+
+def weekly_signups(weeks=52, role=None):
+    """
+    New active users per ISO week for the last `weeks` weeks:
+    [{"year", "week", "count"}, ...], oldest first.
+    """
+    today = datetime.datetime.utcnow()
+    since = today - datetime.timedelta(days=today.weekday(), weeks=weeks - 1)
+    totals = {}
+    for bucket in daily(since):
+        signups = bucket.get("signups", {})
+        count = signups.get(role, 0) if role else sum(signups.values())
+        if count:
+            year, week, _ = bucket["date"].isocalendar()
+            totals[(year, week)] = totals.get((year, week), 0) + count
+    return [{"year": y, "week": w, "count": c} for (y, w), c in sorted(totals.items())]
+
+
+def instructor_monthly_payouts(instructor_id):
+    """An instructor's payouts per month: [{"year", "month", "total"}, ...], oldest first."""
+    totals = {}
+    buckets = db[INSTRUCTOR_PAYOUTS_COLLECTION].find({"instructor_id": instructor_id}, {"date": 1, "amount": 1})
+    for bucket in buckets:
+        key = (bucket["date"].year, bucket["date"].month)
+        totals[key] = totals.get(key, 0) + bucket.get("amount", 0)
+    return [{"year": y, "month": m, "total": t} for (y, m), t in sorted(totals.items())]
+
+
+def _by_day(collection, match, date_field, fields):
+    group = {"_id": {"$dateToString": {"format": "%Y-%m-%d", "date": f"${date_field}"}}}
+    group.update(fields)
+    return db[collection].aggregate([
+        {"$match": {**match, date_field: {"$type": "date"}}},
+        {"$group": group},
+    ])
+
+
+def rebuild_rollups():
+    """Recompute every bucket from users, enrollments and payouts. Returns (days, instructor days)."""
+    days = {}
+
+    def bucket(key):
+        return days.setdefault(key, {
+            "date": datetime.datetime.strptime(key, "%Y-%m-%d"),
+            "signups": {"student": 0, "instructor": 0},
+            "enrollments": 0, "revenue": 0, "payouts": 0,
+        })
+
+    for role in ("student", "instructor"):
+        for row in _by_day("users", {"role": role, "is_active": True}, "date_joined", {"count": {"$sum": 1}}):
+            bucket(row["_id"])["signups"][role] = row["count"]
+    for row in _by_day("enrollments", {}, "enrolled_at", {"count": {"$sum": 1}, "revenue": {"$sum": "$price"}}):
+        bucket(row["_id"]).update(enrollments=row["count"], revenue=row["revenue"])
+    for row in _by_day("payouts", {}, "paid_at", {"amount": {"$sum": "$amount"}}):
+        bucket(row["_id"])["payouts"] = row["amount"]
+
+    instructor_days = {}
+    for row in db["payouts"].aggregate([
+        {"$match": {"paid_at": {"$type": "date"}, "instructor_id": {"$ne": None}}},
+        {"$group": {
+            "_id": {"instructor_id": "$instructor_id",
+                    "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$paid_at"}}},
+            "amount": {"$sum": "$amount"},
+            "count": {"$sum": 1},
+        }},
+    ]):
+        instructor_id, key = row["_id"]["instructor_id"], row["_id"]["day"]
+        instructor_days[f"{instructor_id}:{key}"] = {
+            "instructor_id": instructor_id,
+            "date": datetime.datetime.strptime(key, "%Y-%m-%d"),
+            "amount": row["amount"],
+            "count": row["count"],
+        }
+
+    for collection, docs in ((ROLLUPS_COLLECTION, days), (INSTRUCTOR_PAYOUTS_COLLECTION, instructor_days)):
+        if docs:
+            db[collection].bulk_write(
+                [UpdateOne({"_id": key}, {"$set": doc}, upsert=True) for key, doc in docs.items()],
+                ordered=False,
+            )
+        # Buckets for days that no longer have any data
+        db[collection].delete_many({"_id": {"$nin": list(docs)}})
+    return len(days), len(instructor_days)
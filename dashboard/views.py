@@ -6,28 +6,37 @@ from datetime import datetime, timedelta
 from django.http import JsonResponse
 import pymongo
 from django.core.paginator import Paginator
-from pymongo import MongoClient
-from statistics import mean
 from django.http import HttpResponse, HttpResponseRedirect
 from django.urls import reverse 
 from django.utils.timezone import is_aware
 from datetime import datetime, timezone
 from django.utils.dateparse import parse_datetime
-from django.core.mail import send_mail
+from core.outbox import enqueue_mail
+from core.jobs import enqueue_job
 from django.conf import settings
 import pymongo
 
-connection = pymongo.MongoClient("localhost", 27017)
-db = connection["Peer_to_Peer_Education"]
+from core.mongo import db
+from core.fanout import gather
+from core import media_store
+from core.loader import Loader, get_loader
+from dashboard import activity_log, rollups
+from dashboard.metrics import get_dashboard_metrics, invalidate_dashboard_metrics
+from courses import catalog
+from courses.snapshot import bump_catalog_version, get_catalog
+from enrollments import counters
+from payments import ledger
+from payments.balances import record_payout
+from reviews.ratings import average_rating
 users_collection = db["users"]
 enrollments_collection = db["enrollments"]
 courses_collection = db["courses"]
 payments_collection = db["payments"]
 
 def log_user_activity(user_id, username, role, action, performed_by="system"):
-    """Log user activity to the user_activity_logs collection"""
+    """Log user activity to the user_activity_logs collection (buffered, see dashboard.activity_log)"""
     try:
-        db["user_activity_logs"].insert_one({
+        activity_log.log_activity({
             "user_id": user_id,
             "username": username,
             "role": role,
@@ -42,55 +51,25 @@ def dashboard_home(request):
     if not request.session.get('admin_name'):
         return redirect('admin_login')
 
-    today = datetime.utcnow()
-    start_of_week = today - timedelta(days=today.weekday())  # ⬅️ FIXED: move before use
-    start_of_day = datetime(today.year, today.month, today.day)
-
-    total_students = users_collection.count_documents({"role": "student"})
-    total_instructors = users_collection.count_documents({"role": "instructor"})
-    total_users = users_collection.count_documents({"role": {"$in": ["student", "instructor"]}})
-    total_courses = db["courses"].count_documents({"status": "approved"})
-
-    # 🧮 New Courses This Week
-    print("Today:", today)
-    print("Start of week:", start_of_week)
-    for c in db["courses"].find({"status": "approved"}):
-        print(c["title"], " | created_at:", c.get("created_at"))
-
-    new_this_week = db["courses"].count_documents({
-        "status": "approved",
-        "created_at": {"$gte": start_of_week}
-    })
-
-    # Modified activity logs to show user activities
-    logs_cursor = db["user_activity_logs"].aggregate([
-        {
-            "$lookup": {
-                "from": "users",
-                "localField": "user_id",
-                "foreignField": "_id",
-                "as": "user"
-            }
-        },
-        {"$unwind": "$user"},
-        {
-            "$project": {
-                "_id": 0,
-                "action": 1,
-                "timestamp": 1,
-                "username": "$user.username",
-                "role": "$user.role",
-                "performed_by": 1
-            }
-        },
-        {"$sort": {"timestamp": -1}},
-        {"$limit": 20}  # Increased limit to show more activities
-    ])
-    activity_logs = list(logs_cursor)
+    # Activity feed: username and role are stored on each entry, so no user lookup.
+    # ?activity_filter=<category> filters and ?before=<cursor> loads the next page, both on an index.
+    activity_filter = request.GET.get('activity_filter', '')
+    if activity_filter not in activity_log.CATEGORIES:
+        activity_filter = ''
+    before = request.GET.get('before')
+
+    # KPIs (from the metrics cache, see dashboard.metrics) and the feed are fetched concurrently
+    results = gather({
+        "metrics": get_dashboard_metrics,
+        "feed": lambda: activity_log.feed(category=activity_filter or None, before=before),
+    }, defaults={"metrics": {}, "feed": ([], None)})
+    metrics = results["metrics"]
+    activity_logs, activity_cursor = results["feed"]
 
     # Check if admin wants to clear the view
     if request.session.get('clear_activity_view'):
         activity_logs = []  # Clear the view
+        activity_cursor = None
         del request.session['clear_activity_view']  # Remove the flag
 
     # Get and clear the view cleared message
@@ -98,82 +77,12 @@ def dashboard_home(request):
     if view_cleared_message:
         del request.session['view_cleared_message']
 
-    # Apply activity filtering if requested
-    activity_filter = request.GET.get('activity_filter', '')
-    if activity_filter:
-        if activity_filter == 'login':
-            activity_logs = [log for log in activity_logs if 'logged in' in log['action']]
-        elif activity_filter == 'logout':
-            activity_logs = [log for log in activity_logs if 'logged out' in log['action']]
-        elif activity_filter == 'register':
-            activity_logs = [log for log in activity_logs if 'account created' in log['action']]
-        elif activity_filter == 'profile':
-            activity_logs = [log for log in activity_logs if 'profile updated' in log['action']]
-        elif activity_filter == 'enrollment':
-            activity_logs = [log for log in activity_logs if 'Enrolled in course' in log['action']]
-        elif activity_filter == 'admin':
-            activity_logs = [log for log in activity_logs if log.get('performed_by') and log['performed_by'] != 'system']
-
-    # Activity Summary Calculations
-    # Today's logins (both student and instructor)
-    today_logins = db["user_activity_logs"].count_documents({
-        "action": {"$in": ["🔐 Student logged in", "🔐 Instructor logged in"]},
-        "timestamp": {"$gte": start_of_day}
-    })
-
-    # New users this week
-    new_users_week = db["user_activity_logs"].count_documents({
-        "action": {"$in": ["🆕 New student account created", "🆕 New instructor account created"]},
-        "timestamp": {"$gte": start_of_week}
-    })
-
-    # Total activities in the system
-    total_activities = db["user_activity_logs"].count_documents({})
-
-    # 💰 Total Revenue from course enrollments (100% of course fees)
-    total_revenue_data = enrollments_collection.aggregate([
-        {
-            "$lookup": {
-                "from": "courses",
-                "localField": "course_id",
-                "foreignField": "_id",
-                "as": "course"
-            }
-        },
-        {"$unwind": "$course"},
-        {"$group": {"_id": None, "total": {"$sum": "$course.price"}}}
-    ])
-    total_revenue = next(total_revenue_data, {}).get("total", 0)
-
-    # 💰 This Month Revenue from enrollments
-    start_of_month = datetime(today.year, today.month, 1)
-    month_revenue_data = enrollments_collection.aggregate([
-        {"$match": {"enrolled_at": {"$gte": start_of_month}}},
-        {
-            "$lookup": {
-                "from": "courses",
-                "localField": "course_id",
-                "foreignField": "_id",
-                "as": "course"
-            }
-        },
-        {"$unwind": "$course"},
-        {"$group": {"_id": None, "total": {"$sum": "$course.price"}}}
-    ])
-    month_revenue = next(month_revenue_data, {}).get("total", 0)
-
     return render(request, "dashboard/dashboard_home.html", {
-        "total_students": total_students,
-        "total_instructors": total_instructors,
-        "total_users": total_users,
-        "total_courses": total_courses,
-        "new_this_week": new_this_week,
+        **metrics,
         "activity_logs": activity_logs,
-        "total_revenue": total_revenue,
-        "month_revenue": month_revenue,
-        "today_logins": today_logins,
-        "new_users_week": new_users_week,
-        "total_activities": total_activities,
+        "activity_cursor": activity_cursor,
+        "activity_filter": activity_filter,
+        "activity_categories": activity_log.CATEGORIES,
         "view_cleared_message": request.session.get('view_cleared_message', ''),
     })
 
@@ -182,7 +91,7 @@ def clear_activity_logs(request):
     if not request.session.get('admin_name'):
         return redirect('admin_login')
 
-    db["user_activity_logs"].delete_many({})
+    activity_log.clear_logs()
     return redirect('dashboard_home')
 
 @require_POST
@@ -201,22 +110,9 @@ def earnings_overview(request):
         return redirect('admin_login')
 
     today = datetime.utcnow()
-    start_of_month = datetime(today.year, today.month, 1)
 
-    # Calculate total revenue from course enrollments (100% of course fees)
-    total_revenue_data = enrollments_collection.aggregate([
-        {
-            "$lookup": {
-                "from": "courses",
-                "localField": "course_id",
-                "foreignField": "_id",
-                "as": "course"
-            }
-        },
-        {"$unwind": "$course"},
-        {"$group": {"_id": None, "total": {"$sum": "$course.price"}}}
-    ])
-    total_revenue = next(total_revenue_data, {}).get("total", 0)
+    # Total revenue from the revenue ledger (100% of course fees)
+    total_revenue = ledger.total_revenue()
 
     # Platform Commission is 30% of total course fees
     platform_fee = int(total_revenue * 0.3)
@@ -224,48 +120,13 @@ def earnings_overview(request):
     # Course payouts to instructors (70% of total course fees)
     instructor_course_earnings = int(total_revenue * 0.7)
 
-    # This month revenue from enrollments
-    month_revenue_data = enrollments_collection.aggregate([
-        {"$match": {"enrolled_at": {"$gte": start_of_month}}},
-        {
-            "$lookup": {
-                "from": "courses",
-                "localField": "course_id",
-                "foreignField": "_id",
-                "as": "course"
-            }
-        },
-        {"$unwind": "$course"},
-        {"$group": {"_id": None, "total": {"$sum": "$course.price"}}}
-    ])
-    month_revenue = next(month_revenue_data, {}).get("total", 0)
-
-    # Monthly earnings breakdown based on enrollments
-    monthly_cursor = enrollments_collection.aggregate([
-        {
-            "$lookup": {
-                "from": "courses",
-                "localField": "course_id",
-                "foreignField": "_id",
-                "as": "course"
-            }
-        },
-        {"$unwind": "$course"},
-        {
-            "$group": {
-                "_id": {
-                    "year": {"$year": "$enrolled_at"},
-                    "month": {"$month": "$enrolled_at"}
-                },
-                "total": {"$sum": "$course.price"}
-            }
-        },
-        {"$sort": {"_id.year": -1, "_id.month": -1}}
-    ])
+    # This month revenue from the ledger
+    month_revenue = ledger.month_revenue(today.year, today.month)
 
+    # Monthly earnings breakdown from the ledger's per-month totals
     monthly_earnings = []
-    for row in monthly_cursor:
-        y, m = row["_id"]["year"], row["_id"]["month"]
+    for row in ledger.monthly_revenue():
+        y, m = row["year"], row["month"]
         amount = row["total"]
         instructor_share = int(amount * 0.7)  # 70% goes to instructors based on actual enrollments
         monthly_earnings.append({
@@ -301,24 +162,13 @@ def user_growth(request):
         "date_joined": {"$gte": start_of_week}
     })
 
-    # Weekly Aggregation
-    pipeline = [
-        {"$match": base_query},
-        {
-            "$group": {
-                "_id": {
-                    "year": {"$year": "$date_joined"},
-                    "week": {"$isoWeek": "$date_joined"}
-                },
-                "count": {"$sum": 1}
-            }
-        },
-        {"$sort": {"_id.year": 1, "_id.week": 1}}
-    ]
-    weekly_data = list(users_collection.aggregate(pipeline))
+    # Weekly signups summed from the daily rollups (see dashboard.rollups)
+    weekly_data = rollups.weekly_signups(
+        weeks=getattr(settings, "USER_GROWTH_WEEKS", 52), role=role_filter or None
+    )
     new_users_by_week = [
         {
-            "week_label": f"Week {w['_id']['week']}, {w['_id']['year']}",
+            "week_label": f"Week {w['week']}, {w['year']}",
             "count": w["count"]
         } for w in weekly_data
     ]
@@ -335,87 +185,85 @@ def user_growth(request):
         "chart_values": chart_values,
     })
 
-# Helper function to calculate average rating for a course
-def calculate_course_rating(course_id):
-    """Calculate average rating for a course from reviews collection"""
-    try:
-        reviews = db["reviews"].find({"course_id": ObjectId(course_id)})
-        ratings = [r["rating"] for r in reviews]
-        if ratings:
-            avg_rating = mean(ratings)
-            return round(avg_rating, 1)
-        return 0.0
-    except Exception as e:
-        print(f"Error calculating rating for course {course_id}: {e}")
-        return 0.0
-
 # Course Overview
-db = pymongo.MongoClient("localhost", 27017)["Peer_to_Peer_Education"]
-
-def course_overview(request):
-    if not request.session.get('admin_name'):
-        return redirect('admin_login')
-
-    courses_collection = db["courses"]
-    enrollments_collection = db["enrollments"]
-    users_collection = db["users"]
-    reviews_collection = db["reviews"]
-
-    # 📊 Top 3 Most Enrolled Courses
-    enroll_agg = enrollments_collection.aggregate([
-        {"$group": {"_id": "$course_id", "enroll_count": {"$sum": 1}}},
-        {"$sort": {"enroll_count": -1}},
-        {"$limit": 3}
-    ])
+def _top_enrolled_courses():
+    """📊 Top 3 most enrolled approved courses."""
+    # Read from the maintained enrollment counters on the catalog_most_enrolled index
+    courses = list(
+        db["courses"].find({"status": "approved", counters.TOTAL: {"$gt": 0}})
+        .sort([(counters.TOTAL, -1), ("_id", -1)])
+        .limit(3)
+    )
+    instructors_map = Loader().load_many("users", [c.get("instructor_id") for c in courses], ["username"])
 
     top_courses = []
-    for item in enroll_agg:
-        course_id = item["_id"]
-        enroll_count = item["enroll_count"]
-        course = courses_collection.find_one({
-            "_id": ObjectId(course_id),
-            "status": "approved"
-        })
-        if not course:
-            continue
+    for course in courses:
         instructor_id = course.get("instructor_id")
-        instructor = users_collection.find_one({"_id": ObjectId(instructor_id)}) if instructor_id else None
-
-        # Use helper function to calculate average rating
-        avg_rating = calculate_course_rating(course_id)
-
+        instructor = instructors_map.get(ObjectId(instructor_id)) if instructor_id else None
         top_courses.append({
             "title": course.get("title", ""),
             "instructor": instructor["username"] if instructor else "Unknown",
-            "enrollments": enroll_count,
-            "avg_rating": avg_rating,
+            "enrollments": course[counters.TOTAL],
+            # Rating summary is stored on the course
+            "avg_rating": average_rating(course),
         })
+    return top_courses
 
-    # 📝 Courses Pending Approval
-    pending_courses_cursor = courses_collection.find({"status": "pending"})
+
+def _pending_courses():
+    """📝 Courses pending approval."""
+    courses = list(db["courses"].find({"status": "pending"}))
+    instructors_map = Loader().load_many("users", [c.get("instructor_id") for c in courses], ["username"])
     pending_courses = []
-    for course in pending_courses_cursor:
-        # ✅ FIXED HERE: handle missing or non-objectId instructor_id
+    for course in courses:
         instructor_id = course.get("instructor_id")
-        instructor = users_collection.find_one({"_id": ObjectId(instructor_id)}) if instructor_id else None
-
+        instructor = instructors_map.get(ObjectId(instructor_id)) if instructor_id else None
         pending_courses.append({
-            "id": str(course["_id"]),  # ✅ Fix here
+            "id": str(course["_id"]),
             "title": course.get("title", ""),
             "description": course.get("description", ""),
             "instructor": instructor["username"] if instructor else "Unknown",
-            "status": course.get("status", "unknown")
+            "status": course.get("status", "unknown"),
         })
+    return pending_courses
 
 
+def course_overview(request):
+    if not request.session.get('admin_name'):
+        return redirect('admin_login')
+
+    # The two lists are independent, so they are fetched concurrently
+    results = gather({
+        "top_courses": _top_enrolled_courses,
+        "pending_courses": _pending_courses,
+    }, defaults={"top_courses": [], "pending_courses": []})
+    top_courses = results["top_courses"]
+    pending_courses = results["pending_courses"]
+
     return render(request, "dashboard/course_overview.html", {
         "top_courses": top_courses,
         "pending_courses": pending_courses
     })
 
 # Delete Course and Warn 
-from django.core.mail import send_mail
+from core.outbox import enqueue_mail
 from django.views.decorators.http import require_POST
+from core import jobs
+
+
+# Progress of a background job (polled by the ban confirmation page)
+@require_GET
+def job_status(request, job_id):
+    if not request.session.get('admin_name'):
+        return JsonResponse({"error": "Not allowed"}, status=403)
+    try:
+        job = jobs.get_job(ObjectId(job_id))
+    except Exception:
+        job = None
+    if not job:
+        return JsonResponse({"error": "Job not found"}, status=404)
+    return JsonResponse(jobs.progress(job))
+
 
 @require_POST
 def delete_course_and_warn(request, course_id):
@@ -430,17 +278,24 @@ def delete_course_and_warn(request, course_id):
     instructor_email = instructor.get("email", "")
     instructor_name = instructor.get("username", "Unknown")
 
-    db["courses"].delete_one({"_id": ObjectId(course_id)})
-
-    db["user_activity_logs"].insert_one({
-        "user_id": instructor["_id"],
-        "action": f"❌ Course '{course['title']}' deleted by admin due to student report.",
-        "performed_by": request.session.get("admin_name"),
-        "timestamp": datetime.utcnow()
-    })
+    if counters.delete_course(ObjectId(course_id)):
+        media_store.release(course.get("course_photo"), course.get("file"))
+        # Enrolled students are notified by the `manage.py run_jobs` worker
+        enqueue_job("course_deleted", {"course_id": course_id, "title": course["title"]},
+                    key=f"course_deleted:{course_id}")
+    invalidate_dashboard_metrics()
+    bump_catalog_version()
+
+    log_user_activity(
+        user_id=instructor["_id"],
+        username=instructor_name,
+        role="instructor",
+        action=f"❌ Course '{course['title']}' deleted by admin due to student report.",
+        performed_by=request.session.get("admin_name"),
+    )
 
     # ✅ Send email
-    send_mail(
+    enqueue_mail(
         subject="⚠️ Course Removed Due to Student Report",
         message=(
             f"Dear {instructor_name},\n\n"
@@ -475,9 +330,11 @@ def approve_course(request, course_id):
         update_data["created_at"] = datetime.utcnow()
 
     db["courses"].update_one({"_id": ObjectId(course_id)}, {"$set": update_data})
+    invalidate_dashboard_metrics()
+    bump_catalog_version()
 
     # ✅ Send approval email
-    send_mail(
+    enqueue_mail(
         subject="✅ Course Approved",
         message=(
             f"Dear {instructor_name},\n\n"
@@ -505,10 +362,15 @@ def reject_course(request, course_id):
     instructor_email = instructor.get("email")
     instructor_name = instructor.get("username", "Instructor")
 
-    db["courses"].delete_one({"_id": ObjectId(course_id)})
+    # A repeated or concurrent reject finds nothing left to delete: release and notify once
+    if not counters.delete_course(ObjectId(course_id)):
+        return HttpResponseRedirect(reverse('course_overview'))
+    media_store.release(course.get("course_photo"), course.get("file"))
+    invalidate_dashboard_metrics()
+    bump_catalog_version()
 
     # ✅ Send rejection email
-    send_mail(
+    enqueue_mail(
         subject="❌ Course Rejected",
         message=(
             f"Dear {instructor_name},\n\n"
@@ -529,73 +391,45 @@ def view_all_courses(request):
     if not request.session.get('admin_name'):
         return redirect('admin_login')
 
-    courses_collection = db["courses"]
-    users_collection = db["users"]
-    enrollments_collection = db["enrollments"]
-
-    search = request.GET.get("search", "").strip().lower()
+    search = request.GET.get("search", "").strip()
+    category = request.GET.get("category", "").strip()
     sort_by = request.GET.get("sort", "newest")
-    min_price = request.GET.get("min_price")
-    max_price = request.GET.get("max_price")
-
-    instructors = {
-        str(u["_id"]): u["username"]
-        for u in users_collection.find({"role": "instructor"})
-    }
 
-    enroll_agg = enrollments_collection.aggregate([
-        {"$group": {"_id": "$course_id", "count": {"$sum": 1}}}
-    ])
-    enroll_counts = {str(e["_id"]): e["count"] for e in enroll_agg}
+    # Search, filters, sort and paging all run in MongoDB (see courses.catalog)
+    results, cursor = catalog.search(
+        text=search,
+        category=category or None,
+        min_price=request.GET.get("min_price"),
+        max_price=request.GET.get("max_price"),
+        sort=sort_by,
+        before=request.GET.get("before"),
+    )
 
-    course_cursor = courses_collection.find({"status": "approved"})
     courses = []
-
-    for c in course_cursor:
-        course_id = str(c["_id"])
-        title = c.get("title", "")
-        instructor_id = str(c.get("instructor_id"))
-        instructor_name = instructors.get(instructor_id, "Unknown")
-        count = enroll_counts.get(course_id, 0)
-        price = c.get("price", 0)
-
-        if search and search not in title.lower() and search not in instructor_name.lower():
-            continue
-
-        if min_price and price < int(min_price):
-            continue
-        if max_price and price > int(max_price):
-            continue
-
-        created_at = c.get("created_at")
-        if isinstance(created_at, str):
-            created_at = parse_datetime(created_at)
-        if created_at is None:
-            created_at = datetime.min.replace(tzinfo=timezone.utc)
-        elif created_at.tzinfo is None:
-            created_at = created_at.replace(tzinfo=timezone.utc)
-
-        # Calculate average rating for the course
-        avg_rating = calculate_course_rating(c["_id"])
-        
+    for c in results:
         courses.append({
-            "id": course_id,
-            "title": title,
-            "instructor": instructor_name,
+            "id": str(c["_id"]),
+            "title": c.get("title", ""),
+            "instructor": c.get("instructor_name", "Unknown"),
             "status": c.get("status", "unknown"),
-            "enrollments": int(count),
-            "created_at": created_at,
-            "price": price,
-            "avg_rating": avg_rating
+            "enrollments": int(c.get(counters.TOTAL, 0)),
+            "created_at": c.get("created_at"),
+            "price": c.get("price", 0),
+            # Rating summary is stored on the course
+            "avg_rating": average_rating(c),
         })
 
-    if sort_by == "most_enrolled":
-        courses.sort(key=lambda x: x["enrollments"], reverse=True)
-    else:
-        courses.sort(key=lambda x: x["created_at"], reverse=True)
+    next_query = None
+    if cursor:
+        params = request.GET.copy()
+        params["before"] = cursor
+        next_query = params.urlencode()
 
     return render(request, "dashboard/view_all_course.html", {
-        "courses": courses
+        "courses": courses,
+        "categories": get_catalog().categories,  # From the catalog snapshot (courses.snapshot)
+        "selected_category": category,
+        "next_query": next_query,
     })
 
 # Report
@@ -697,22 +531,19 @@ def enrollments_monitor(request):
 
     cursor = enrollments_collection.find(query).sort("enrolled_at", -1)
 
-    # Build lookup maps to reduce queries
-    user_ids = set()
-    course_ids = set()
+    # Students, courses and instructors are resolved with one query per collection
     enrollments = list(cursor)
-    for e in enrollments:
-        user_ids.add(e.get('student_id'))
-        course_ids.add(e.get('course_id'))
-
-    users_map = {u["_id"]: u for u in users_collection.find({"_id": {"$in": list(user_ids)}})}
-    course_map = {c["_id"]: c for c in courses_collection.find({"_id": {"$in": list(course_ids)}})}
+    loader = get_loader(request)
+    user_fields = ['username', 'email', 'is_active']
+    users_map = loader.load_many('users', [e.get('student_id') for e in enrollments], user_fields)
+    course_map = loader.load_many('courses', [e.get('course_id') for e in enrollments], ['title', 'instructor_id'])
+    instructors_map = loader.load_many('users', [c.get('instructor_id') for c in course_map.values()], user_fields)
 
     rows = []
     for e in enrollments:
         student = users_map.get(e.get('student_id'))
         course = course_map.get(e.get('course_id'))
-        instructor = users_collection.find_one({"_id": course.get('instructor_id')}) if course else None
+        instructor = instructors_map.get(course.get('instructor_id')) if course else None
         rows.append({
             "enrollment_id": str(e.get('_id')),
             "student_name": student.get('username') if student else 'Unknown',
@@ -737,20 +568,34 @@ def admin_payouts(request):
     if not request.session.get('admin_name'):
         return redirect('admin_login')
 
-    # Fetch all enrollments that are not yet marked as paid (including pending ones)
-    cursor = enrollments_collection.find({
-        "$or": [{"payout_status": {"$exists": False}}, {"payout_status": {"$ne": "Paid"}}]
-    }).sort("enrolled_at", -1)
-
-    enrollments = list(cursor)
-    user_ids = set()
-    course_ids = set()
-    for e in enrollments:
-        user_ids.add(e.get('student_id'))
-        course_ids.add(e.get('course_id'))
+    def unpaid_enrollments():
+        # Fetch all enrollments that are not yet marked as paid (including pending ones)
+        enrollments = list(enrollments_collection.find({
+            "$or": [{"payout_status": {"$exists": False}}, {"payout_status": {"$ne": "Paid"}}]
+        }).sort("enrolled_at", -1))
+
+        # Students, courses and instructors are resolved with one query per collection
+        loader = get_loader(request)
+        user_fields = ['username', 'email', 'is_active']
+        users_map = loader.load_many('users', [e.get('student_id') for e in enrollments], user_fields)
+        course_map = loader.load_many('courses', [e.get('course_id') for e in enrollments], ['title', 'instructor_id', 'price'])
+        instructors_map = loader.load_many('users', [c.get('instructor_id') for c in course_map.values()], user_fields)
+        return enrollments, users_map, course_map, instructors_map
+
+    def admin_withdrawals():
+        admin_withdrawals_data = db["withdrawals"].aggregate([
+            {"$match": {"role": "admin"}},
+            {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
+        ])
+        return next(admin_withdrawals_data, {}).get('total', 0)
 
-    users_map = {u["_id"]: u for u in users_collection.find({"_id": {"$in": list(user_ids)}})}
-    course_map = {c["_id"]: c for c in courses_collection.find({"_id": {"$in": list(course_ids)}})}
+    # The enrollment rows and the admin balance do not depend on each other
+    results = gather({
+        "enrollments": unpaid_enrollments,
+        "commission": ledger.platform_commission,
+        "withdrawals": admin_withdrawals,
+    }, defaults={"enrollments": ([], {}, {}, {}), "commission": 0, "withdrawals": 0})
+    enrollments, users_map, course_map, instructors_map = results["enrollments"]
 
     rows = []
     total_due = 0
@@ -761,8 +606,8 @@ def admin_payouts(request):
         course = course_map.get(e.get('course_id'))
         if not course:
             continue
-        instructor = users_collection.find_one({"_id": course.get('instructor_id')}) if course else None
-        price = int(course.get('price', 0))
+        instructor = instructors_map.get(course.get('instructor_id'))
+        price = int(e.get('price', course.get('price', 0)))  # Price recorded at enrollment time
         instructor_share = int(round(price * 0.7))  # 70% to instructor
         approval_status = e.get('approval_status', 'Pending')
         
@@ -788,28 +633,11 @@ def admin_payouts(request):
         })
 
     # Calculate Admin Available Balance (30% commission)
-    # Get total revenue from all enrollments (including paid ones)
-    total_revenue_data = enrollments_collection.aggregate([
-        {
-            "$lookup": {
-                "from": "courses",
-                "localField": "course_id",
-                "foreignField": "_id",
-                "as": "course"
-            }
-        },
-        {"$unwind": "$course"},
-        {"$group": {"_id": None, "total": {"$sum": "$course.price"}}}
-    ])
-    total_revenue = next(total_revenue_data, {}).get('total', 0)
-    admin_commission = int(total_revenue * 0.3)  # 30% to admin
+    # Total revenue from all enrollments (including paid ones), from the ledger
+    admin_commission = results["commission"]  # 30% to admin
     
-    # Calculate total admin withdrawals
-    admin_withdrawals_data = db["withdrawals"].aggregate([
-        {"$match": {"role": "admin"}},
-        {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
-    ])
-    total_admin_withdrawals = next(admin_withdrawals_data, {}).get('total', 0)
+    # Total admin withdrawals
+    total_admin_withdrawals = results["withdrawals"]
     
     # Calculate admin available balance
     admin_available_balance = admin_commission - total_admin_withdrawals
@@ -841,18 +669,23 @@ def mark_payout_paid(request, enrollment_id):
 
     instructor = users_collection.find_one({"_id": course.get('instructor_id')})
 
-    price = int(course.get('price', 0))
+    price = int(en.get('price', course.get('price', 0)))  # Price recorded at enrollment time
     instructor_share = int(round(price * 0.7))
 
     # Insert payout record
+    paid_at = datetime.utcnow()
     db['payouts'].insert_one({
         'enrollment_id': en['_id'],
         'instructor_id': course.get('instructor_id'),
         'course_id': en.get('course_id'),
         'amount': instructor_share,
-        'paid_at': datetime.utcnow(),
+        'paid_at': paid_at,
         'paid_by': request.session.get('admin_name', 'admin')
     })
+    if course.get('instructor_id'):
+        record_payout(course['instructor_id'], instructor_share)
+    rollups.record_payout(course.get('instructor_id'), instructor_share, paid_at)
+    invalidate_dashboard_metrics()
 
     # Mark enrollment as paid
     enrollments_collection.update_one(
@@ -863,7 +696,7 @@ def mark_payout_paid(request, enrollment_id):
     # Optional: notify instructor by email
     try:
         if instructor and instructor.get('email'):
-            send_mail(
+            enqueue_mail(
                 subject=f"Payout Processed: {course.get('title', 'Course')}",
                 message=(
                     f"Dear {instructor.get('username', 'Instructor')},\n\n"
@@ -902,21 +735,25 @@ def process_pending_payout(request, enrollment_id):
     if not instructor:
         return HttpResponse("Instructor not found", status=404)
 
-    price = int(course.get('price', 0))
+    price = int(en.get('price', course.get('price', 0)))  # Price recorded at enrollment time
     instructor_share = int(round(price * 0.7))  # 70% to instructor
     admin_share = int(round(price * 0.3))  # 30% to admin
 
     # Insert payout record (this adds to instructor's available balance)
+    paid_at = datetime.utcnow()
     payout_result = db['payouts'].insert_one({
         'enrollment_id': en['_id'],
         'instructor_id': course.get('instructor_id'),
         'course_id': en.get('course_id'),
         'amount': instructor_share,
-        'paid_at': datetime.utcnow(),
+        'paid_at': paid_at,
         'paid_by': request.session.get('admin_name', 'admin'),
         'payout_type': 'pending_processed',  # Mark this as processed from pending
         'note': f'Processed from pending by admin: {request.session.get("admin_name")}'
     })
+    record_payout(course['instructor_id'], instructor_share)
+    rollups.record_payout(course['instructor_id'], instructor_share, paid_at)
+    invalidate_dashboard_metrics()
 
     # Update platform balance (admin gets 30% commission)
     current_platform_balance = db["platform_balance"].find_one({})
@@ -924,20 +761,7 @@ def process_pending_payout(request, enrollment_id):
         new_platform_balance = current_platform_balance['balance'] + admin_share
     else:
         # Calculate initial balance if it doesn't exist
-        total_revenue_data = enrollments_collection.aggregate([
-            {
-                "$lookup": {
-                    "from": "courses",
-                    "localField": "course_id",
-                    "foreignField": "_id",
-                    "as": "course"
-                }
-            },
-            {"$unwind": "$course"},
-            {"$group": {"_id": None, "total": {"$sum": "$course.price"}}}
-        ])
-        total_revenue = next(total_revenue_data, {}).get('total', 0)
-        platform_commission = int(total_revenue * 0.3)
+        platform_commission = ledger.platform_commission()
         
         # Calculate total admin withdrawals
         total_admin_withdrawals_data = db["withdrawals"].aggregate([
@@ -968,7 +792,7 @@ def process_pending_payout(request, enrollment_id):
     # Send notification email to instructor
     try:
         if instructor and instructor.get('email'):
-            send_mail(
+            enqueue_mail(
                 subject=f"Balance Added: {course.get('title', 'Course')}",
                 message=(
                     f"Dear {instructor.get('username', 'Instructor')},\n\n"
@@ -1012,21 +836,7 @@ def admin_withdraw_platform_commission(request):
         if not platform_balance or 'balance' not in platform_balance:
             print("No existing balance found, calculating initial balance...")  # Debug log
             # If no balance exists, calculate it from enrollments and withdrawals
-            total_revenue_data = list(enrollments_collection.aggregate([
-                {
-                    "$lookup": {
-                        "from": "courses",
-                        "localField": "course_id",
-                        "foreignField": "_id",
-                        "as": "course"
-                    }
-                },
-                {"$unwind": "$course"},
-                {"$group": {"_id": None, "total": {"$sum": "$course.price"}}}
-            ]))
-            print(f"Total revenue data: {total_revenue_data}")  # Debug log
-            total_revenue = total_revenue_data[0]['total'] if total_revenue_data else 0
-            platform_commission = int(total_revenue * 0.3)
+            platform_commission = ledger.platform_commission()
             
             # Calculate total admin withdrawals
             total_admin_withdrawals_data = list(db["withdrawals"].aggregate([
@@ -1058,16 +868,9 @@ def admin_withdraw_platform_commission(request):
         print(f"New balance after withdrawal: {new_balance}")  # Debug log
         
         # Get the current platform commission
-        enrollments_collection = db["enrollments"]
         platform_commission = 0
         try:
-            commission_data = list(enrollments_collection.aggregate([
-                {"$lookup": {"from": "courses", "localField": "course_id", "foreignField": "_id", "as": "course"}},
-                {"$unwind": "$course"},
-                {"$group": {"_id": None, "total": {"$sum": "$course.price"}}}
-            ]))
-            print(f"Commission data: {commission_data}")  # Debug log
-            platform_commission = int((commission_data[0]['total'] if commission_data else 0) * 0.3)
+            platform_commission = ledger.platform_commission()
         except Exception as e:
             print(f"Error calculating platform commission: {str(e)}")
             return JsonResponse({"success": False, "error": f"Error calculating platform commission: {str(e)}"})
@@ -1103,7 +906,7 @@ def admin_withdraw_platform_commission(request):
         
         # Send email notification (non-critical operation, so outside transaction)
         try:
-            from django.core.mail import send_mail
+            from core.outbox import enqueue_mail
             from django.conf import settings
             
             subject = "Admin Balance Withdrawal"
@@ -1122,7 +925,7 @@ This withdrawal has been processed successfully.
             
             # Send to admin email (you can configure this in settings)
             admin_email = getattr(settings, 'ADMIN_EMAIL', 'admin@ptp.com')
-            send_mail(
+            enqueue_mail(
                 subject=subject,
                 message=message,
                 from_email=getattr(settings, 'EMAIL_HOST_USER', 'noreply@ptp.com'),
@@ -1180,20 +983,7 @@ def admin_withdraw_view(request):
         current_balance = platform_balance['balance']
     else:
         # Calculate initial balance if it doesn't exist
-        total_revenue_data = enrollments_collection.aggregate([
-            {
-                "$lookup": {
-                    "from": "courses",
-                    "localField": "course_id",
-                    "foreignField": "_id",
-                    "as": "course"
-                }
-            },
-            {"$unwind": "$course"},
-            {"$group": {"_id": None, "total": {"$sum": "$course.price"}}}
-        ])
-        total_revenue = next(total_revenue_data, {}).get('total', 0)
-        platform_commission = total_revenue * 0.3  # 30% platform commission
+        platform_commission = ledger.total_revenue() * 0.3  # 30% platform commission
         
         # Calculate total admin withdrawals
         total_admin_withdrawals = db["withdrawals"].aggregate([
@@ -0,0 +1,125 @@
+"""
+Enrollment counters kept on course and instructor documents.
+
+Each course carries
+
+    {"enrollment_count": n, "approved_enrollment_count": n,
+     "pending_enrollment_count": n}
+
+and each instructor's user document the approved enrollments of all their
+courses:
+
+    {"approved_enrollment_count": n}
+
+so "most enrolled" sorting, the top courses list and instructor totals are
+indexed reads instead of $group or $in counts over `enrollments`.
+
+The counters move with $inc in the write paths: record_enrollment() when a
+student pays (pay_course, enroll_course), record_approval() when the
+instructor approves, and delete_course(), which removes a course and takes
+its approved enrollments off the instructor in one step.
+`manage.py repair_enrollment_counters` recomputes all of them.
+"""
+
+from pymongo import ReturnDocument, UpdateOne
+
+from core.mongo import db
+
+TOTAL = "enrollment_count"
+APPROVED = "approved_enrollment_count"
+PENDING = "pending_enrollment_count"
+STATUS_FIELDS = {"Approved": APPROVED, "Pending": PENDING}
+
+
+def record_enrollment(course_id, status="Pending"):
+    """Count a new enrollment of the course."""
+    inc = {TOTAL: 1}
+    if status in STATUS_FIELDS:
+        inc[STATUS_FIELDS[status]] = 1
+    course = db["courses"].find_one_and_update(
+        {"_id": course_id}, {"$inc": inc}, projection={"instructor_id": 1}
+    )
+    if course and status == "Approved":
+        _add_to_instructor(course.get("instructor_id"), 1)
+
+
+def record_approval(course_id, previous_status="Pending"):
+    """Move one enrollment of the course from `previous_status` (its status before approval) to approved."""
+    inc = {APPROVED: 1}
+    if previous_status in STATUS_FIELDS:
+        inc[STATUS_FIELDS[previous_status]] = -1
+    course = db["courses"].find_one_and_update(
+        {"_id": course_id}, {"$inc": inc}, projection={"instructor_id": 1}
+    )
+    if course:
+        _add_to_instructor(course.get("instructor_id"), 1)
+
+
+def delete_course(course_id, **match):
+    """
+    Delete a course (optionally only if it also matches `match`) and take
+    its approved enrollments off the instructor. Returns the deleted
+    document, or None if nothing matched.
+    """
+    course = db["courses"].find_one_and_delete({"_id": course_id, **match})
+    if course and course.get(APPROVED):
+        _add_to_instructor(course.get("instructor_id"), -course[APPROVED])
+    return course
+
+
+def _add_to_instructor(instructor_id, amount):
+    if instructor_id is not None:
+        db["users"].update_one({"_id": instructor_id}, {"$inc": {APPROVED: amount}})
+
+
+def instructor_approved_enrollments(instructor_id):
+    """Approved enrollments across the instructor's courses, from the maintained counter."""
+    user = db["users"].find_one({"_id": instructor_id}, {APPROVED: 1})
+    if user is None:
+        return 0
+    if APPROVED not in user:
+        # Not counted yet: sum the course counters once and keep the result
+        rows = db["courses"].aggregate([
+            {"$match": {"instructor_id": instructor_id}},
+            {"$group": {"_id": None, "total": {"$sum": f"${APPROVED}"}}},
+        ])
+        total = next(rows, {}).get("total", 0)
+        user = db["users"].find_one_and_update(
+            {"_id": instructor_id, APPROVED: {"$exists": False}},
+            {"$set": {APPROVED: total}},
+            projection={APPROVED: 1},
+            return_document=ReturnDocument.AFTER,
+        ) or db["users"].find_one({"_id": instructor_id}, {APPROVED: 1})
+    return user.get(APPROVED, 0)
+
+
+def repair_counters():
+    """Recompute every course and instructor counter from `enrollments`. Returns (courses, instructors)."""
+    per_course = {}
+    for row in db["enrollments"].aggregate([
+        {"$group": {"_id": {"course_id": "$course_id", "status": "$approval_status"}, "count": {"$sum": 1}}},
+    ]):
+        counts = per_course.setdefault(row["_id"].get("course_id"), {TOTAL: 0, APPROVED: 0, PENDING: 0})
+        counts[TOTAL] += row["count"]
+        # Enrollments without a status are pending, like everywhere else
+        status = row["_id"].get("status") or "Pending"
+        if status in STATUS_FIELDS:
+            counts[STATUS_FIELDS[status]] += row["count"]
+
+    per_instructor = {}
+    course_updates = []
+    for course in db["courses"].find({}, {"instructor_id": 1}):
+        counts = per_course.get(course["_id"], {TOTAL: 0, APPROVED: 0, PENDING: 0})
+        course_updates.append(UpdateOne({"_id": course["_id"]}, {"$set": counts}))
+        instructor_id = course.get("instructor_id")
+        per_instructor[instructor_id] = per_instructor.get(instructor_id, 0) + counts[APPROVED]
+    if course_updates:
+        db["courses"].bulk_write(course_updates, ordered=False)
+
+    instructor_updates = [
+        UpdateOne({"_id": user["_id"]}, {"$set": {APPROVED: per_instructor.get(user["_id"], 0)}})
+        for user in db["users"].find({"role": "instructor"}, {"_id": 1})
+    ]
+    if instructor_updates:
+        db["users"].bulk_write(instructor_updates, ordered=False)
+    return len(course_updates), len(instructor_updates)
@@ -0,0 +1,11 @@
+"""MongoDB indexes for the enrollments collection (see `manage.py ensure_mongo_indexes`)."""
+
+INDEXES = {
+    "enrollments": [
+        # A student can enroll in a course once; also serves lookups by student_id
+        {"keys": [("student_id", 1), ("course_id", 1)], "name": "student_course_unique", "unique": True},
+        {"keys": [("course_id", 1), ("enrolled_at", -1)], "name": "course_enrolled_at"},
+        {"keys": [("course_id", 1), ("approval_status", 1)], "name": "course_approval_status"},
+        {"keys": [("approval_status", 1), ("enrolled_at", -1)], "name": "approval_status_enrolled_at"},
+    ],
+}
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from enrollments.counters import repair_counters
+
+
+class Command(BaseCommand):
+    help = "Recompute the enrollment counters stored on courses and instructors from the enrollments collection."
+
+    def handle(self, *args, **options):
+        courses, instructors = repair_counters()
+        self.stdout.write(self.style.SUCCESS(f"Repaired enrollment counters of {courses} courses and {instructors} instructors"))
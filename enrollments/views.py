@@ -2,12 +2,15 @@
 
 from django.shortcuts import render, redirect
 from django.http import HttpResponse, Http404, JsonResponse
-from django.core.mail import send_mail
+from core.outbox import enqueue_mail
 from django.conf import settings
 from django.views.decorators.http import require_POST
 import pymongo
 from bson.objectid import ObjectId, InvalidId
-from users.views import manual_login_required, manual_instructor_required, load_session, save_session, get_db
+from users.views import manual_login_required, manual_instructor_required
+from core.mongo import get_db
+from core.loader import get_loader
+from enrollments import counters
 
 
 @manual_login_required
@@ -18,20 +21,13 @@ def instructor_enrollments_view(request):
     This view now correctly fetches both the student's account status (is_active)
     and the enrollment approval status (approval_status).
     """
-    db, conn = get_db()
-    if db is None:
-        return HttpResponse("Database connection failed.", status=500)
+    db = get_db()
 
     try:
-        session_id, session_data = load_session(request)
-        request.session_data = session_data
-        request.session_id = session_id
 
-        instructor_id = session_data.get('user_id')
+        instructor_id = request.session.get('user_id')
         if not instructor_id:
-            response = redirect('instructor_login')
-            save_session(response, session_id, session_data)
-            return response
+            return redirect('instructor_login')
 
         try:
             instructor_object_id = ObjectId(instructor_id)
@@ -57,13 +53,16 @@ def instructor_enrollments_view(request):
         instructor_course_ids = [course['_id'] for course in instructor_courses]
         instructor_course_titles = {str(course['_id']): course['title'] for course in instructor_courses}
 
-        enrollments_cursor = enrollments_collection.find(
+        enrollments = list(enrollments_collection.find(
             {"course_id": {"$in": instructor_course_ids}}
-        ).sort("enrolled_at", -1)
+        ).sort("enrolled_at", -1))
+        students_by_id = get_loader(request).load_many(
+            'users', [e['student_id'] for e in enrollments], ['username', 'is_active']
+        )
 
         enrollments_list = []
-        for enrollment in enrollments_cursor:
-            student_doc = users_collection.find_one({"_id": enrollment['student_id']}, {"username": 1, "is_active": 1})
+        for enrollment in enrollments:
+            student_doc = students_by_id.get(enrollment['student_id'])
             if not student_doc:
                 continue
 
@@ -83,16 +82,11 @@ def instructor_enrollments_view(request):
             'instructor_email': instructor_doc.get('email'),
         }
 
-        response = render(request, 'enrollments/instructor_enrollments.html', context)
-        save_session(response, session_id, session_data)
-        return response
+        return render(request, 'enrollments/instructor_enrollments.html', context)
 
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         return HttpResponse(f"An unexpected error occurred: {e}", status=500)
-    finally:
-        if conn:
-            conn.close()
 
 
 @manual_login_required
@@ -102,20 +96,13 @@ def course_enrollments_detail_view(request, course_id):
     Displays the detailed list of students enrolled in a specific course.
     It shows the student's account status, enrollment approval status, and payment proof.
     """
-    db, conn = get_db()
-    if db is None:
-        return HttpResponse("Database connection failed.", status=500)
+    db = get_db()
 
     try:
-        session_id, session_data = load_session(request)
-        request.session_data = session_data
-        request.session_id = session_id
 
-        instructor_id = session_data.get('user_id')
+        instructor_id = request.session.get('user_id')
         if not instructor_id:
-            response = redirect('instructor_login')
-            save_session(response, session_id, session_data)
-            return response
+            return redirect('instructor_login')
 
         users_collection = db['users']
         instructor_doc = users_collection.find_one(
@@ -139,13 +126,16 @@ def course_enrollments_detail_view(request, course_id):
         if not course:
             return HttpResponse("You are not authorized to view enrollments for this course.", status=403)
 
-        enrollments_cursor = enrollments_collection.find(
+        enrollments = list(enrollments_collection.find(
             {"course_id": course_object_id}
-        ).sort("enrolled_at", -1)
+        ).sort("enrolled_at", -1))
+        students_by_id = get_loader(request).load_many(
+            'users', [e['student_id'] for e in enrollments], ['username', 'is_active']
+        )
 
         enrollments_list = []
-        for enrollment in enrollments_cursor:
-            student_doc = users_collection.find_one({"_id": enrollment['student_id']}, {"username": 1, "is_active": 1})
+        for enrollment in enrollments:
+            student_doc = students_by_id.get(enrollment['student_id'])
             if not student_doc:
                 continue
 
@@ -165,16 +155,11 @@ def course_enrollments_detail_view(request, course_id):
             'instructor_email': instructor_doc.get('email'),
         }
 
-        response = render(request, 'enrollments/course_enrollments_detail.html', context)
-        save_session(response, session_id, session_data)
-        return response
+        return render(request, 'enrollments/course_enrollments_detail.html', context)
 
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         return HttpResponse(f"An unexpected error occurred: {e}", status=500)
-    finally:
-        if conn:
-            conn.close()
 
 
 @require_POST
@@ -185,13 +170,10 @@ def approve_enrollment(request, enrollment_id):
     Approves a student's enrollment by updating the approval_status in the database.
     This is the action taken by the instructor after being notified by the admin.
     """
-    db, conn = get_db()
-    if db is None:
-        return JsonResponse({"success": False, "error": "Database connection failed."}, status=500)
+    db = get_db()
 
     try:
-        session_id, session_data = load_session(request)
-        instructor_id = session_data.get('user_id')
+        instructor_id = request.session.get('user_id')
         if not instructor_id:
             return JsonResponse({'success': False, 'error': 'Not logged in'}, status=401)
 
@@ -217,13 +199,18 @@ def approve_enrollment(request, enrollment_id):
         if enrollment.get('approval_status') == 'Approved':
             return JsonResponse({"success": False, "error": "Enrollment already approved"})
 
-        # Update the enrollment status in the database
-        result = enrollments_collection.update_one(
-            {"_id": enrollment_object_id},
-            {"$set": {"approval_status": "Approved"}}
+        # Update the enrollment status in the database; the status guard makes
+        # sure a double submit moves the course counters only once, and the
+        # status it replaced is the counter that goes down
+        previous = enrollments_collection.find_one_and_update(
+            {"_id": enrollment_object_id, "approval_status": {"$ne": "Approved"}},
+            {"$set": {"approval_status": "Approved"}},
+            projection={"approval_status": 1},
         )
 
-        if result.modified_count == 1:
+        if previous:
+            counters.record_approval(enrollment['course_id'], previous.get('approval_status'))
+
             # Send email notification to student upon approval
             users_collection = db['users']
             enrollment = enrollments_collection.find_one({"_id": enrollment_object_id})
@@ -232,7 +219,7 @@ def approve_enrollment(request, enrollment_id):
 
             try:
                 if student_doc and course_doc:
-                    send_mail(
+                    enqueue_mail(
                         subject=f"Enrollment Approved: {course_doc.get('title', 'Course')}",
                         message=(
                             f"Hello {student_doc.get('username', 'Student')},\n\n"
@@ -256,7 +243,4 @@ def approve_enrollment(request, enrollment_id):
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
-    finally:
-        if conn:
-            conn.close()
 
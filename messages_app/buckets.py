@@ -0,0 +1,205 @@
+"""
+Bucketed message storage.
+
+A conversation document in `messages` no longer embeds its messages. They
+are appended to fixed-size, time-ordered bucket documents in
+`message_buckets`:
+
+    {"conversation_id": ..., "seq": 1, "count": 50,
+     "start_at": ..., "end_at": ..., "messages": [...]}
+
+and the conversation keeps only what list pages need:
+
+    {"bucket_seq": <newest bucket>, "message_count": ...,
+     "last_message": {"content", "sent_at", "sender_id"}}
+
+plus the inbox summary fields described in messages_app.summaries.
+
+Pages read the newest N messages with load_messages() and page backwards
+with the returned `before` cursor. Conversations still holding the old
+embedded `messages` array are split into buckets on first access
+(ensure_bucketed), or all at once with `manage.py migrate_message_buckets`.
+"""
+
+import datetime
+
+from django.conf import settings
+from pymongo.errors import DuplicateKeyError
+
+from core.mongo import db
+
+CONVERSATIONS_COLLECTION = "messages"
+BUCKETS_COLLECTION = "message_buckets"
+
+
+def bucket_size():
+    return getattr(settings, "MESSAGE_BUCKET_SIZE", 50)
+
+
+def page_size():
+    return getattr(settings, "MESSAGE_PAGE_SIZE", 50)
+
+
+def _summary(message):
+    return {
+        "content": message.get("content", ""),
+        "sent_at": message.get("sent_at"),
+        "sender_id": message.get("sender_id"),
+    }
+
+
+def _bucket_doc(conversation_id, seq, messages):
+    return {
+        "conversation_id": conversation_id,
+        "seq": seq,
+        "count": len(messages),
+        "start_at": messages[0].get("sent_at"),
+        "end_at": messages[-1].get("sent_at"),
+        "messages": messages,
+    }
+
+
+def ensure_bucketed(conversation):
+    """
+    Move a legacy embedded `messages` array into buckets. Returns the
+    conversation document as it is after the migration (unchanged if it
+    was already bucketed).
+    """
+    conversations = db[CONVERSATIONS_COLLECTION]
+    buckets = db[BUCKETS_COLLECTION]
+    size = bucket_size()
+
+    for _ in range(3):
+        if conversation is None or "messages" not in conversation:
+            return conversation
+
+        legacy = list(conversation.get("messages") or [])
+        ordered = sorted(legacy, key=lambda m: m.get("sent_at") or datetime.datetime.min)
+        chunks = [ordered[i:i + size] for i in range(0, len(ordered), size)]
+
+        # Replacing by (conversation_id, seq) keeps a re-run after a crash idempotent
+        for seq, chunk in enumerate(chunks, start=1):
+            buckets.replace_one(
+                {"conversation_id": conversation["_id"], "seq": seq},
+                _bucket_doc(conversation["_id"], seq, chunk),
+                upsert=True,
+            )
+
+        update = {"$unset": {"messages": ""}, "$set": {"bucket_seq": len(chunks), "message_count": len(ordered)}}
+        if ordered:
+            update["$set"]["last_message"] = _summary(ordered[-1])
+        # Only drop the array if nobody appended to it while we were copying
+        result = conversations.update_one(
+            {"_id": conversation["_id"], "messages": {"$size": len(legacy)}},
+            update,
+        )
+        if result.modified_count == 1:
+            conversation = dict(conversation)
+            conversation.pop("messages", None)
+            conversation.update(update["$set"])
+            return conversation
+        conversation = conversations.find_one({"_id": conversation["_id"]})
+
+    print(f"Could not migrate messages of conversation {conversation['_id']}")
+    return conversation
+
+
+def append_message(conversation, message):
+    """Append a message to the conversation's newest bucket, opening a new bucket when it is full."""
+    conversations = db[CONVERSATIONS_COLLECTION]
+    buckets = db[BUCKETS_COLLECTION]
+    conversation = ensure_bucketed(conversation)
+    conversation_id = conversation["_id"]
+    sent_at = message.get("sent_at")
+    seq = conversation.get("bucket_seq", 0)
+
+    while True:
+        if seq:
+            result = buckets.update_one(
+                {"conversation_id": conversation_id, "seq": seq, "count": {"$lt": bucket_size()}},
+                {
+                    "$push": {"messages": message},
+                    "$inc": {"count": 1},
+                    "$min": {"start_at": sent_at},
+                    "$max": {"end_at": sent_at},
+                },
+            )
+            if result.modified_count == 1:
+                break
+        seq += 1
+        try:
+            buckets.insert_one(_bucket_doc(conversation_id, seq, [message]))
+            break
+        except DuplicateKeyError:
+            # Another request opened this bucket first; try to append to it
+            continue
+
+    # Inbox summary: last message, activity time and unread counters (see messages_app.summaries)
+    update = {
+        "$set": {"last_message": _summary(message), "last_message_at": sent_at},
+        "$inc": {"message_count": 1},
+        "$max": {"bucket_seq": seq},
+    }
+    if message.get("receiver_id") is not None:
+        update["$inc"][f"unread.{message['receiver_id']}"] = 1
+    if message.get("sender_id") is not None:
+        update["$set"][f"unread.{message['sender_id']}"] = 0
+    conversations.update_one({"_id": conversation_id}, update)
+    return seq
+
+
+def _parse_cursor(before):
+    try:
+        seq, index = before.split("-", 1)
+        return int(seq), int(index)
+    except (AttributeError, ValueError):
+        return None
+
+
+def load_messages(conversation_id, limit=None, before=None):
+    """
+    The newest `limit` messages older than the `before` cursor, oldest first.
+    Returns (messages, older_cursor); older_cursor is None when there is no
+    earlier history.
+    """
+    limit = limit or page_size()
+    query = {"conversation_id": conversation_id}
+    position = _parse_cursor(before) if before else None
+    if position:
+        query["seq"] = {"$lte": position[0]}
+
+    collected = []
+    older_cursor = None
+    for bucket in db[BUCKETS_COLLECTION].find(query, {"seq": 1, "messages": 1}).sort("seq", -1):
+        messages = bucket.get("messages", [])
+        end = len(messages)
+        if position and bucket["seq"] == position[0]:
+            end = min(end, position[1])
+        take = min(end, limit - len(collected))
+        start = end - take
+        collected[:0] = messages[start:end]
+        if len(collected) >= limit:
+            if start > 0 or bucket["seq"] > 1:
+                older_cursor = f"{bucket['seq']}-{start}"
+            break
+    return collected, older_cursor
+
+
+def clear_messages(conversation_id):
+    """Delete every message of a conversation."""
+    db[BUCKETS_COLLECTION].delete_many({"conversation_id": conversation_id})
+    db[CONVERSATIONS_COLLECTION].update_one(
+        {"_id": conversation_id},
+        {"$set": {"bucket_seq": 0, "message_count": 0, "unread": {}}, "$unset": {"last_message": "", "messages": ""}},
+    )
+
+
+def migrate_all(batch_size=100):
+    """Bucket every conversation that still embeds its messages. Returns the number migrated."""
+    migrated = 0
+    cursor = db[CONVERSATIONS_COLLECTION].find({"messages": {"$exists": True}}, batch_size=batch_size)
+    for conversation in cursor:
+        result = ensure_bucketed(conversation)
+        if result is not None and "messages" not in result:
+            migrated += 1
+    return migrated
@@ -0,0 +1,14 @@
+"""MongoDB indexes for the messages collections (see `manage.py ensure_mongo_indexes`)."""
+
+INDEXES = {
+    "messages": [
+        # Per-course conversation lookup
+        {"keys": [("participants", 1), ("course_id", 1)], "name": "participants_course"},
+        # Inbox pages: a user's conversations by latest activity, keyset-paged on (last_message_at, _id)
+        {"keys": [("participants", 1), ("last_message_at", -1), ("_id", -1)], "name": "participants_last_message_at"},
+    ],
+    "message_buckets": [
+        # One bucket per sequence number; also what append_message relies on to open a new bucket safely
+        {"keys": [("conversation_id", 1), ("seq", 1)], "name": "conversation_seq_unique", "unique": True},
+    ],
+}
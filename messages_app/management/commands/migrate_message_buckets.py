@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from messages_app.buckets import migrate_all
+
+
+class Command(BaseCommand):
+    help = "Move messages embedded in conversation documents into message_buckets."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100, help="Conversations fetched per cursor batch.")
+
+    def handle(self, *args, **options):
+        migrated = migrate_all(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Migrated {migrated} conversations to message buckets"))
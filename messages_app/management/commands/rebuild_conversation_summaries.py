@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from messages_app.summaries import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = "Recompute participant names, course titles and last activity stored on every conversation."
+
+    def handle(self, *args, **options):
+        updated = rebuild_summaries()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt summaries for {updated} conversations"))
@@ -0,0 +1,128 @@
+"""
+Conversation summaries for the inbox pages.
+
+Every conversation document in `messages` carries what an inbox row shows,
+so listing conversations needs no message, user or course lookups:
+
+    {"participant_names": {"<user id>": "name", ...}, "course_title": ...,
+     "last_message": {"content", "sent_at", "sender_id"}, "last_message_at": ...,
+     "unread": {"<user id>": n, ...}}
+
+append_message() (messages_app.buckets) moves last_message, last_message_at
+and the unread counters in the same update that counts the message;
+opening a conversation resets the reader's counter with mark_read().
+Inbox pages are one query on (participants, last_message_at, _id), paged
+with a `before` cursor. Conversations created before the summaries existed
+are filled in the first time their participant lists them.
+"""
+
+import datetime
+
+from core import keyset
+from core.mongo import db
+from messages_app.buckets import CONVERSATIONS_COLLECTION, ensure_bucketed, page_size
+
+
+def _names(user_ids):
+    users = db["users"].find({"_id": {"$in": list(user_ids)}}, {"username": 1})
+    return {str(u["_id"]): u.get("username", "Unknown User") for u in users}
+
+
+def _course_title(course_id):
+    course = db["courses"].find_one({"_id": course_id}, {"title": 1}) if course_id else None
+    return course.get("title", "Unknown Course") if course else "Unknown Course"
+
+
+def create_conversation(course_id, participant_ids):
+    """Insert a conversation with its summary fields filled in. Returns the new document."""
+    conversation = {
+        "course_id": course_id,
+        "participants": list(participant_ids),
+        "participant_names": _names(participant_ids),
+        "course_title": _course_title(course_id),
+        "last_message_at": datetime.datetime.utcnow(),
+        "unread": {str(p): 0 for p in participant_ids},
+        "bucket_seq": 0,
+        "message_count": 0,
+    }
+    conversation["_id"] = db[CONVERSATIONS_COLLECTION].insert_one(conversation).inserted_id
+    return conversation
+
+
+def ensure_summary(conversation):
+    """Fill in the summary fields of a conversation that predates them. Returns the updated document."""
+    conversation = ensure_bucketed(conversation)
+    if conversation is None or all(k in conversation for k in ("participant_names", "course_title", "last_message_at", "unread")):
+        return conversation
+
+    last_message = conversation.get("last_message") or {}
+    fields = {
+        "participant_names": _names(conversation.get("participants", [])),
+        "course_title": _course_title(conversation.get("course_id")),
+        # Conversations without messages sort by when they were started
+        "last_message_at": last_message.get("sent_at") or conversation["_id"].generation_time.replace(tzinfo=None),
+        "unread": conversation.get("unread") or {},
+    }
+    db[CONVERSATIONS_COLLECTION].update_one({"_id": conversation["_id"]}, {"$set": fields})
+    return {**conversation, **fields}
+
+
+def mark_read(conversation_id, user_id):
+    """Reset the user's unread counter on a conversation (no write if it is already 0)."""
+    key = f"unread.{user_id}"
+    db[CONVERSATIONS_COLLECTION].update_one({"_id": conversation_id, key: {"$gt": 0}}, {"$set": {key: 0}})
+
+
+def list_conversations(user_id, limit=None, before=None, projection=None):
+    """
+    One page of the user's conversations, most recent activity first.
+    Returns (conversations, older_cursor); older_cursor is None on the last page.
+    """
+    conversations = db[CONVERSATIONS_COLLECTION]
+    limit = limit or page_size()
+    query = {"participants": user_id}
+
+    if before:
+        query.update(keyset.older_than("last_message_at", before))
+    else:
+        for legacy in conversations.find({"participants": user_id, "last_message_at": {"$exists": False}}):
+            ensure_summary(legacy)
+
+    rows = list(
+        conversations.find(query, projection)
+        .sort(keyset.newest_first("last_message_at"))
+        .limit(limit + 1)
+    )
+    return keyset.page(rows, "last_message_at", limit)
+
+
+def other_participant(conversation, user_id):
+    """(id, display name) of the participant who is not user_id."""
+    other_id = next((p for p in conversation.get("participants", []) if p != user_id), None)
+    name = conversation.get("participant_names", {}).get(str(other_id), "Unknown User") if other_id else "Unknown User"
+    return other_id, name
+
+
+def rename_participant(user_id, name):
+    """Propagate a username change to the user's conversation summaries."""
+    db[CONVERSATIONS_COLLECTION].update_many(
+        {"participants": user_id},
+        {"$set": {f"participant_names.{user_id}": name}},
+    )
+
+
+def rename_course(course_id, title):
+    """Propagate a course title change to its conversation summaries."""
+    db[CONVERSATIONS_COLLECTION].update_many({"course_id": course_id}, {"$set": {"course_title": title}})
+
+
+def rebuild_summaries():
+    """Recompute names, titles and last_message_at for every conversation. Returns the number updated."""
+    updated = 0
+    for conversation in db[CONVERSATIONS_COLLECTION].find({}):
+        conversation = ensure_bucketed(conversation)
+        for key in ("participant_names", "course_title", "last_message_at"):
+            conversation.pop(key, None)
+        ensure_summary(conversation)
+        updated += 1
+    return updated
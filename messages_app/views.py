@@ -2,32 +2,22 @@ import datetime
 from django.shortcuts import render, redirect
 from bson import ObjectId
 from functools import wraps
-from pymongo import MongoClient
-
-# Connect to MongoDB
-try:
-    client = MongoClient('mongodb://localhost:27017/', serverSelectionTimeoutMS=5000)
-    db = client['Peer_to_Peer_Education']
-    
-    # Test the connection
-    db.command('ping')
-    
-    messages_collection = db['messages']
-    courses_collection = db['courses']
-    users_collection = db['users']
-    
-    print("MongoDB connection established successfully")
-except Exception as e:
-    print(f"Failed to establish initial MongoDB connection: {e}")
-    print(f"Error type: {type(e).__name__}")
-    print(f"Error details: {str(e)}")
-    
-    # Set collections to None so other functions can handle the error
-    client = None
-    db = None
-    messages_collection = None
-    courses_collection = None
-    users_collection = None
+from core.mongo import db
+from core.loader import get_loader
+from messages_app.buckets import append_message, clear_messages, load_messages
+from messages_app.summaries import (
+    create_conversation, ensure_summary, list_conversations, mark_read, other_participant,
+)
+
+messages_collection = db['messages']
+courses_collection = db['courses']
+users_collection = db['users']
+
+# Conversation fields an inbox row needs
+SUMMARY_PROJECTION = {
+    'participants': 1, 'participant_names': 1, 'course_title': 1,
+    'last_message': 1, 'last_message_at': 1, 'unread': 1,
+}
 
 # Decorator to ensure student is logged in
 def student_login_required(view_func):
@@ -46,23 +36,18 @@ def inbox(request):
     except:
         return redirect('student_login')
 
-    conversations = messages_collection.find({'participants': student_obj_id})
+    # One page of conversations, newest activity first; names and titles are stored on each one
+    conversations, older_cursor = list_conversations(
+        student_obj_id, before=request.GET.get('before'), projection=SUMMARY_PROJECTION
+    )
 
     inbox_list = []
     for convo in conversations:
-        other_participant_id = next(
-            (p for p in convo.get('participants', []) if p != student_obj_id),
-            None
-        )
-
-        other_user_doc = users_collection.find_one({'_id': other_participant_id})
-        other_user_name = other_user_doc.get('username') if other_user_doc else "Unknown"
-
-        course_doc = courses_collection.find_one({'_id': convo.get('course_id')})
-        course_title = course_doc.get('title') if course_doc else "Unknown Course"
+        _, other_user_name = other_participant(convo, student_obj_id)
+        course_title = convo.get('course_title', 'Unknown Course')
 
-        if convo.get('messages'):
-            last_message = max(convo['messages'], key=lambda m: m['sent_at'])
+        last_message = convo.get('last_message')
+        if last_message:
             sent_at = last_message['sent_at'].strftime("%Y-%m-%d %H:%M")
             last_message_content = last_message.get('content', '')
         else:
@@ -74,6 +59,7 @@ def inbox(request):
             'course': course_title,
             'date': sent_at,
             'message': last_message_content,
+            'unread': convo.get('unread', {}).get(str(student_obj_id), 0),
             'conversation_id': str(convo['_id']),
         })
 
@@ -85,6 +71,7 @@ def inbox(request):
 
     return render(request, 'messages_app/inbox.html', {
         'inbox_list': inbox_list,
+        'older_cursor': older_cursor,
         'student_name': student_name,
         'student_profile_pic': student_profile_pic,
     })
@@ -179,17 +166,9 @@ def send_message(request):
             'participants': {'$all': [student_obj_id, instructor_obj_id]}
         })
 
-        if convo:
-            messages_collection.update_one(
-                {'_id': convo['_id']},
-                {'$push': {'messages': new_message}}
-            )
-        else:
-            messages_collection.insert_one({
-                'course_id': course_obj_id,
-                'participants': [student_obj_id, instructor_obj_id],
-                'messages': [new_message]
-            })
+        if not convo:
+            convo = create_conversation(course_obj_id, [student_obj_id, instructor_obj_id])
+        append_message(convo, new_message)
 
         return redirect('student_inbox')
 
@@ -221,21 +200,14 @@ def student_conversation_detail(request, conversation_id):
     if not conversation:
         return redirect('student_inbox')
 
-    # Get the other participant (instructor)
-    other_participant_id = next(
-        (p for p in conversation.get('participants', []) if p != student_obj_id), None
-    )
+    # Instructor name and course title come from the conversation summary
+    conversation = ensure_summary(conversation)
+    other_participant_id, instructor_name = other_participant(conversation, student_obj_id)
 
     if not other_participant_id:
         return redirect('student_inbox')
 
-    # Get instructor details
-    instructor_doc = users_collection.find_one({'_id': other_participant_id})
-    instructor_name = instructor_doc.get('username', 'Unknown Instructor') if instructor_doc else 'Unknown Instructor'
-
-    # Get course details
-    course_doc = courses_collection.find_one({'_id': conversation.get('course_id')})
-    course_title = course_doc.get('title', 'Unknown Course') if course_doc else 'Unknown Course'
+    course_title = conversation.get('course_title', 'Unknown Course')
 
     # Handle POST (Send Message)
     if request.method == 'POST':
@@ -248,20 +220,14 @@ def student_conversation_detail(request, conversation_id):
                 'sent_at': datetime.datetime.utcnow()
             }
 
-            # Update the conversation with the new message
-            messages_collection.update_one(
-                {'_id': conversation_obj_id},
-                {'$push': {'messages': new_message}}
-            )
-            
+            append_message(conversation, new_message)
+
             # Redirect to refresh the page
             return redirect('student_conversation_detail', conversation_id=conversation_id)
 
-    # Get all messages for this conversation
-    messages = conversation.get('messages', [])
-    
-    # Sort messages by sent_at
-    messages.sort(key=lambda m: m.get('sent_at', datetime.datetime.min))
+    # Newest page of messages; ?before= pages back through older ones
+    messages, older_cursor = load_messages(conversation_obj_id, before=request.GET.get('before'))
+    mark_read(conversation_obj_id, student_obj_id)
 
     context = {
         'conversation': {
@@ -269,6 +235,7 @@ def student_conversation_detail(request, conversation_id):
             'course_title': course_title
         },
         'messages': messages,
+        'older_cursor': older_cursor,
         'instructor_name': instructor_name,
         'student_id': str(student_obj_id),
         'student_name': request.session.get('student_name', ''),
@@ -283,43 +250,13 @@ def student_conversation_detail(request, conversation_id):
 
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import HttpResponse, Http404
-from pymongo import MongoClient
 
 from bson.objectid import ObjectId, InvalidId
 import datetime
 
 # Assumed imports for decorators and session management
-from users.views import manual_login_required, manual_instructor_required, load_session, save_session
-
-
-def get_mongo_connection():
-    """
-    Helper function to get a MongoDB database object.
-    Returns the database object or None on failure.
-    """
-    try:
-        # First try to use the global connection if it's available
-        if 'db' in globals() and db is not None:
-            # Test if the global connection is still alive
-            try:
-                db.command('ping')
-                return db
-            except:
-                pass  # Global connection is dead, create a new one
-        
-        # Create a new connection if global connection is not available
-        client = MongoClient('mongodb://localhost:27017/', serverSelectionTimeoutMS=5000)
-        db_new = client['Peer_to_Peer_Education']
-        # Test the connection
-        db_new.command('ping')
-        return db_new
-    except Exception as e:
-        print(f"MongoDB connection error: {e}")
-        print(f"Error type: {type(e).__name__}")
-        print(f"Error details: {str(e)}")
-        if 'client' in locals():
-            client.close()
-        return None
+from users.views import manual_login_required, manual_instructor_required
+from core.mongo import get_db, pool_stats
 
 
 def get_instructor_data_for_sidebar(db, instructor_id):
@@ -351,76 +288,45 @@ def instructor_conversations_list(request):
     """
     Displays a list of all conversations for the instructor.
     """
-    db = get_mongo_connection()
-    if db is None:
-        return HttpResponse("""
-            <div style="text-align: center; padding: 50px; font-family: Arial, sans-serif;">
-                <h2 style="color: #e74c3c;">⚠️ Database Connection Error</h2>
-                <p style="color: #7f8c8d; margin: 20px 0;">Unable to connect to the database. Please try the following:</p>
-                <ul style="text-align: left; max-width: 400px; margin: 0 auto; color: #7f8c8d;">
-                    <li>Check if MongoDB service is running</li>
-                    <li>Verify database connection settings</li>
-                    <li>Contact system administrator</li>
-                </ul>
-                <p style="margin-top: 30px;">
-                    <a href="{% url 'instructor_dashboard' %}" style="background: #3498db; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px;">← Back to Dashboard</a>
-                </p>
-            </div>
-        """, status=500)
+    db = get_db()
 
     try:
-        session_id, session_data = load_session(request)
-        request.session_data = session_data
-        request.session_id = session_id
-        instructor_id = request.session_data.get('user_id')
+        instructor_id = request.session.get('user_id')
         if not instructor_id:
             return redirect('instructor_login')
 
         instructor_object_id = ObjectId(instructor_id)
 
-        messages_collection = db['messages']
-        users_collection = db['users']
-        courses_collection = db['courses']
-
         context = get_instructor_data_for_sidebar(db, instructor_id)
         if not context:
             return redirect('instructor_login')
 
-        # Find all conversations where the instructor is a participant
-        conversations_cursor = messages_collection.find(
-            {"participants": instructor_object_id}
+        # One page of conversations, newest activity first; names and titles are stored on each one
+        conversations_list, older_cursor = list_conversations(
+            instructor_object_id, before=request.GET.get('before'), projection=SUMMARY_PROJECTION
         )
 
+        # Banned students are still checked live, with one query for the whole page
+        other_ids = {conv['_id']: other_participant(conv, instructor_object_id) for conv in conversations_list}
+        users_by_id = get_loader(request).load_many('users', [i for i, _ in other_ids.values()], ['is_active'])
+
         conversations = []
-        for conv in conversations_cursor:
-            # Manually find the other participant's ID
-            other_participant_id = next(
-                (p for p in conv.get('participants', []) if p != instructor_object_id), None
-            )
-
-            if other_participant_id:
-                # Find the user details for the other participant
-                other_user = users_collection.find_one({"_id": other_participant_id})
-
-                # --- NEW VALIDATION: Check if the student is active ---
-                if other_user and not other_user.get('is_active', True):
-                    # Skip this conversation if the student is banned/inactive
-                    continue
-                # --- END NEW VALIDATION ---
-
-                conv['other_participant_name'] = other_user.get('username',
-                                                                'Unknown User') if other_user else 'Unknown User'
-            else:
-                conv['other_participant_name'] = 'Unknown User'
-
-            # Find the course details
-            if 'course_id' in conv:
-                course = courses_collection.find_one({"_id": conv['course_id']})
-                conv['course_title'] = course.get('title', 'Unknown Course') if course else 'Unknown Course'
+        for conv in conversations_list:
+            other_participant_id, conv['other_participant_name'] = other_ids[conv['_id']]
+
+            # --- NEW VALIDATION: Check if the student is active ---
+            other_user = users_by_id.get(other_participant_id)
+            if other_user and not other_user.get('is_active', True):
+                # Skip this conversation if the student is banned/inactive
+                continue
+            # --- END NEW VALIDATION ---
+
+            conv.setdefault('course_title', 'Unknown Course')
+            conv['unread'] = conv.get('unread', {}).get(str(instructor_object_id), 0)
 
             # Get the last message details if available
-            if conv.get('messages'):
-                last_message = conv['messages'][-1]
+            last_message = conv.get('last_message')
+            if last_message:
                 conv['last_message'] = last_message.get('content', '')
                 conv['last_message_date'] = last_message.get('sent_at')
 
@@ -430,10 +336,9 @@ def instructor_conversations_list(request):
             conversations.append(conv)
 
         context['conversations'] = conversations
+        context['older_cursor'] = older_cursor
 
-        response = render(request, 'messages_app/instructor_conversations_list.html', context)
-        save_session(response, session_id, session_data)
-        return response
+        return render(request, 'messages_app/instructor_conversations_list.html', context)
     except InvalidId:
         return HttpResponse("Invalid user ID format. Please log in again.", status=400)
     except Exception as e:
@@ -447,28 +352,10 @@ def instructor_new_conversation(request):
     """
     Renders a form to start a new conversation and handles POST to create it.
     """
-    db = get_mongo_connection()
-    if db is None:
-        return HttpResponse("""
-            <div style="text-align: center; padding: 50px; font-family: Arial, sans-serif;">
-                <h2 style="color: #e74c3c;">⚠️ Database Connection Error</h2>
-                <p style="color: #7f8c8d; margin: 20px 0;">Unable to connect to the database. Please try the following:</p>
-                <ul style="text-align: left; max-width: 400px; margin: 0 auto; color: #7f8c8d;">
-                    <li>Check if MongoDB service is running</li>
-                    <li>Verify database connection settings</li>
-                    <li>Contact system administrator</li>
-                </ul>
-                <p style="margin-top: 30px;">
-                    <a href="{% url 'instructor_dashboard' %}" style="background: #3498db; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px;">← Back to Dashboard</a>
-                </p>
-            </div>
-        """, status=500)
+    db = get_db()
 
     try:
-        session_id, session_data = load_session(request)
-        request.session_data = session_data
-        request.session_id = session_id
-        instructor_id = request.session_data.get('user_id')
+        instructor_id = request.session.get('user_id')
         if not instructor_id:
             return redirect('instructor_login')
 
@@ -516,20 +403,11 @@ def instructor_new_conversation(request):
             })
 
             if existing_conversation:
-                response = redirect('instructor_conversation_detail', pk=str(existing_conversation['_id']))
-                save_session(response, session_id, session_data)
-                return response
-
-            new_conversation = {
-                "course_id": course_obj_id,
-                "participants": [instructor_object_id, student_obj_id],
-                "messages": []
-            }
-            result = messages_collection.insert_one(new_conversation)
+                return redirect('instructor_conversation_detail', pk=str(existing_conversation['_id']))
+
+            new_conversation = create_conversation(course_obj_id, [instructor_object_id, student_obj_id])
 
-            response = redirect('instructor_conversation_detail', pk=str(result.inserted_id))
-            save_session(response, session_id, session_data)
-            return response
+            return redirect('instructor_conversation_detail', pk=str(new_conversation['_id']))
 
         instructor_courses = list(courses_collection.find(
             {"instructor_id": instructor_object_id},
@@ -555,9 +433,7 @@ def instructor_new_conversation(request):
         context['students'] = students_for_dropdown
         context['courses'] = [{'id_str': str(c['_id']), 'title': c['title']} for c in instructor_courses]
 
-        response = render(request, 'messages_app/instructor_new_conversation.html', context)
-        save_session(response, session_id, session_data)
-        return response
+        return render(request, 'messages_app/instructor_new_conversation.html', context)
     except InvalidId:
         return HttpResponse("Invalid user ID format. Please log in again.", status=400)
     except Exception as e:
@@ -571,28 +447,10 @@ def instructor_conversation_detail(request, pk):
     """
     Displays a specific conversation and handles sending new messages.
     """
-    db = get_mongo_connection()
-    if db is None:
-        return HttpResponse("""
-            <div style="text-align: center; padding: 50px; font-family: Arial, sans-serif;">
-                <h2 style="color: #e74c3c;">⚠️ Database Connection Error</h2>
-                <p style="color: #7f8c8d; margin: 20px 0;">Unable to connect to the database. Please try the following:</p>
-                <ul style="text-align: left; max-width: 400px; margin: 0 auto; color: #7f8c8d;">
-                    <li>Check if MongoDB service is running</li>
-                    <li>Verify database connection settings</li>
-                    <li>Contact system administrator</li>
-                </ul>
-                <p style="margin-top: 30px;">
-                    <a href="{% url 'instructor_dashboard' %}" style="background: #3498db; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px;">← Back to Dashboard</a>
-                </p>
-            </div>
-        """, status=500)
+    db = get_db()
 
     try:
-        session_id, session_data = load_session(request)
-        request.session_data = session_data
-        request.session_id = session_id
-        instructor_id = request.session_data.get('user_id')
+        instructor_id = request.session.get('user_id')
         if not instructor_id:
             return redirect('instructor_login')
 
@@ -600,7 +458,6 @@ def instructor_conversation_detail(request, pk):
 
         messages_collection = db['messages']
         users_collection = db['users']
-        courses_collection = db['courses']
 
         try:
             conversation_obj_id = ObjectId(pk)
@@ -620,10 +477,11 @@ def instructor_conversation_detail(request, pk):
         if conversation is None:
             raise Http404("Conversation not found or you are not a participant.")
 
+        conversation = ensure_summary(conversation)
+
         # --- NEW VALIDATION: Check if the other participant is active ---
-        other_participant_id = next(
-            (p for p in conversation.get('participants', []) if p != instructor_object_id), None
-        )
+        other_participant_id, _ = other_participant(conversation, instructor_object_id)
+        other_user = None
         if other_participant_id:
             other_user = users_collection.find_one({'_id': other_participant_id}, {'is_active': 1})
             if other_user and not other_user.get('is_active', True):
@@ -644,48 +502,28 @@ def instructor_conversation_detail(request, pk):
                     "sent_at": datetime.datetime.utcnow()
                 }
 
-                # Update the conversation with the new message
-                messages_collection.update_one(
-                    {"_id": conversation_obj_id},
-                    {"$push": {"messages": new_message}}
-                )
-                response = redirect('instructor_conversation_detail', pk=pk)
-                save_session(response, session_id, session_data)
-                return response
-
-        # Fetch participant names for the conversation detail page
-        participant_ids = conversation.get('participants', [])
-        participant_names = {}
-        other_participant_id = None
-        for participant_id in participant_ids:
-            if participant_id != instructor_object_id:
-                other_participant_id = participant_id
-            user = users_collection.find_one({"_id": participant_id}, {"username": 1})
-            if user:
-                participant_names[str(participant_id)] = user.get('username', 'Unknown User')
-
-        # Get course title
-        course = courses_collection.find_one(
-            {'_id': conversation['course_id']}) if 'course_id' in conversation else None
-
-        # Check if other participant is active
-        other_user_is_active = False
-        if other_participant_id:
-            other_user = users_collection.find_one({'_id': other_participant_id}, {'is_active': 1})
-            other_user_is_active = other_user.get('is_active', True) if other_user else False
+                append_message(conversation, new_message)
+                return redirect('instructor_conversation_detail', pk=pk)
+
+        # Participant names and course title come from the conversation summary
+        participant_names = conversation.get('participant_names', {})
+
+        # Inactive students were turned away above, so only a missing user is left to check
+        other_user_is_active = other_user is not None
 
         context['conversation'] = {
             'id_str': str(conversation['_id']),
-            'course_title': course.get('title', 'Unknown Course') if course else 'Unknown Course'
+            'course_title': conversation.get('course_title', 'Unknown Course')
         }
-        context['messages'] = conversation.get('messages', [])
+        context['messages'], context['older_cursor'] = load_messages(
+            conversation_obj_id, before=request.GET.get('before')
+        )
+        mark_read(conversation_obj_id, instructor_object_id)
         context['participant_names'] = participant_names
         context['instructor_id'] = str(instructor_object_id)
         context['is_student_active'] = other_user_is_active
 
-        response = render(request, 'messages_app/instructor_conversation_detail.html', context)
-        save_session(response, session_id, session_data)
-        return response
+        return render(request, 'messages_app/instructor_conversation_detail.html', context)
     except InvalidId:
         return HttpResponse("Invalid ID format.", status=400)
     except Exception as e:
@@ -698,16 +536,8 @@ def health_check(request):
     Simple health check endpoint to test database connectivity
     """
     try:
-        db = get_mongo_connection()
-        if db is None:
-            return HttpResponse("""
-                <div style="text-align: center; padding: 50px; font-family: Arial, sans-serif;">
-                    <h2 style="color: #e74c3c;">❌ Database Connection Failed</h2>
-                    <p style="color: #7f8c8d;">MongoDB is not accessible</p>
-                    <p style="color: #7f8c8d; font-size: 0.9em;">Check if MongoDB service is running on localhost:27017</p>
-                </div>
-            """, status=500)
-        
+        db = get_db()
+
         # Test basic operations
         db.command('ping')
         
@@ -715,7 +545,10 @@ def health_check(request):
         users_count = db['users'].count_documents({})
         courses_count = db['courses'].count_documents({})
         messages_count = db['messages'].count_documents({})
-        
+
+        # Connection pool usage for this worker process
+        pool = pool_stats()
+
         return HttpResponse(f"""
             <div style="text-align: center; padding: 50px; font-family: Arial, sans-serif;">
                 <h2 style="color: #27ae60;">✅ Database Connection Successful</h2>
@@ -725,6 +558,12 @@ def health_check(request):
                     <p><strong>Courses:</strong> {courses_count}</p>
                     <p><strong>Messages:</strong> {messages_count}</p>
                 </div>
+                <div style="background: #f8f9fa; padding: 20px; border-radius: 10px; margin: 20px auto; max-width: 400px;">
+                    <p><strong>Pool size (max):</strong> {pool['max_pool_size']}</p>
+                    <p><strong>Connections in use:</strong> {pool['in_use']} (peak {pool['peak_in_use']})</p>
+                    <p><strong>Connections opened / closed:</strong> {pool['connections_created']} / {pool['connections_closed']}</p>
+                    <p><strong>Checkouts / failed:</strong> {pool['checkouts']} / {pool['checkout_failures']}</p>
+                </div>
             </div>
         """)
         
@@ -763,10 +602,7 @@ def clear_student_conversation(request, conversation_id):
         return redirect('student_inbox')
     
     # Clear all messages in the conversation
-    messages_collection.update_one(
-        {'_id': conversation_obj_id},
-        {'$set': {'messages': []}}
-    )
+    clear_messages(conversation_obj_id)
     
     return redirect('student_inbox')
 
@@ -780,13 +616,10 @@ def clear_instructor_conversation(request, pk):
     if request.method != 'POST':
         return redirect('instructor_conversations_list')
     
-    db = get_mongo_connection()
-    if db is None:
-        return redirect('instructor_conversations_list')
+    db = get_db()
     
     try:
-        session_id, session_data = load_session(request)
-        instructor_id = session_data.get('user_id')
+        instructor_id = request.session.get('user_id')
         if not instructor_id:
             return redirect('instructor_login')
         
@@ -805,14 +638,9 @@ def clear_instructor_conversation(request, pk):
             return redirect('instructor_conversations_list')
         
         # Clear all messages in the conversation
-        messages_collection.update_one(
-            {'_id': conversation_obj_id},
-            {'$set': {'messages': []}}
-        )
+        clear_messages(conversation_obj_id)
         
-        response = redirect('instructor_conversations_list')
-        save_session(response, session_id, session_data)
-        return response
+        return redirect('instructor_conversations_list')
         
     except Exception as e:
         print(f"Error clearing instructor conversation: {e}")
@@ -0,0 +1,142 @@
+"""
+Per-instructor balance documents in `instructor_earnings_summary`.
+
+    {"_id": <instructor_id>, "earnings_from_courses": ..., "total_withdrawals": ...,
+     "current_balance": ..., "updated_at": ...}
+
+Payouts and withdrawals move the totals with $inc, and a withdrawal only
+goes through if the balance still covers it (conditional update), so the
+balance check is a single document read and safe under concurrent requests.
+Instructors without a document get one built from their payouts and
+withdrawals the first time it is needed; `manage.py rebuild_instructor_balances`
+recomputes all of them.
+"""
+
+import datetime
+
+from pymongo.errors import DuplicateKeyError
+
+from core.mongo import db
+
+SUMMARY_COLLECTION = "instructor_earnings_summary"
+INSTRUCTOR_SHARE = 0.7
+
+
+def _sum(collection, instructor_id):
+    rows = list(db[collection].aggregate([
+        {"$match": {"instructor_id": instructor_id}},
+        {"$group": {"_id": None, "total": {"$sum": "$amount"}}},
+    ]))
+    return rows[0]["total"] if rows else 0
+
+
+def compute_balance(instructor_id):
+    """Totals recomputed from the payouts and withdrawals collections."""
+    earnings = _sum("payouts", instructor_id)
+    withdrawals = _sum("withdrawals", instructor_id)
+    return {
+        "earnings_from_courses": earnings,
+        "total_withdrawals": withdrawals,
+        "current_balance": earnings - withdrawals,
+    }
+
+
+def _ensure(instructor_id):
+    """(balance document, whether it was just built from history)."""
+    summaries = db[SUMMARY_COLLECTION]
+    doc = summaries.find_one({"_id": instructor_id})
+    if doc is not None:
+        return doc, False
+    doc = {"_id": instructor_id, **compute_balance(instructor_id), "updated_at": datetime.datetime.utcnow()}
+    try:
+        summaries.insert_one(doc)
+    except DuplicateKeyError:
+        # Built concurrently by another request
+        return summaries.find_one({"_id": instructor_id}), False
+    return doc, True
+
+
+def ensure_balance(instructor_id):
+    """Return the instructor's balance document, building it from history if it does not exist yet."""
+    return _ensure(instructor_id)[0]
+
+
+def _with_derived(doc):
+    earnings = doc.get("earnings_from_courses", 0)
+    total_sales = int(round(earnings / INSTRUCTOR_SHARE)) if earnings else 0
+    return {
+        "total_sales": total_sales,
+        "total_withdrawals": doc.get("total_withdrawals", 0),
+        "current_balance": doc.get("current_balance", 0),
+        "earnings_from_courses": earnings,
+        "platform_fee": total_sales - earnings,
+    }
+
+
+def get_instructor_balance(instructor_id):
+    """Earnings, withdrawals, balance plus the derived gross sales and platform fee."""
+    return _with_derived(ensure_balance(instructor_id))
+
+
+def get_instructor_balances(instructor_ids):
+    """{instructor_id: balance dict} for several instructors with one query."""
+    ids = list({i for i in instructor_ids if i is not None})
+    docs = {doc["_id"]: doc for doc in db[SUMMARY_COLLECTION].find({"_id": {"$in": ids}})}
+    return {i: _with_derived(docs.get(i) or ensure_balance(i)) for i in ids}
+
+
+def record_payout(instructor_id, amount):
+    """Credit a payout to the instructor's balance. Call after inserting the payout record."""
+    _, built = _ensure(instructor_id)
+    if built:
+        # Freshly built from the payouts collection, which already includes this payout
+        return
+    db[SUMMARY_COLLECTION].update_one(
+        {"_id": instructor_id},
+        {
+            "$inc": {"earnings_from_courses": amount, "current_balance": amount},
+            "$set": {"updated_at": datetime.datetime.utcnow()},
+        },
+    )
+
+
+def reserve_withdrawal(instructor_id, amount):
+    """
+    Debit a withdrawal if and only if the balance covers it. Returns False when
+    it does not; the caller inserts the withdrawal record only after True.
+    """
+    ensure_balance(instructor_id)
+    result = db[SUMMARY_COLLECTION].update_one(
+        {"_id": instructor_id, "current_balance": {"$gte": amount}},
+        {
+            "$inc": {"current_balance": -amount, "total_withdrawals": amount},
+            "$set": {"updated_at": datetime.datetime.utcnow()},
+        },
+    )
+    return result.modified_count == 1
+
+
+def release_withdrawal(instructor_id, amount):
+    """Undo reserve_withdrawal() when the withdrawal record could not be written."""
+    db[SUMMARY_COLLECTION].update_one(
+        {"_id": instructor_id},
+        {
+            "$inc": {"current_balance": amount, "total_withdrawals": -amount},
+            "$set": {"updated_at": datetime.datetime.utcnow()},
+        },
+    )
+
+
+def rebuild_balances():
+    """Recompute every instructor's document from payouts and withdrawals. Returns the number rebuilt."""
+    instructor_ids = set(db["payouts"].distinct("instructor_id")) | set(db["withdrawals"].distinct("instructor_id"))
+    instructor_ids |= {u["_id"] for u in db["users"].find({"role": "instructor"}, {"_id": 1})}
+    instructor_ids.discard(None)
+    now = datetime.datetime.utcnow()
+    for instructor_id in instructor_ids:
+        db[SUMMARY_COLLECTION].update_one(
+            {"_id": instructor_id},
+            {"$set": {**compute_balance(instructor_id), "updated_at": now}},
+            upsert=True,
+        )
+    return len(instructor_ids)
@@ -0,0 +1,12 @@
+"""MongoDB indexes for payouts and withdrawals (see `manage.py ensure_mongo_indexes`)."""
+
+INDEXES = {
+    "payouts": [
+        {"keys": [("instructor_id", 1), ("paid_at", -1)], "name": "instructor_paid_at"},
+    ],
+    "withdrawals": [
+        {"keys": [("instructor_id", 1), ("requested_at", -1)], "name": "instructor_requested_at"},
+        {"keys": [("role", 1), ("requested_at", -1)], "name": "role_requested_at"},
+        {"keys": [("role", 1), ("withdrawn_at", -1)], "name": "role_withdrawn_at"},
+    ],
+}
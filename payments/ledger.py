@@ -0,0 +1,139 @@
+"""
+Revenue ledger.
+
+The course price is written onto the enrollment when it is created
+(enrollment["price"]) and added to running totals in the `revenue_ledger`
+collection:
+
+    {"_id": "all_time", "total": ..., "count": ...}
+    {"_id": "2025-08", "year": 2025, "month": 8, "total": ..., "count": ...}
+
+Admin pages read these totals instead of joining every enrollment to its
+course. `manage.py reconcile_revenue_ledger` checks them against the
+enrollments (and repairs them with --fix).
+"""
+
+import datetime
+
+from pymongo import UpdateOne
+
+from core.mongo import db
+
+LEDGER_COLLECTION = "revenue_ledger"
+ALL_TIME_ID = "all_time"
+
+PLATFORM_SHARE = 0.3
+INSTRUCTOR_SHARE = 0.7
+
+
+def month_key(year, month):
+    return f"{year:04d}-{month:02d}"
+
+
+def record_enrollment_revenue(price, enrolled_at=None):
+    """Add one enrollment's price to the all-time and monthly totals."""
+    enrolled_at = enrolled_at or datetime.datetime.utcnow()
+    ledger = db[LEDGER_COLLECTION]
+    ledger.update_one(
+        {"_id": ALL_TIME_ID},
+        {"$inc": {"total": price, "count": 1}},
+        upsert=True,
+    )
+    ledger.update_one(
+        {"_id": month_key(enrolled_at.year, enrolled_at.month)},
+        {
+            "$inc": {"total": price, "count": 1},
+            "$setOnInsert": {"year": enrolled_at.year, "month": enrolled_at.month},
+        },
+        upsert=True,
+    )
+
+
+def total_revenue():
+    doc = db[LEDGER_COLLECTION].find_one({"_id": ALL_TIME_ID}, {"total": 1})
+    return doc.get("total", 0) if doc else 0
+
+
+def month_revenue(year, month):
+    doc = db[LEDGER_COLLECTION].find_one({"_id": month_key(year, month)}, {"total": 1})
+    return doc.get("total", 0) if doc else 0
+
+
+def monthly_revenue():
+    """Monthly totals, newest first: [{"year", "month", "total", "count"}, ...]."""
+    return list(
+        db[LEDGER_COLLECTION]
+        .find({"_id": {"$ne": ALL_TIME_ID}}, {"_id": 0, "year": 1, "month": 1, "total": 1, "count": 1})
+        .sort([("year", -1), ("month", -1)])
+    )
+
+
+def platform_commission():
+    """The platform's 30% of all revenue."""
+    return int(total_revenue() * PLATFORM_SHARE)
+
+
+def backfill_enrollment_prices():
+    """Stamp the current course price on enrollments created before the ledger. Returns the number updated."""
+    enrollments = db["enrollments"]
+    legacy = list(enrollments.find({"price": {"$exists": False}}, {"course_id": 1}))
+    if not legacy:
+        return 0
+    course_ids = list({e.get("course_id") for e in legacy})
+    prices = {c["_id"]: c.get("price", 0) for c in db["courses"].find({"_id": {"$in": course_ids}}, {"price": 1})}
+    operations = [
+        UpdateOne({"_id": e["_id"], "price": {"$exists": False}}, {"$set": {"price": prices[e.get("course_id")]}})
+        for e in legacy
+        if e.get("course_id") in prices
+    ]
+    if operations:
+        enrollments.bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+def expected_totals():
+    """Recompute {month_key: {"year", "month", "total", "count"}} from the enrollments' own prices."""
+    totals = {}
+    for row in db["enrollments"].aggregate([
+        {"$match": {"price": {"$exists": True}, "enrolled_at": {"$type": "date"}}},
+        {"$group": {
+            "_id": {"year": {"$year": "$enrolled_at"}, "month": {"$month": "$enrolled_at"}},
+            "total": {"$sum": "$price"},
+            "count": {"$sum": 1},
+        }},
+    ]):
+        year, month = row["_id"]["year"], row["_id"]["month"]
+        totals[month_key(year, month)] = {"year": year, "month": month, "total": row["total"], "count": row["count"]}
+    return totals
+
+
+def reconcile(fix=False):
+    """
+    Compare the ledger with the enrollments. Returns a list of
+    (key, ledger_total, ledger_count, expected_total, expected_count) for every mismatch;
+    with fix=True the ledger documents are rewritten to the expected values.
+    """
+    ledger = db[LEDGER_COLLECTION]
+    expected = expected_totals()
+    expected[ALL_TIME_ID] = {
+        "total": sum(row["total"] for row in expected.values()),
+        "count": sum(row["count"] for row in expected.values()),
+    }
+    recorded = {doc["_id"]: doc for doc in ledger.find({})}
+
+    mismatches = []
+    for key in sorted(set(expected) | set(recorded)):
+        want = expected.get(key, {"total": 0, "count": 0})
+        have = recorded.get(key, {})
+        if have.get("total", 0) != want["total"] or have.get("count", 0) != want["count"]:
+            mismatches.append((key, have.get("total", 0), have.get("count", 0), want["total"], want["count"]))
+
+    if fix and mismatches:
+        operations = []
+        for key, _, _, _, _ in mismatches:
+            if key in expected:
+                operations.append(UpdateOne({"_id": key}, {"$set": expected[key]}, upsert=True))
+            else:
+                operations.append(UpdateOne({"_id": key}, {"$set": {"total": 0, "count": 0}}))
+        ledger.bulk_write(operations, ordered=False)
+    return mismatches
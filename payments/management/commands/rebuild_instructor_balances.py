@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from payments.balances import rebuild_balances
+
+
+class Command(BaseCommand):
+    help = "Recompute every instructor's balance document from the payouts and withdrawals collections."
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_balances()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt balances for {rebuilt} instructors"))
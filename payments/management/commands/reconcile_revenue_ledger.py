@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from core.mongo import db
+from payments.ledger import backfill_enrollment_prices, reconcile
+
+
+class Command(BaseCommand):
+    help = "Verify the revenue ledger totals against the enrollments, optionally repairing them."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix", action="store_true",
+            help="Stamp prices on legacy enrollments and rewrite ledger totals that do not match.",
+        )
+
+    def handle(self, *args, **options):
+        fix = options["fix"]
+
+        if fix:
+            stamped = backfill_enrollment_prices()
+            if stamped:
+                self.stdout.write(f"Stamped the current course price on {stamped} legacy enrollments")
+        else:
+            unpriced = db["enrollments"].count_documents({"price": {"$exists": False}})
+            if unpriced:
+                self.stdout.write(self.style.WARNING(
+                    f"{unpriced} enrollments have no recorded price and are not counted (run with --fix)"
+                ))
+
+        mismatches = reconcile(fix=fix)
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("Revenue ledger matches the enrollments"))
+            return
+
+        for key, have_total, have_count, want_total, want_count in mismatches:
+            self.stdout.write(self.style.WARNING(
+                f"{key}: ledger {have_total} ({have_count} enrollments), "
+                f"enrollments {want_total} ({want_count} enrollments)"
+            ))
+        if fix:
+            self.stdout.write(self.style.SUCCESS(f"Repaired {len(mismatches)} ledger entries"))
+        else:
+            self.stdout.write(self.style.ERROR(f"{len(mismatches)} ledger entries differ (run with --fix to repair)"))
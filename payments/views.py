@@ -1,9 +1,9 @@
 from django.shortcuts import render, redirect
 from django.views.decorators.http import require_GET
 import pymongo
-
-connection = pymongo.MongoClient("localhost", 27017)
-db = connection["Peer_to_Peer_Education"]
+from core.mongo import db
+from .balances import get_instructor_balance, get_instructor_balances, reserve_withdrawal, release_withdrawal
+from dashboard.rollups import instructor_monthly_payouts
 users_collection = db["users"]
 
 # view_all_payments
@@ -44,22 +44,23 @@ def view_withdrawals(request):
     
     withdrawals = []
     # Filter to show only instructor withdrawals (exclude admin withdrawals)
-    for w in withdrawals_collection.find({"role": "instructor"}).sort("requested_at", -1):
+    instructor_withdrawals = list(withdrawals_collection.find({"role": "instructor"}).sort("requested_at", -1))
+
+    # Current available balance of each instructor, one read of the balance documents
+    try:
+        balances = get_instructor_balances([w.get("instructor_id") for w in instructor_withdrawals])
+    except Exception as e:
+        print(f"Error loading instructor balances: {e}")
+        balances = {}
+
+    for w in instructor_withdrawals:
         instructor_id = w.get("instructor_id")
         
         # Get instructor information
         instructor_doc = users_collection.find_one({"_id": instructor_id})
         instructor_name = instructor_doc.get("username", "Unknown") if instructor_doc else "Unknown"
         
-        # Calculate instructor's current available balance
-        current_balance = 0
-        if instructor_id:
-            try:
-                earnings_summary = get_instructor_earnings(db, instructor_id)
-                current_balance = earnings_summary.get('current_balance', 0)
-            except Exception as e:
-                print(f"Error calculating balance for instructor {instructor_id}: {e}")
-                current_balance = 0
+        current_balance = balances.get(instructor_id, {}).get('current_balance', 0)
         
         withdrawals.append({
             "instructor": instructor_name,
@@ -80,70 +81,9 @@ from django.views.decorators.csrf import csrf_protect
 import pymongo
 from bson.objectid import ObjectId, InvalidId
 import datetime
-from users.views import manual_login_required, manual_instructor_required, load_session, save_session, \
+from users.views import manual_login_required, manual_instructor_required, \
     get_instructor_context
-
-
-def get_db():
-    """Establishes a connection to the MongoDB database."""
-    try:
-        connection = pymongo.MongoClient("localhost", 27017, serverSelectionTimeoutMS=5000)
-        connection.admin.command('ping')  # Check the connection
-        return connection["Peer_to_Peer_Education"], connection
-    except pymongo.errors.ConnectionFailure as e:
-        print(f"Error: Could not connect to MongoDB: {e}")
-        return None, None
-
-
-def get_instructor_earnings(db, instructor_object_id):
-    """
-    Helper function to calculate total sales, total withdrawals, and current balance for an instructor.
-    This function ensures the balance is always calculated from the most up-to-date data.
-    Instructors now only earn from course fees (70%) - no admin salary.
-    """
-    courses_collection = db["courses"]
-    enrollments_collection = db["enrollments"]
-    payouts_collection = db["payouts"]
-    withdrawals_collection = db["withdrawals"]
-
-    # Get all course IDs for the current instructor
-    instructor_course_ids = [
-        c["_id"] for c in courses_collection.find({"instructor_id": instructor_object_id}, {"_id": 1})
-    ]
-
-    # Calculate totals from payouts (only after admin marks as paid)
-    pipeline_payouts = [
-        {"$match": {"instructor_id": instructor_object_id}},
-        {"$group": {"_id": None, "total_payouts": {"$sum": "$amount"}}}
-    ]
-    total_payouts_doc = list(payouts_collection.aggregate(pipeline_payouts))
-    earnings_from_courses = total_payouts_doc[0]["total_payouts"] if total_payouts_doc else 0
-
-    # Derive gross sales and platform fee from payouts
-    total_sales = int(round(earnings_from_courses / 0.7)) if earnings_from_courses else 0
-
-    # Calculate total withdrawals
-    pipeline_withdrawals = [
-        {"$match": {"instructor_id": instructor_object_id}},
-        {"$group": {
-            "_id": None,
-            "total_withdrawals": {"$sum": "$amount"}
-        }}
-    ]
-    total_withdrawals_doc = list(withdrawals_collection.aggregate(pipeline_withdrawals))
-    total_withdrawals = total_withdrawals_doc[0]["total_withdrawals"] if total_withdrawals_doc else 0
-
-    # Calculate the final balance - only from course earnings (no admin salary)
-    platform_fee = total_sales - earnings_from_courses
-    current_balance = earnings_from_courses - total_withdrawals
-
-    return {
-        "total_sales": total_sales,
-        "total_withdrawals": total_withdrawals,
-        "current_balance": current_balance,
-        "earnings_from_courses": earnings_from_courses,
-        "platform_fee": platform_fee
-    }
+from core.mongo import get_db
 
 
 @manual_login_required
@@ -153,16 +93,11 @@ def instructor_earnings_view(request):
     Renders the instructor's earnings page, fetching data from the database.
     This version dynamically calculates earnings based on enrollments and withdrawals.
     """
-    db, conn = get_db()
+    db = get_db()
 
-    if db is None:
-        return HttpResponse("Database connection failed. Please check if MongoDB is running.", status=500)
 
     try:
-        session_id, session_data = load_session(request)
-        request.session_data = session_data
-        request.session_id = session_id
-        instructor_id = request.session_data.get("user_id")
+        instructor_id = request.session.get("user_id")
 
         if not instructor_id:
             print("ERROR: user_id is missing from the session. Redirecting to login.")
@@ -174,44 +109,24 @@ def instructor_earnings_view(request):
             print(f"ERROR: Invalid instructor_id '{instructor_id}' in session.")
             return HttpResponse("Invalid user ID format. Please log in again.", status=400)
 
-        # Get relevant collections
-        courses_collection = db["courses"]
-        payouts_collection = db["payouts"]
-
-        # --- Aggregation Pipeline for Monthly Earnings ---
-        # Get all course IDs for the current instructor
-        instructor_course_ids = [
-            c["_id"] for c in courses_collection.find({"instructor_id": instructor_object_id}, {"_id": 1})
-        ]
-
-        # Group payouts (instructor net) by paid month
-        pipeline = [
-            {"$match": {"instructor_id": instructor_object_id}},
-            {"$project": {
-                "month": {"$month": "$paid_at"},
-                "year": {"$year": "$paid_at"},
-                "amount": 1
-            }},
-            {"$group": {"_id": {"year": "$year", "month": "$month"}, "total_net": {"$sum": "$amount"}}},
-            {"$sort": {"_id.year": 1, "_id.month": 1}}
-        ]
-
-        monthly_earnings_cursor = payouts_collection.aggregate(pipeline)
+        # --- Monthly Earnings ---
+        # Payouts (instructor net) per paid month, summed from the instructor's daily rollups
+        monthly_earnings = instructor_monthly_payouts(instructor_object_id)
         monthly_earnings_list = []
 
-        # Get total earnings for final balance
-        earnings_summary = get_instructor_earnings(db, instructor_object_id)
+        # Current balance from the instructor's balance document
+        earnings_summary = get_instructor_balance(instructor_object_id)
         current_balance = earnings_summary['current_balance']
 
-        for doc in monthly_earnings_cursor:
-            earnings_from_courses = doc["total_net"]  # already net 70%
+        for doc in monthly_earnings:
+            earnings_from_courses = doc["total"]  # already net 70%
             total_sales = int(round(earnings_from_courses / 0.7)) if earnings_from_courses else 0
             platform_fee = total_sales - earnings_from_courses
             # Only course earnings - no admin salary
             total_final_earnings = earnings_from_courses
 
             monthly_earnings_list.append({
-                "month_year": datetime.date(doc["_id"]["year"], doc["_id"]["month"], 1).strftime("%B %Y"),
+                "month_year": datetime.date(doc["year"], doc["month"], 1).strftime("%B %Y"),
                 "total_sales": f"{total_sales:,.2f}",
                 "platform_fee": f"{platform_fee:,.2f}",
                 "earnings_from_courses": f"{earnings_from_courses:,.2f}",
@@ -224,25 +139,18 @@ def instructor_earnings_view(request):
             **get_instructor_context(request)
         }
 
-        response = render(request, "payments/instructor_earnings.html", context)
-        save_session(response, request.session_id, request.session_data)
-        return response
+        return render(request, "payments/instructor_earnings.html", context)
 
     except Exception as e:
         print(f"FATAL ERROR: An unexpected exception occurred in instructor_earnings_view: {e}")
         return HttpResponse("An internal server error occurred. Please check the server logs for details.", status=500)
-    finally:
-        if conn is not None:
-            conn.close()
 
 
 @csrf_protect
 @manual_login_required
 @manual_instructor_required
 def instructor_withdrawals_view(request):
-    db, conn = get_db()
-    if db is None:
-        return HttpResponse("Database connection failed. Please check if MongoDB is running.", status=500)
+    db = get_db()
 
     try:
         withdrawals_collection = db['withdrawals']
@@ -250,15 +158,10 @@ def instructor_withdrawals_view(request):
         admin_notifications_collection = db['admin_notifications']  # New collection for admin notifications
         message = ""
 
-        session_id, session_data = load_session(request)
-        request.session_data = session_data
-        request.session_id = session_id
-        instructor_id = request.session_data.get('user_id')
+        instructor_id = request.session.get('user_id')
 
         if not instructor_id:
-            response = HttpResponse("Instructor ID not found in session.", status=400)
-            save_session(response, request.session_id, request.session_data)
-            return response
+            return HttpResponse("Instructor ID not found in session.", status=400)
 
         try:
             instructor_object_id = ObjectId(instructor_id)
@@ -278,11 +181,8 @@ def instructor_withdrawals_view(request):
                 if withdrawal_amount <= 0:
                     message = "Withdrawal amount must be greater than zero."
                 else:
-                    # Check for available balance using the dynamic helper function
-                    earnings_summary = get_instructor_earnings(db, instructor_object_id)
-                    current_balance = earnings_summary['current_balance']
-
-                    if withdrawal_amount > current_balance:
+                    # Debit the balance only if it still covers the amount (atomic conditional update)
+                    if not reserve_withdrawal(instructor_object_id, withdrawal_amount):
                         message = "Insufficient balance for this withdrawal."
                     else:
                         # Process the withdrawal immediately
@@ -304,7 +204,11 @@ def instructor_withdrawals_view(request):
                             "is_script_sent": True,
                             "email_content": e_script_content  # Save the email content locally
                         }
-                        withdrawals_collection.insert_one(new_withdrawal)
+                        try:
+                            withdrawals_collection.insert_one(new_withdrawal)
+                        except Exception:
+                            release_withdrawal(instructor_object_id, withdrawal_amount)
+                            raise
 
                         # Create and save the admin notification
                         admin_notifications_collection.insert_one({
@@ -327,7 +231,7 @@ def instructor_withdrawals_view(request):
         withdrawals_list = list(withdrawals_cursor)
 
         # Get the latest balance and total withdrawals after processing the request
-        earnings_summary = get_instructor_earnings(db, instructor_object_id)
+        earnings_summary = get_instructor_balance(instructor_object_id)
         current_balance = earnings_summary['current_balance']
         total_withdrawals = earnings_summary['total_withdrawals']
 
@@ -338,12 +242,7 @@ def instructor_withdrawals_view(request):
             'message': message,
             **get_instructor_context(request)
         }
-        response = render(request, 'payments/instructor_withdrawals.html', context)
-        save_session(response, request.session_id, request.session_data)
-        return response
+        return render(request, 'payments/instructor_withdrawals.html', context)
     except Exception as e:
         print(f"FATAL ERROR: An unexpected exception occurred in instructor_withdrawals_view: {e}")
         return HttpResponse(f"An internal server error occurred: {e}", status=500)
-    finally:
-        if conn:
-            conn.close()
@@ -47,6 +47,7 @@ INSTALLED_APPS = [
     'enrollments',
     'reviews',
     'messages_app',
+    'core',
 ]
 
 MIDDLEWARE = [
@@ -89,6 +90,28 @@ DATABASES = {
     }
 }
 
+# MongoDB (application data)
+# One pooled client per process is shared by every app, see core/mongo.py
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+MONGO_DB_NAME = 'Peer_to_Peer_Education'
+MONGO_MAX_POOL_SIZE = 50  # Connections per worker process
+MONGO_MIN_POOL_SIZE = 0
+MONGO_MAX_IDLE_TIME_MS = 60000
+MONGO_WAIT_QUEUE_TIMEOUT_MS = 5000  # How long a request waits for a free connection
+MONGO_SERVER_SELECTION_TIMEOUT_MS = 5000
+MONGO_CONNECT_TIMEOUT_MS = 5000
+MONGO_SOCKET_TIMEOUT_MS = 20000
+
+# Concurrent queries of multi-query views, see core/fanout.py
+QUERY_FANOUT_WORKERS = 8  # Threads per worker process
+QUERY_FANOUT_TIMEOUT = 5  # Seconds per query
+
+# Sessions
+# Stored in the MongoDB `sessions` collection and expired by a TTL index
+SESSION_ENGINE = 'core.session_backend'
+MONGO_SESSION_COLLECTION = 'sessions'
+SESSION_COOKIE_AGE = 60 * 60 * 24 * 14  # Two weeks
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -136,6 +159,26 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'users', 'media')
 
+# Where uploads are stored: 'filesystem' (MEDIA_ROOT on this node) or
+# 'gridfs' (the MongoDB database, for more than one app node; media is then
+# served by core.views.serve_media). `manage.py migrate_media` copies
+# existing files between the two.
+MEDIA_STORAGE = os.environ.get('MEDIA_STORAGE', 'filesystem')
+GRIDFS_BUCKET = 'media'
+MEDIA_STORAGE_BACKENDS = {
+    'filesystem': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'gridfs': {'BACKEND': 'core.gridfs_storage.GridFSStorage', 'OPTIONS': {'bucket_name': GRIDFS_BUCKET}},
+}
+STORAGES = {
+    'default': MEDIA_STORAGE_BACKENDS[MEDIA_STORAGE],
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+# serve_media keeps files up to MEDIA_CACHE_MAX_OBJECT_BYTES (thumbnails,
+# avatars) in a per-process LRU cache of MEDIA_CACHE_MAX_BYTES
+MEDIA_CACHE_MAX_BYTES = 32 * 1024 * 1024
+MEDIA_CACHE_MAX_OBJECT_BYTES = 256 * 1024
+MEDIA_CACHE_SECONDS = 300
+
 # Send Email
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'  # Your email server's SMTP host
@@ -144,3 +187,101 @@ EMAIL_USE_TLS = True  # Use TLS for secure connection (or EMAIL_USE_SSL = True f
 EMAIL_HOST_USER = 'plhcumaubin1010@gmail.com'  # Your email address
 EMAIL_HOST_PASSWORD = 'rhdo vwef uuth bwwr'
 
+
+# Email outbox (views enqueue; `manage.py send_outbox` delivers).
+# Use 'django.core.mail.backends.console.EmailBackend' or the file-based
+# backend (with EMAIL_FILE_PATH) to run the worker without SMTP.
+OUTBOX_EMAIL_BACKEND = os.environ.get('OUTBOX_EMAIL_BACKEND', EMAIL_BACKEND)
+EMAIL_FILE_PATH = os.environ.get('EMAIL_FILE_PATH', os.path.join(BASE_DIR, 'sent_emails'))
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_BASE_SECONDS = 60
+OUTBOX_RETRY_MAX_SECONDS = 3600
+OUTBOX_POLL_SECONDS = 5
+
+# Background jobs (core.jobs; `manage.py run_jobs` runs them). Cascades
+# over enrolled students (courses.cascades) work CASCADE_BATCH_SIZE
+# enrollments per query and outbox insert.
+JOB_LEASE_SECONDS = 300  # A job whose worker stopped checkpointing is taken over after this
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BASE_SECONDS = 30
+JOB_RETRY_MAX_SECONDS = 3600
+JOB_POLL_SECONDS = 5
+CASCADE_BATCH_SIZE = 500
+
+
+# Conversation messages are stored in buckets of MESSAGE_BUCKET_SIZE;
+# conversation pages show the newest MESSAGE_PAGE_SIZE with "load older".
+MESSAGE_BUCKET_SIZE = 50
+MESSAGE_PAGE_SIZE = 50
+
+
+# Activity log writer (dashboard.activity_log): entries are buffered and
+# written with insert_many() when the buffer is full or every FLUSH_SECONDS.
+ACTIVITY_LOG_BUFFER_SIZE = 100
+ACTIVITY_LOG_FLUSH_SECONDS = 5
+ACTIVITY_LOG_WRITE_CONCERN = {'w': 1, 'j': False}
+# Keep entries for this many days (None keeps everything). 'prune' deletes
+# them with `manage.py prune_activity_logs`; 'ttl' uses a TTL index instead.
+ACTIVITY_LOG_RETENTION_DAYS = 180
+ACTIVITY_LOG_RETENTION_MODE = 'prune'
+ACTIVITY_FEED_PAGE_SIZE = 10
+
+# Weeks shown on the user growth chart (summed from dashboard.rollups daily buckets)
+USER_GROWTH_WEEKS = 52
+
+
+# Cache for the admin dashboard KPIs (dashboard.metrics). LocMemCache is
+# per process; set METRICS_CACHE_BACKEND/LOCATION to a shared cache (e.g.
+# django.core.cache.backends.redis.RedisCache) so write-path invalidation
+# reaches every worker.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'metrics': {
+        'BACKEND': os.environ.get('METRICS_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('METRICS_CACHE_LOCATION', 'dashboard-metrics'),
+    },
+}
+METRICS_CACHE_ALIAS = 'metrics'
+METRICS_TOTALS_TTL = 300
+METRICS_ACTIVITY_TTL = 60
+
+# Courses per page on the admin and student catalog pages (courses.catalog)
+CATALOG_PAGE_SIZE = 20
+# How often each worker checks the catalog version behind its in-memory
+# snapshot of approved courses (courses.snapshot)
+CATALOG_SNAPSHOT_CHECK_SECONDS = 5
+
+# Thumbnails and WebP variants made from uploaded photos (core.images);
+# `manage.py build_image_variants` makes them for existing photos
+IMAGE_THUMBNAIL_SIZES = {'course': (480, 320), 'profile': (160, 160)}
+IMAGE_WEBP_MAX_SIZE = (1600, 1600)
+IMAGE_VARIANT_QUALITY = 80
+
+# How course file downloads are sent after the enrollment check (courses.downloads):
+# 'django' streams them with FileResponse (sendfile() under gunicorn/uWSGI),
+# 'x-accel-redirect' hands them to nginx through an internal location at
+# COURSE_FILE_ACCEL_PREFIX aliased to MEDIA_ROOT, 'x-sendfile' to Apache/lighttpd.
+# The front end must not serve MEDIA_ROOT publicly: only alias it in the
+# `internal` location, e.g. `location /protected-media/ { internal; alias <MEDIA_ROOT>/; }`,
+# and send public media (photos) through `location /media/ course_photos/...`
+# rules that leave out course_files/ and uploads_tmp/.
+COURSE_FILE_SERVING = os.environ.get('COURSE_FILE_SERVING', 'django')
+COURSE_FILE_ACCEL_PREFIX = '/protected-media/'
+
+# Chunked course file uploads (courses.uploads)
+COURSE_UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024  # Largest chunk accepted per PUT
+COURSE_UPLOAD_MAX_SIZE = 2 * 1024 * 1024 * 1024
+COURSE_UPLOAD_EXPIRE_HOURS = 24  # `manage.py purge_course_uploads` removes older unfinished uploads
+# Local folder for .part files (MEDIA_ROOT when unset). With several nodes,
+# point it at a shared folder or route an upload's requests to one node.
+COURSE_UPLOAD_TEMP_DIR = os.environ.get('COURSE_UPLOAD_TEMP_DIR') or None
+
+# Content-addressed media store (core.media_store). `manage.py gc_media`
+# deletes files unreferenced for MEDIA_GC_GRACE_HOURS; MEDIA_GC_KEEP are
+# default images that documents point at and that are never collected.
+MEDIA_GC_GRACE_HOURS = 1
+MEDIA_GC_CLAIM_SECONDS = 60  # An upload waits at most this long for gc to finish deleting the same file
+MEDIA_GC_KEEP = ['users/default.jpg', 'users/default_profile.png', 'courses/default_course.jpg']
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from users import views
 from django.conf import settings
 from django.conf.urls.static import static
@@ -10,6 +10,7 @@ from payments import views as payment_views
 from courses import views as courses_views
 from reviews import views as reviews_views
 from messages_app import views as msg_views
+from core import views as core_views
 from django.contrib import admin
 from django.conf import settings
 from django.conf.urls.static import static
@@ -29,6 +30,7 @@ def instructor_login(request):
     return render(request, 'instructor_login.html')
 
 import os
+import re
 
 urlpatterns = [
     # Home Page
@@ -70,6 +72,9 @@ urlpatterns = [
     path('dashboard/courses/all/', dashboard_views.view_all_courses, name='view_all_courses'),
     # path('dashboard/courses/<str:course_id>/view/', dashboard_views.view_course_detail, name='view_course_detail'),
 
+    # Background job progress (core.jobs)
+    path('dashboard/jobs/<str:job_id>/', dashboard_views.job_status, name='job_status'),
+
     # Delete course and warn
     path('dashboard/courses/delete/<str:course_id>/', dashboard_views.delete_course_and_warn, name='delete_course_and_warn'),
 
@@ -127,6 +132,7 @@ urlpatterns = [
 
     # Enrolled Course ``
     path('courses/my_courses/', courses_views.my_courses, name='my_courses'),
+    path('courses/<str:course_id>/download/', courses_views.download_course_file, name='download_course_file'),
 
     # Reviews
     path("write-review/", reviews_views.write_review, name="write_review"), 
@@ -161,6 +167,7 @@ urlpatterns = [
     
     # Get Course Info
     path("get_course_info/<str:course_id>/", views.get_course_info, name="get_course_info"),
+    path("get_course_info/", views.get_courses_info, name="get_courses_info"),
 
 
     # Instructor Part
@@ -180,6 +187,10 @@ urlpatterns = [
     path('instructor/courses/<str:pk>/', courses_views.instructor_course_detail, name='instructor_course_detail'),
     path('instructor/courses/<str:pk>/update/', courses_views.instructor_course_update, name='instructor_course_update'),
     path('instructor/courses/<str:pk>/delete/', courses_views.instructor_course_delete, name='instructor_course_delete'),
+    # Chunked course file uploads
+    path('instructor/uploads/', courses_views.course_file_upload_start, name='course_file_upload_start'),
+    path('instructor/uploads/<str:upload_id>/', courses_views.course_file_upload_chunk, name='course_file_upload_chunk'),
+    path('instructor/uploads/<str:upload_id>/complete/', courses_views.course_file_upload_complete, name='course_file_upload_complete'),
 
 
 
@@ -210,10 +221,16 @@ urlpatterns = [
                   
     # --- Health Check ---
     path('health-check/', messages_views.health_check, name='health_check'),
-    # --- Media files serving during development ---
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-
-urlpatterns += static(
-    '/users_media/',  # ✅ this will be the URL prefix
-    document_root=os.path.join(settings.BASE_DIR, 'users', 'media')
-)
\ No newline at end of file
+]
+
+if settings.MEDIA_STORAGE == 'gridfs':
+    # --- Media files streamed from GridFS ---
+    urlpatterns += [re_path(r'^(?:media|users_media)/(?P<path>.+)$', core_views.serve_media, name='serve_media')]
+elif settings.DEBUG:
+    # --- Media files serving during development (course files only through download_course_file) ---
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')), core_views.serve_local_media,
+                {'document_root': settings.MEDIA_ROOT}),
+        re_path(r'^users_media/(?P<path>.+)$', core_views.serve_local_media,
+                {'document_root': os.path.join(settings.BASE_DIR, 'users', 'media')}),
+    ]
\ No newline at end of file
@@ -0,0 +1,8 @@
+"""MongoDB indexes for the reports collection (see `manage.py ensure_mongo_indexes`)."""
+
+INDEXES = {
+    "reports": [
+        {"keys": [("resolved_at", 1)], "name": "resolved_at"},
+        {"keys": [("reported_by", 1)], "name": "reported_by"},
+    ],
+}
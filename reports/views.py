@@ -5,12 +5,11 @@ from django.urls import reverse
 from django.views.decorators.csrf import csrf_protect
 from django.views.decorators.http import require_POST
 from bson.objectid import ObjectId, InvalidId
-from pymongo import MongoClient
 from datetime import datetime, timedelta
-from django.core.mail import send_mail
+from core.outbox import enqueue_mail
 from users.views import manual_login_required
 
-db = MongoClient("localhost", 27017)["Peer_to_Peer_Education"]
+from core.mongo import db
 
 # Admin functionality (existing)
 def all_reports(request):
@@ -100,7 +99,7 @@ def resolve_report(request, report_id):
 
     # ✅ Email student if info available
     if user and course:
-        send_mail(
+        enqueue_mail(
             subject="✅ Your report has been reviewed",
             message=(
                 f"Dear {user['username']},\n\n"
@@ -0,0 +1,8 @@
+"""MongoDB indexes for the reviews collection (see `manage.py ensure_mongo_indexes`)."""
+
+INDEXES = {
+    "reviews": [
+        {"keys": [("course_id", 1)], "name": "course_id"},
+        {"keys": [("student_id", 1)], "name": "student_id"},
+    ],
+}
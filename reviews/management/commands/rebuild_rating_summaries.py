@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from reviews.ratings import rebuild_rating_summaries
+
+
+class Command(BaseCommand):
+    help = "Recompute the rating_summary stored on every course from the reviews collection."
+
+    def handle(self, *args, **options):
+        updated = rebuild_rating_summaries()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating summaries for {updated} courses"))
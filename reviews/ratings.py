@@ -0,0 +1,85 @@
+"""
+Per-course rating summary, stored on the course document.
+
+    course["rating_summary"] = {"count": 3, "sum": 13, "stars": {"1": 0, ..., "5": 2}}
+
+write_review and delete_all_reviews keep it current with $inc, so catalog
+pages read the average straight off the course they already loaded. Run
+`manage.py rebuild_rating_summaries` to recompute it from the reviews.
+"""
+
+from collections import defaultdict
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from core.mongo import db
+
+SUMMARY_FIELD = "rating_summary"
+STARS = ("1", "2", "3", "4", "5")
+
+
+def empty_summary():
+    return {"count": 0, "sum": 0, "stars": {star: 0 for star in STARS}}
+
+
+def _inc_fields(ratings, sign):
+    """$inc document that adds (sign=1) or removes (sign=-1) the given ratings."""
+    inc = defaultdict(int)
+    for rating in ratings:
+        inc[f"{SUMMARY_FIELD}.count"] += sign
+        inc[f"{SUMMARY_FIELD}.sum"] += sign * rating
+        inc[f"{SUMMARY_FIELD}.stars.{int(rating)}"] += sign
+    return dict(inc)
+
+
+def add_rating(course_id, rating):
+    """Count a newly written review in the course's summary."""
+    db["courses"].update_one({"_id": ObjectId(course_id)}, {"$inc": _inc_fields([rating], 1)})
+
+
+def remove_ratings(reviews):
+    """Take deleted reviews (dicts with course_id and rating) out of their courses' summaries."""
+    by_course = defaultdict(list)
+    for review in reviews:
+        by_course[review["course_id"]].append(review["rating"])
+    if by_course:
+        db["courses"].bulk_write(
+            [UpdateOne({"_id": course_id}, {"$inc": _inc_fields(ratings, -1)}) for course_id, ratings in by_course.items()],
+            ordered=False,
+        )
+
+
+def average_rating(course):
+    """Average rating (one decimal) from a course document's summary; 0.0 when unrated."""
+    summary = course.get(SUMMARY_FIELD) or {}
+    count = summary.get("count", 0)
+    if count <= 0:
+        return 0.0
+    return round(summary.get("sum", 0) / count, 1)
+
+
+def rebuild_rating_summaries():
+    """Recompute every course's summary from the reviews collection. Returns the number of courses updated."""
+    summaries = defaultdict(empty_summary)
+    for row in db["reviews"].aggregate([
+        {"$group": {"_id": {"course_id": "$course_id", "rating": "$rating"}, "n": {"$sum": 1}}},
+    ]):
+        course_id = row["_id"].get("course_id")
+        rating = row["_id"].get("rating")
+        if course_id is None or rating is None:
+            continue
+        summary = summaries[course_id]
+        summary["count"] += row["n"]
+        summary["sum"] += rating * row["n"]
+        star = str(int(rating))
+        if star in summary["stars"]:
+            summary["stars"][star] += row["n"]
+
+    operations = [
+        UpdateOne({"_id": course["_id"]}, {"$set": {SUMMARY_FIELD: summaries.get(course["_id"], empty_summary())}})
+        for course in db["courses"].find({}, {"_id": 1})
+    ]
+    if operations:
+        db["courses"].bulk_write(operations, ordered=False)
+    return len(operations)
@@ -1,11 +1,12 @@
 from django.shortcuts import render, redirect
-from pymongo import MongoClient
 from bson.objectid import ObjectId
 from datetime import datetime
 import json
-
-client = MongoClient("localhost", 27017)
-db = client["Peer_to_Peer_Education"]
+from core.mongo import db, get_db
+from core.loader import get_loader
+from .ratings import add_rating, rebuild_rating_summaries, remove_ratings
+from courses.snapshot import bump_catalog_version
+from core import images
 reviews_col = db["reviews"]
 enrollments_col = db["enrollments"]
 courses_col = db["courses"]
@@ -21,10 +22,10 @@ def write_review(request):
     # Get student info for header/profile
     student = db["users"].find_one(
         {"_id": student_id, "role": "student"},
-        {"username": 1, "profile_photo": 1}
+        {"username": 1, "profile_photo": 1, "profile_photo_variants": 1}
     )
     student_name = student.get("username", "Unknown") if student else "Unknown"
-    student_profile_pic = student.get("profile_photo") if student else None
+    student_profile_pic = images.variant(student, "profile_photo") if student else None
 
     # Get all courses the student enrolled in
     enrollments = enrollments_col.find({"student_id": student_id})
@@ -64,6 +65,8 @@ def write_review(request):
         }
 
         reviews_col.insert_one(review_doc)
+        add_rating(course_id, rating)
+        bump_catalog_version()
 
         context["success"] = "Your review has been submitted successfully!"
 
@@ -80,7 +83,7 @@ def my_reviews(request):
     # Get student from users collection
     student = db["users"].find_one(
         {"_id": student_id, "role": "student"},
-        {"username": 1, "profile_photo": 1}
+        {"username": 1, "profile_photo": 1, "profile_photo_variants": 1}
     )
 
     if not student:
@@ -95,8 +98,9 @@ def my_reviews(request):
     reviews = list(reviews_col.find({"student_id": student_id}))
 
     # Add course titles + formatted date
+    courses_by_id = get_loader(request).load_many("courses", [r["course_id"] for r in reviews], ["title"])
     for r in reviews:
-        course = courses_col.find_one({"_id": r["course_id"]}, {"title": 1})
+        course = courses_by_id.get(r["course_id"])
         r["course_title"] = course["title"] if course else "Unknown Course"
         r["reviewed_at_str"] = r["reviewed_at"].strftime("%Y-%m-%d %H:%M")
         r["id"] = str(r["_id"])  # Add string ID for template use
@@ -116,7 +120,7 @@ def my_reviews(request):
     context = {
         "reviews": reviews,
         "student_name": student.get("username", "Unknown"),
-        "student_profile_pic": student.get("profile_photo"),
+        "student_profile_pic": images.variant(student, "profile_photo"),
         "reviews_json": json.dumps(reviews_for_json),
         "student_id_str": str(student_id)
     }
@@ -130,15 +134,26 @@ def delete_all_reviews(request):
     if request.method == "POST":
         student_id = ObjectId(request.session["student_id"])
         
-        # Delete all reviews for this student
-        result = reviews_col.delete_many({"student_id": student_id})
+        # Delete all reviews for this student and take them out of the course rating summaries
+        reviews = list(reviews_col.find({"student_id": student_id}, {"course_id": 1, "rating": 1}))
+        deleted_count = reviews_col.delete_many(
+            {"_id": {"$in": [review["_id"] for review in reviews]}, "student_id": student_id}
+        ).deleted_count
+        if deleted_count == len(reviews):
+            remove_ratings(reviews)
+        else:
+            # Some were deleted by a concurrent request (a double submit), which
+            # takes its own off; recount instead of taking them off twice
+            rebuild_rating_summaries()
+        if deleted_count:
+            bump_catalog_version()
         
         # Return JSON response
         from django.http import JsonResponse
         return JsonResponse({
             "success": True,
-            "deleted_count": result.deleted_count,
-            "message": f"Successfully deleted {result.deleted_count} reviews"
+            "deleted_count": deleted_count,
+            "message": f"Successfully deleted {deleted_count} reviews"
         })
     
     return JsonResponse({"success": False, "message": "Invalid request method"})
@@ -148,24 +163,8 @@ def delete_all_reviews(request):
 
 from django.shortcuts import render, redirect
 from django.http import HttpResponse
-from pymongo import MongoClient
 from bson.objectid import ObjectId, InvalidId
-from users.views import manual_login_required, manual_instructor_required, load_session, save_session
-
-
-def get_mongo_connection():
-    """Helper function to establish a MongoDB connection."""
-    client = None
-    try:
-        client = MongoClient("localhost", 27017, serverSelectionTimeoutMS=5000)
-        client.admin.command('ping')
-        db = client["Peer_to_Peer_Education"]
-        return client, db
-    except Exception as e:
-        print(f"MongoDB connection error: {e}")
-        if client:
-            client.close()
-        raise Exception("Could not connect to database.")
+from users.views import manual_login_required, manual_instructor_required
 
 
 @manual_login_required
@@ -174,15 +173,14 @@ def instructor_reviews_view(request):
     """
     Displays a list of all reviews for the instructor's courses.
     """
-    client = None
     try:
-        client, db = get_mongo_connection()
+        db = get_db()
         reviews_collection = db['reviews']
         courses_collection = db['courses']
         users_collection = db['users']
 
         # Get instructor_id from the manually managed session
-        instructor_id = request.session_data.get('user_id')
+        instructor_id = request.session.get('user_id')
         if not instructor_id:
             return redirect('instructor_login')
 
@@ -209,14 +207,15 @@ def instructor_reviews_view(request):
         instructor_course_titles = {str(course['_id']): course['title'] for course in instructor_courses}
 
         # 3. Find all reviews for these courses using a proper $in query
-        reviews_cursor = reviews_collection.find(
+        reviews = list(reviews_collection.find(
             {"course_id": {"$in": instructor_course_ids}}
-        ).sort("reviewed_at", -1)
+        ).sort("reviewed_at", -1))
+        students_by_id = get_loader(request).load_many('users', [r['student_id'] for r in reviews], ['username'])
 
         reviews_list = []
         # 4. Populate student username and course title for each review
-        for review in reviews_cursor:
-            student_doc = users_collection.find_one({"_id": review['student_id']}, {"username": 1})
+        for review in reviews:
+            student_doc = students_by_id.get(review['student_id'])
             review['student_username'] = student_doc['username'] if student_doc else 'Unknown Student'
             review['course_title'] = instructor_course_titles.get(str(review['course_id']), 'Unknown Course')
             reviews_list.append(review)
@@ -228,13 +227,8 @@ def instructor_reviews_view(request):
             'reviews': reviews_list,
         }
 
-        response = render(request, 'reviews/instructor_reviews.html', context)
-        save_session(response, request.session_id, request.session_data)
-        return response
+        return render(request, 'reviews/instructor_reviews.html', context)
 
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         return HttpResponse(f"An unexpected error occurred: {e}", status=500)
-    finally:
-        if client:
-            client.close()
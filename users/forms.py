@@ -7,6 +7,11 @@ import os
 import bcrypt
 import re
 from django.conf import settings # Import settings to get MEDIA_ROOT
+from core.mongo import get_db
+from messages_app.summaries import rename_participant
+from courses.catalog import rename_instructor
+from dashboard.rollups import record_signup
+from dashboard.metrics import invalidate_dashboard_metrics
 
 def validate_password_strength(password, username=None, email=None):
     """
@@ -109,11 +114,8 @@ class InstructorRegistrationForm(forms.Form):
         if is_otp_verified != 'true':
             self.add_error('email', "Please verify your email with OTP before registering.")
 
-        connection = None
         try:
-            connection = pymongo.MongoClient("localhost", 27017)
-            db = connection["Peer_to_Peer_Education"]
-            users_collection = db["users"]
+            users_collection = get_db()["users"]
 
             if users_collection.find_one({"username": cleaned_data.get('username')}):
                 self.add_error('username', "This username is already taken.")
@@ -121,9 +123,6 @@ class InstructorRegistrationForm(forms.Form):
                 self.add_error('email', "This email is already registered.")
         except Exception as e:
             self.add_error(None, f"Database error during validation: {e}")
-        finally:
-            if connection:
-                connection.close()
         return cleaned_data
 
     def save(self, users_collection, profile_photo_path=None):
@@ -161,6 +160,8 @@ class InstructorRegistrationForm(forms.Form):
         
         # Insert the document and return the ObjectId
         result = users_collection.insert_one(user_doc)
+        record_signup(user_doc["role"], current_time)
+        invalidate_dashboard_metrics()
         return result.inserted_id
 
 class StudentRegistrationForm(forms.Form):
@@ -193,11 +194,8 @@ class StudentRegistrationForm(forms.Form):
         if is_otp_verified != 'true':
             self.add_error('email', "Please verify your email with OTP before registering.")
 
-        connection = None
         try:
-            connection = pymongo.MongoClient("localhost", 27017)
-            db = connection["Peer_to_Peer_Education"]
-            users_collection = db["users"]
+            users_collection = get_db()["users"]
 
             if users_collection.find_one({"username": cleaned_data.get('username')}):
                 self.add_error('username', "This username is already taken.")
@@ -205,9 +203,6 @@ class StudentRegistrationForm(forms.Form):
                 self.add_error('email', "This email is already registered.")
         except Exception as e:
             self.add_error(None, f"Database error during validation: {e}")
-        finally:
-            if connection:
-                connection.close()
         return cleaned_data
 
     def save(self, users_collection, profile_photo_path=None):
@@ -239,6 +234,8 @@ class StudentRegistrationForm(forms.Form):
         
         # Insert the document and return the ObjectId
         result = users_collection.insert_one(user_doc)
+        record_signup(user_doc["role"], current_time)
+        invalidate_dashboard_metrics()
         return result.inserted_id
 
 class InstructorProfileForm(forms.Form):
@@ -262,11 +259,8 @@ class InstructorProfileForm(forms.Form):
         username = cleaned_data.get('username')
         email = cleaned_data.get('email')
 
-        connection = None
         try:
-            connection = pymongo.MongoClient("localhost", 27017)
-            db = connection["Peer_to_Peer_Education"]
-            users_collection_for_validation = db['users']
+            users_collection_for_validation = get_db()["users"]
 
             if username:
                 existing_user_by_username = users_collection_for_validation.find_one(
@@ -283,9 +277,6 @@ class InstructorProfileForm(forms.Form):
                     self.add_error('email', "This email is already taken by another user.")
         except Exception as e:
             self.add_error(None, f"Database error during validation: {e}")
-        finally:
-            if connection:
-                connection.close()
         return cleaned_data
 
     def save(self, profile_photo_path=None):
@@ -303,6 +294,8 @@ class InstructorProfileForm(forms.Form):
             update_data["profile_photo"] = profile_photo_path
 
         self.users_collection.update_one({"_id": ObjectId(self.user_id)}, {"$set": update_data})
+        rename_participant(ObjectId(self.user_id), update_data["username"])
+        rename_instructor(ObjectId(self.user_id), update_data["username"])
         return True
 
 class ForgotPasswordForm(forms.Form):
@@ -310,18 +303,12 @@ class ForgotPasswordForm(forms.Form):
 
     def clean_email(self):
         email = self.cleaned_data['email']
-        connection = None
         try:
-            connection = pymongo.MongoClient("localhost", 27017)
-            db = connection["Peer_to_Peer_Education"]
-            users_collection = db['users']
+            users_collection = get_db()["users"]
             if users_collection is not None and not users_collection.find_one({"email": email, "role": "instructor"}):
                 raise forms.ValidationError("No instructor account found with this email address.")
         except Exception as e:
             raise forms.ValidationError(f"Database error during validation: {e}")
-        finally:
-            if connection:
-                connection.close()
         return email
 
 class AdminProfileForm(forms.Form):
@@ -369,11 +356,8 @@ class AdminProfileForm(forms.Form):
                 self.add_error('current_password', "Current password is incorrect.")
 
         # Check uniqueness (exclude current admin)
-        connection = None
         try:
-            connection = pymongo.MongoClient("localhost", 27017)
-            db = connection["Peer_to_Peer_Education"]
-            users_collection = db["users"]
+            users_collection = get_db()["users"]
 
             if username and self.admin_id:
                 existing_user_by_username = users_collection.find_one({
@@ -392,9 +376,6 @@ class AdminProfileForm(forms.Form):
                     self.add_error('email', "This email is already taken by another user.")
         except Exception as e:
             self.add_error(None, f"Database error during validation: {e}")
-        finally:
-            if connection:
-                connection.close()
         
         return cleaned_data
 
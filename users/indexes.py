@@ -0,0 +1,10 @@
+"""MongoDB indexes for the users collection (see `manage.py ensure_mongo_indexes`)."""
+
+INDEXES = {
+    "users": [
+        # One account per email and role; also serves the "email already registered" checks
+        {"keys": [("email", 1), ("role", 1)], "name": "email_role_unique", "unique": True},
+        {"keys": [("username", 1)], "name": "username"},
+        {"keys": [("role", 1), ("date_joined", -1)], "name": "role_date_joined"},
+    ],
+}
@@ -3,14 +3,14 @@ from django.utils import timezone
 from django.shortcuts import render, redirect
 from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_protect, csrf_exempt
-from django.core.mail import send_mail
+from core.outbox import enqueue_mail
 from django.contrib import messages
 import pymongo
+from pymongo.errors import DuplicateKeyError
 import datetime
 import random
 from django.core.files.storage import default_storage
 from bson.objectid import ObjectId
-from pymongo import MongoClient
 from django.contrib import messages
 from passlib.hash import bcrypt
 import os
@@ -18,9 +18,18 @@ import bcrypt
 from django.http import JsonResponse
 import json
 from dashboard.views import log_user_activity
-
-connection = pymongo.MongoClient("localhost", 27017)
-db = connection["Peer_to_Peer_Education"]
+from core.mongo import db
+from reviews.ratings import average_rating
+from core.loader import get_loader
+from core.jobs import enqueue_job
+from payments.ledger import record_enrollment_revenue
+from dashboard.rollups import record_enrollment, record_signup
+from dashboard.metrics import invalidate_dashboard_metrics
+from messages_app.summaries import rename_participant
+from courses import catalog
+from core import images, media_store
+from courses.snapshot import bump_catalog_version, get_catalog
+from enrollments import counters
 users_collection = db["users"]
 courses_col = db["courses"]
 users_col = db["users"]
@@ -31,36 +40,9 @@ reviews_col = db["reviews"]
 # Home Page View
 def home(request):
     """Render the home page with available courses"""
-    # Get all approved and available courses for display
-    course_query = {
-        "status": "approved",
-        "$or": [
-            {"is_available": {"$exists": False}},  # Courses created before ban feature
-            {"is_available": True}  # Courses explicitly available
-        ]
-    }
-    
-    courses_raw = courses_col.find(course_query).limit(6)  # Limit to 6 courses for home page
-    courses = []
-    
-    for course in courses_raw:
-        instructor = users_col.find_one({"_id": course["instructor_id"]}, {"username": 1})
-        
-        # Calculate dynamic rating from reviews
-        avg_rating = calculate_course_rating(str(course["_id"]))
-        
-        course_data = {
-            "id": str(course["_id"]),
-            "title": course["title"],
-            "category": course["category"],
-            "price": course["price"],
-            "photo": course["course_photo"],
-            "rating": avg_rating,
-            "description": course.get("description", "No description available"),
-            "instructor": instructor.get("username", "Unknown") if instructor else "Unknown"
-        }
-        courses.append(course_data)
-    
+    # Newest approved and available courses, from this worker's catalog snapshot (courses.snapshot)
+    courses = get_catalog().courses[:6]  # Limit to 6 courses for home page
+
     return render(request, "users/home.html", {
         "courses": courses
     })
@@ -86,7 +68,7 @@ def admin_login(request):
                 # Password is correct - login successful
                 request.session['admin_name'] = user.get("username", "")
                 request.session['admin_email'] = user.get("email", "")
-                request.session['admin_photo'] = user.get("profile_photo", "")
+                request.session['admin_photo'] = images.variant(user, "profile_photo") or ""
                 return redirect('dashboard_home')
             else:
                 # Password is incorrect
@@ -167,20 +149,8 @@ def admin_edit_profile(request):
                 # Handle profile photo upload
                 profile_photo_path = None
                 if 'profile_photo' in request.FILES:
-                    photo = request.FILES['profile_photo']
-                    photo_name = f"admin_{admin_id}_{photo.name}"
-                    photo_path = f"users/{photo_name}"
-                    full_path = os.path.join(settings.MEDIA_ROOT, photo_path)
-                    
-                    # Create directory if it doesn't exist
-                    os.makedirs(os.path.dirname(full_path), exist_ok=True)
-                    
-                    # Save the file
-                    with open(full_path, 'wb') as f:
-                        for chunk in photo.chunks():
-                            f.write(chunk)
-                    
-                    profile_photo_path = photo_path
+                    # Content-addressed media store (core.media_store)
+                    profile_photo_path = media_store.save(request.FILES['profile_photo'], 'users')
                 
                 try:
                     # Save the profile updates
@@ -191,7 +161,11 @@ def admin_edit_profile(request):
                         request.session['admin_name'] = form.cleaned_data['username']
                         request.session['admin_email'] = form.cleaned_data['email']
                         if profile_photo_path:
-                            request.session['admin_photo'] = profile_photo_path
+                            # Thumbnail and WebP variants for the avatar (core.images)
+                            variants = images.record_variants("users", ObjectId(admin_id), "profile_photo", profile_photo_path, "profile")
+                            request.session['admin_photo'] = (variants or {}).get("thumb", profile_photo_path)
+                            # Also right for a re-upload of the same photo, which counted twice
+                            media_store.release(admin_data.get('profile_photo'))
                         
                         # Log the profile update activity
                         log_user_activity(
@@ -208,9 +182,8 @@ def admin_edit_profile(request):
                         form.add_error(None, "Failed to update profile. Please try again.")
                 
                 except Exception as e:
-                    # Clean up uploaded photo if database save fails
-                    if profile_photo_path and os.path.exists(os.path.join(settings.MEDIA_ROOT, profile_photo_path)):
-                        os.remove(os.path.join(settings.MEDIA_ROOT, profile_photo_path))
+                    # Give back the uploaded photo if database save fails
+                    media_store.release(profile_photo_path)
                     form.add_error(None, f"Error updating profile: {str(e)}")
         else:
             form = AdminProfileForm(
@@ -300,77 +273,41 @@ def ban_user(request, username):
         return HttpResponse("User not found", status=404)
     if request.method == "POST":
         # ✅ Log activity with user info (not just ID)
-        db["user_activity_logs"].insert_one({
-            "user_id": user["_id"],  # still store ID, in case needed
-            "username": user["username"],
-            "role": user["role"],
-            "action": f"❌ {user['username']} ({user['role']}) was banned.",
-            "performed_by": request.session.get("admin_name", "admin"),
-            "timestamp": datetime.datetime.utcnow()
-        })
+        log_user_activity(
+            user_id=user["_id"],  # still store ID, in case needed
+            username=user["username"],
+            role=user["role"],
+            action=f"❌ {user['username']} ({user['role']}) was banned.",
+            performed_by=request.session.get("admin_name", "admin"),
+        )
         
         # Special handling for instructor ban
+        job = None
         if user["role"] == "instructor":
-            # Get instructor's courses
-            instructor_courses = list(courses_col.find({"instructor_id": user["_id"]}))
-            
-            # Get enrolled students for notification
-            enrolled_students = []
-            for course in instructor_courses:
-                course_enrollments = list(enrollments_col.find({
-                    "course_id": course["_id"],
-                    "approval_status": "Approved"
-                }))
-                for enrollment in course_enrollments:
-                    student = users_collection.find_one({"_id": enrollment["student_id"]})
-                    if student:
-                        enrolled_students.append({
-                            "email": student["email"],
-                            "username": student["username"],
-                            "course_title": course["title"]
-                        })
-            
             # Mark instructor courses as unavailable (soft delete)
-            courses_col.update_many(
+            course_count = courses_col.update_many(
                 {"instructor_id": user["_id"]},
                 {"$set": {"is_available": False, "banned_at": datetime.datetime.utcnow()}}
-            )
-            
-            # Send notifications to enrolled students
-            for student_info in enrolled_students:
-                try:
-                    send_mail(
-                        subject=f"Important Notice: Course '{student_info['course_title']}' Access Update",
-                        message=f"""Dear {student_info['username']},
-
-We regret to inform you that the instructor for your enrolled course '{student_info['course_title']}' has been banned from our platform due to policy violations.
-
-As a result:
-- The course is no longer available for new enrollments
-- You can still download and access all course materials you were enrolled in
-- Your enrollment status remains valid for downloading purposes
+            ).matched_count
+            bump_catalog_version()
 
-You can download your course materials from your student dashboard.
+            # Enrolled students are notified by the `manage.py run_jobs` worker
+            job = enqueue_job("ban_instructor", {"instructor_id": str(user["_id"])},
+                              key=f"ban_instructor:{user['_id']}")
 
-We apologize for any inconvenience caused.
-
-Best regards,
-Peer to Peer Education Team""",
-                        from_email=settings.EMAIL_HOST_USER,
-                        recipient_list=[student_info["email"]],
-                        fail_silently=True
-                    )
-                except Exception as e:
-                    print(f"Failed to send email to {student_info['email']}: {e}")
-        
         # ✅ Update user status to banned instead of deleting
-        users_collection.update_one(
-            {"_id": user["_id"]},
+        # Only the request that changes the status adjusts the rollups (no double count on a repeated POST)
+        result = users_collection.update_one(
+            {"_id": user["_id"], "is_active": {"$ne": False}},
             {"$set": {"is_active": False}}
         )
+        if result.modified_count == 1 and user.get("date_joined"):
+            # The user growth chart only counts active accounts
+            record_signup(user["role"], user["date_joined"], -1)
+        invalidate_dashboard_metrics()
         
         # Send ban notification to the user
-        send_mail(
+        enqueue_mail(
             subject="🚫 Account Banned from Peer to Peer Education",
             message="Your account has been banned due to policy violations. You can no longer access the platform.",
             from_email=settings.EMAIL_HOST_USER,
@@ -379,13 +316,12 @@ Peer to Peer Education Team""",
         )
         
         success_message = f"{user['username']}'s account has been banned and notified via email."
-        if user["role"] == "instructor":
-            course_count = courses_col.count_documents({"instructor_id": user["_id"]})
-            student_count = len(enrolled_students)
-            success_message += f" {course_count} courses have been made unavailable and {student_count} enrolled students have been notified."
-        
+        if job:
+            success_message += f" {course_count} courses have been made unavailable; their enrolled students are being notified."
+
         return render(request, "users/action_success.html", {
-            "message": success_message
+            "message": success_message,
+            "job_id": str(job["_id"]) if job else None,
         })
     return render(request, "users/ban_user.html", {"user": user})
 
@@ -398,20 +334,22 @@ def unban_user(request, username):
         return HttpResponse("User not found", status=404)
     if request.method == "POST":
         # ✅ Log activity with user info
-        db["user_activity_logs"].insert_one({
-            "user_id": user["_id"],
-            "username": user["username"],
-            "role": user["role"],
-            "action": f"✅ {user['username']} ({user['role']}) was unbanned.",
-            "performed_by": request.session.get("admin_name", "admin"),
-            "timestamp": datetime.datetime.utcnow()
-        })
+        log_user_activity(
+            user_id=user["_id"],
+            username=user["username"],
+            role=user["role"],
+            action=f"✅ {user['username']} ({user['role']}) was unbanned.",
+            performed_by=request.session.get("admin_name", "admin"),
+        )
         # ✅ Update user status to active
-        users_collection.update_one(
-            {"_id": user["_id"]},
+        result = users_collection.update_one(
+            {"_id": user["_id"], "is_active": False},
             {"$set": {"is_active": True}}
         )
-        send_mail(
+        if result.modified_count == 1 and user.get("date_joined"):
+            record_signup(user["role"], user["date_joined"])
+        invalidate_dashboard_metrics()
+        enqueue_mail(
             subject="✅ Account Reactivated - Peer to Peer Education",
             message="Your account has been reactivated. You can now access the platform again.",
             from_email=settings.EMAIL_HOST_USER,
@@ -432,20 +370,20 @@ def warn_user(request, username):
         return HttpResponse("User not found", status=404)
     if request.method == "POST":
         message = request.POST.get("message", "").strip()
-        send_mail(
+        enqueue_mail(
             subject=f"⚠️ Warning from Peer to Peer Education",
             message=message,
             from_email=settings.EMAIL_HOST_USER,
             recipient_list=[user["email"]],
             fail_silently=False
         )
-        db["user_activity_logs"].insert_one({
-            "user_id": user["_id"],
-            "action": f"⚠️ Warning sent to {user['username']} ({user['role']})",
-            "role": user["role"],
-            "performed_by": request.session.get("admin_name", "admin"),
-            "timestamp": datetime.datetime.utcnow()
-        })
+        log_user_activity(
+            user_id=user["_id"],
+            username=user["username"],
+            role=user["role"],
+            action=f"⚠️ Warning sent to {user['username']} ({user['role']})",
+            performed_by=request.session.get("admin_name", "admin"),
+        )
         return render(request, "users/action_success.html", {
             "message": f"Warning sent to {user['username']} successfully!"
         })
@@ -473,17 +411,14 @@ def student_register(request):
             profile_photo_path = None
             
             if photo:
-                photo_path = f"users/{photo.name}"
-                full_path = os.path.join(settings.MEDIA_ROOT, photo_path)
-                os.makedirs(os.path.dirname(full_path), exist_ok=True)
-                with open(full_path, "wb") as f:
-                    for chunk in photo.chunks():
-                        f.write(chunk)
-                profile_photo_path = photo_path
+                # Content-addressed media store (core.media_store)
+                profile_photo_path = media_store.save(photo, "users")
 
             try:
                 # Save user using form's save method
                 result = form.save(users_collection, profile_photo_path)
+                if profile_photo_path:
+                    images.record_variants("users", result, "profile_photo", profile_photo_path, "profile")
                 
                 # Log the new user registration
                 log_user_activity(
@@ -500,9 +435,8 @@ def student_register(request):
                 
                 return redirect("student_login")
             except Exception as e:
-                # Clean up uploaded photo if save fails
-                if profile_photo_path and os.path.exists(os.path.join(settings.MEDIA_ROOT, profile_photo_path)):
-                    os.remove(os.path.join(settings.MEDIA_ROOT, profile_photo_path))
+                # Give back the uploaded photo if save fails
+                media_store.release(profile_photo_path)
                 form.add_error(None, f"Registration failed: {str(e)}")
     else:
         form = StudentRegistrationForm()
@@ -538,7 +472,7 @@ def send_instructor_otp(request):
     request.session["instructor_otp"] = otp
     request.session["instructor_otp_email"] = email
 
-    send_mail(
+    enqueue_mail(
         subject="Your OTP Code - Instructor Registration",
         message=f"Use this OTP to verify your email for instructor registration: {otp}",
         from_email=settings.EMAIL_HOST_USER,
@@ -567,7 +501,7 @@ def send_otp(request):
     request.session["otp"] = otp
     request.session["otp_email"] = email
 
-    send_mail(
+    enqueue_mail(
         subject="Your OTP Code",
         message=f"Use this OTP to verify your email: {otp}",
         from_email=settings.EMAIL_HOST_USER,
@@ -637,7 +571,7 @@ def student_login(request):
                 request.session["student_id"] = str(user["_id"])
                 request.session["student_name"] = user["username"]
                 request.session["student_email"] = user["email"]
-                request.session["student_photo"] = user["profile_photo"]
+                request.session["student_photo"] = images.variant(user, "profile_photo")
 
                 # Log successful login
                 log_user_activity(
@@ -656,19 +590,6 @@ def student_login(request):
 
     return render(request, "users/student_login.html")
 
-# Helper function to calculate average rating for a course
-def calculate_course_rating(course_id):
-    """Calculate average rating for a course from reviews collection"""
-    try:
-        ratings = list(reviews_col.find({"course_id": ObjectId(course_id)}))
-        if ratings:
-            avg_rating = round(sum(r["rating"] for r in ratings) / len(ratings), 1)
-            return avg_rating
-        return 0.0
-    except Exception as e:
-        print(f"Error calculating rating for course {course_id}: {e}")
-        return 0.0
-
 # Student Dashboard
 def student_dashboard(request):
     if not request.session.get("student_id"):
@@ -681,35 +602,23 @@ def student_dashboard(request):
         str(e["course_id"]) for e in enrollments_col.find({"student_id": student_id})
     ]
 
-    # Category filter handling
+    # Category filter and search; filtering and paging run in MongoDB (see courses.catalog)
     selected_category = request.GET.get("category", "").strip()
-    course_query = {
-        "status": "approved",
-        "$or": [
-            {"is_available": {"$exists": False}},  # Courses created before ban feature
-            {"is_available": True}  # Courses explicitly available
-        ]
-    }
-    if selected_category:
-        course_query["category"] = selected_category
-
-    # Distinct categories list for filter dropdown
-    categories_query = {
-        "status": "approved",
-        "$or": [
-            {"is_available": {"$exists": False}},
-            {"is_available": True}
-        ]
-    }
-    categories = sorted([c for c in courses_col.distinct("category", categories_query) if c])
+    search = request.GET.get("search", "").strip()
 
-    courses_raw = courses_col.find(course_query)
+    # Categories list for filter dropdown, from the catalog snapshot (courses.snapshot)
+    categories = get_catalog().categories
+
+    courses_raw, cursor = catalog.search(
+        text=search,
+        category=selected_category or None,
+        available_only=True,  # Courses of banned instructors are hidden
+        before=request.GET.get("before"),
+    )
     courses = []
     for course in courses_raw:
-        instructor = users_col.find_one({"_id": course["instructor_id"]}, {"username": 1})
-        
-        # Calculate dynamic rating from reviews
-        avg_rating = calculate_course_rating(course["_id"])
+        # Rating summary is stored on the course
+        avg_rating = average_rating(course)
         
         course_data = {
             "id": str(course["_id"]),
@@ -717,12 +626,20 @@ def student_dashboard(request):
             "category": course["category"],
             "price": course["price"],
             "photo": course["course_photo"],
+            "thumb": images.variant(course, "course_photo"),
+            "thumb_webp": images.variant(course, "course_photo", "thumb_webp"),
             "rating": avg_rating,  # Use calculated rating instead of hardcoded
             "description": course.get("description", "No description available"),
-            "instructor": instructor.get("username", "Unknown") if instructor else "Unknown"
+            "instructor": course.get("instructor_name", "Unknown")
         }
         courses.append(course_data)
 
+    next_query = None
+    if cursor:
+        params = request.GET.copy()
+        params["before"] = cursor
+        next_query = params.urlencode()
+
     return render(request, "users/student_dashboard.html", {
         "student_name": request.session.get("student_name"),
         "student_email": request.session.get("student_email"),
@@ -731,6 +648,8 @@ def student_dashboard(request):
         "enrolled_course_ids": enrolled_course_ids,
         "categories": categories,
         "selected_category": selected_category,
+        "search": search,
+        "next_query": next_query,
     })
 
 # Edit Student Profile - add logging
@@ -781,16 +700,16 @@ def edit_student_profile(request):
 
         # Update profile photo if provided
         if photo:
-            photo_path = f"users/{photo.name}"
-            full_path = os.path.join(settings.MEDIA_ROOT, photo_path)
-            with open(full_path, "wb") as f:
-                for chunk in photo.chunks():
-                    f.write(chunk)
+            photo_path = media_store.save(photo, "users")
             update_data["profile_photo"] = photo_path
-            request.session["student_photo"] = photo_path
 
         # Save changes
         users_collection.update_one({"_id": ObjectId(student_id)}, {"$set": update_data})
+        if photo:
+            variants = images.record_variants("users", ObjectId(student_id), "profile_photo", photo_path, "profile")
+            update_data["profile_photo"] = (variants or {}).get("thumb", photo_path)
+            media_store.release(student.get("profile_photo"))
+        rename_participant(ObjectId(student_id), username)
 
         # Log profile update
         log_user_activity(
@@ -828,29 +747,40 @@ def enroll_course(request, course_id):
     if not course:
         return redirect("student_dashboard")
 
-    # Calculate average rating using helper function
-    avg_rating = calculate_course_rating(course_id)
+    # Rating summary is stored on the course
+    avg_rating = average_rating(course)
 
     if request.method == "POST":
         payment_method = request.POST.get("payment_method")
         student_id = ObjectId(request.session["student_id"])
 
-        # Add to payments collection
+        # Enrollment first: the unique student_id + course_id index turns away a
+        # duplicate (or a concurrent double submit) before anything is paid or counted
+        enrolled_at = datetime.datetime.utcnow()
+        try:
+            enrollments_col.insert_one({
+                "student_id": student_id,
+                "course_id": ObjectId(course_id),
+                "price": course["price"],
+                "enrolled_at": enrolled_at,
+                "approval_status": "Pending"
+            })
+        except DuplicateKeyError:
+            messages.info(request, "You are already enrolled in this course.")
+            return redirect("student_dashboard")
+
+        # Add to payments collection; the price is recorded once, on the enrollment
         payments_col.insert_one({
             "student_id": student_id,
             "course_id": ObjectId(course_id),
             "amount": course["price"],
             "payment_method": payment_method,
-            "paid_at": datetime.datetime.utcnow()
-        })
-
-        # Add to enrollments collection with Pending status
-        enrollments_col.insert_one({
-            "student_id": student_id,
-            "course_id": ObjectId(course_id),
-            "enrolled_at": datetime.datetime.utcnow(),
-            "approval_status": "Pending"
+            "paid_at": enrolled_at
         })
+        record_enrollment_revenue(course["price"], enrolled_at)
+        record_enrollment(course["price"], enrolled_at)
+        counters.record_enrollment(ObjectId(course_id))
+        invalidate_dashboard_metrics()
 
         # Log course enrollment
         student = users_collection.find_one({"_id": student_id})
@@ -872,7 +802,7 @@ def enroll_course(request, course_id):
     })
 
 # Pay Course and send email to instructor and student
-from django.core.mail import send_mail
+from core.outbox import enqueue_mail
 from django.conf import settings
 from django.utils import timezone
 from datetime import datetime
@@ -932,13 +862,19 @@ def pay_course(request, course_id):
             })
             print(f"Payment inserted: {payment_result.inserted_id}")
 
-            # Insert into enrollments with Pending status
+            # Insert into enrollments with Pending status; the price is recorded once, here
+            enrolled_at = datetime.datetime.utcnow()
             enrollment_result = enrollments_col.insert_one({
                 "student_id": student_id,
                 "course_id": course_oid,
-                "enrolled_at": datetime.datetime.utcnow(),
+                "price": course["price"],
+                "enrolled_at": enrolled_at,
                 "approval_status": "Pending"
             })
+            record_enrollment_revenue(course["price"], enrolled_at)
+            record_enrollment(course["price"], enrolled_at)
+            counters.record_enrollment(course_oid)
+            invalidate_dashboard_metrics()
             print(f"Enrollment inserted: {enrollment_result.inserted_id}")
 
             # --- SEND EMAILS ---
@@ -966,8 +902,8 @@ To approve this enrollment, visit: /enrollments/{str(course_oid)}/
 Regards,
 Peer to Peer Education Platform
 """
-                    send_mail(subject, message, settings.EMAIL_HOST_USER, [instructor['email']], fail_silently=False)
-                    print("Email sent to instructor")
+                    enqueue_mail(subject, message, settings.EMAIL_HOST_USER, [instructor['email']], fail_silently=False)
+                    print("Email to instructor queued")
                 except Exception as e:
                     print(f"Failed to send email to instructor: {e}")
 
@@ -987,8 +923,8 @@ Date: {paid_at_str}
 Thank you for your patience.
 Peer to Peer Education Platform
 """
-                send_mail(subject_student, message_student, settings.EMAIL_HOST_USER, [student['email']], fail_silently=False)
-                print("Pending approval email sent to student")
+                enqueue_mail(subject_student, message_student, settings.EMAIL_HOST_USER, [student['email']], fail_silently=False)
+                print("Pending approval email to student queued")
             except Exception as e:
                 print(f"Failed to send pending email to student: {e}")
 
@@ -1007,27 +943,100 @@ Peer to Peer Education Platform
 
 from django.views.decorators.http import require_GET
 
+import hashlib
+from django.utils.http import parse_etags, quote_etag
+
 # Get Course Info
-@require_GET
-def get_course_info(request, course_id):
-    course = courses_col.find_one({"_id": ObjectId(course_id)})
-    if not course:
-        return JsonResponse({"error": "Course not found"}, status=404)
+COURSE_INFO_PROJECTION = {
+    "title": 1, "course_photo": 1, "description": 1, "price": 1, "category": 1,
+    "instructor_id": 1, "instructor_name": 1, "updated_at": 1, "rating_summary": 1,
+}
+COURSE_INFO_BATCH_LIMIT = 100
 
-    # Calculate average rating using helper function
-    avg_rating = calculate_course_rating(course_id)
 
-    instructor = users_col.find_one({"_id": course["instructor_id"]}, {"username": 1})
+def _course_info_version(course):
+    """What the course info payload depends on: the course's updated_at, its rating summary and instructor name."""
+    summary = course.get("rating_summary") or {}
+    return f"{course['_id']}:{course.get('updated_at')}:{summary.get('count', 0)}:{summary.get('sum', 0)}:{course.get('instructor_name')}"
+
+
+def _course_info_etag(versions):
+    return quote_etag(hashlib.sha1("|".join(versions).encode()).hexdigest())
+
+
+def _not_modified(request, etag):
+    return etag in parse_etags(request.headers.get("If-None-Match", ""))
+
+
+def _course_info_response(payload, etag):
+    response = JsonResponse(payload)
+    response["ETag"] = etag
+    # Let the browser keep the JSON but revalidate it on every click
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
 
-    return JsonResponse({
+def _course_info(course, instructor_name):
+    return {
         "title": course["title"],
         "photo": f"/users_media/{course['course_photo']}",
         "description": course.get("description", "No description"),
         "price": course["price"],
         "category": course.get("category", "No category"),
-        "avg_rating": avg_rating,
-        "instructor": instructor.get("username") if instructor else "Unknown"
-    })
+        # Rating summary is stored on the course
+        "avg_rating": average_rating(course),
+        "instructor": instructor_name or "Unknown",
+    }
+
+
+def _instructor_names(request, courses):
+    """Instructor names of the courses; only courses saved before instructor_name existed need a lookup."""
+    missing = [c.get("instructor_id") for c in courses if not c.get("instructor_name")]
+    users = get_loader(request).load_many("users", missing, ["username"]) if missing else {}
+    return {
+        c["_id"]: c.get("instructor_name") or (users.get(c.get("instructor_id")) or {}).get("username")
+        for c in courses
+    }
+
+
+@require_GET
+def get_course_info(request, course_id):
+    if not ObjectId.is_valid(course_id):
+        return JsonResponse({"error": "Course not found"}, status=404)
+    course = courses_col.find_one({"_id": ObjectId(course_id)}, COURSE_INFO_PROJECTION)
+    if not course:
+        return JsonResponse({"error": "Course not found"}, status=404)
+
+    # Answer a revalidation before building the payload
+    etag = _course_info_etag([_course_info_version(course)])
+    if _not_modified(request, etag):
+        response = HttpResponse(status=304)
+        response["ETag"] = etag
+        return response
+
+    names = _instructor_names(request, [course])
+    return _course_info_response(_course_info(course, names[course["_id"]]), etag)
+
+
+@require_GET
+def get_courses_info(request):
+    """Course info for many courses at once: ?ids=<id>,<id>,... -> {"courses": {id: info}, "missing": [...]}"""
+    requested = [i for i in request.GET.get("ids", "").split(",") if i][:COURSE_INFO_BATCH_LIMIT]
+    ids = [ObjectId(i) for i in dict.fromkeys(requested) if ObjectId.is_valid(i)]
+    courses = list(courses_col.find({"_id": {"$in": ids}}, COURSE_INFO_PROJECTION).sort("_id", 1)) if ids else []
+
+    etag = _course_info_etag([_course_info_version(c) for c in courses])
+    if _not_modified(request, etag):
+        response = HttpResponse(status=304)
+        response["ETag"] = etag
+        return response
+
+    names = _instructor_names(request, courses)
+    found = {str(c["_id"]): _course_info(c, names[c["_id"]]) for c in courses}
+    return _course_info_response({
+        "courses": found,
+        "missing": [i for i in dict.fromkeys(requested) if i not in found],
+    }, etag)
 
 
 # Instructor Part
@@ -1040,62 +1049,18 @@ from django.contrib.auth.hashers import check_password, make_password
 import pymongo
 from bson.objectid import ObjectId, InvalidId
 import datetime
-import uuid
 import os
 from django.conf import settings
 from django.utils import timezone
 import bcrypt
 from .forms import InstructorProfileForm, InstructorRegistrationForm, ForgotPasswordForm
-
-
-def get_db():
-    """Establishes a connection to the MongoDB database."""
-    try:
-        connection = pymongo.MongoClient("localhost", 27017, serverSelectionTimeoutMS=5000)
-        connection.admin.command('ping')  # Check the connection
-        return connection["Peer_to_Peer_Education"], connection
-    except pymongo.errors.ConnectionFailure as e:
-        print(f"Error: Could not connect to MongoDB: {e}")
-        return None, None
-
-
-def load_session(request):
-    db, conn = get_db()
-    sessions_collection = db["sessions"]
-    session_id = request.COOKIES.get("sessionid")
-    session_data = {}
-    if session_id:
-        session_doc = sessions_collection.find_one({"_id": session_id})
-        if session_doc:
-            session_data = session_doc.get("data", {})
-    else:
-        session_id = str(uuid.uuid4())
-    conn.close()
-    return session_id, session_data
-
-
-def save_session(response, session_id, session_data):
-    db, conn = get_db()
-    sessions_collection = db["sessions"]
-    if sessions_collection is not None:
-        sessions_collection.update_one(
-            {"_id": session_id},
-            {"$set": {"data": session_data, "updated": datetime.datetime.utcnow()}},
-            upsert=True
-        )
-    response.set_cookie("sessionid", session_id, httponly=True)
-    conn.close()
+from core.mongo import get_db
 
 
 def manual_login_required(view_func):
     def wrapper(request, *args, **kwargs):
-        session_id, session = load_session(request)
-        if not session.get("instructor_name"):
-            response = redirect("instructor_login")
-            save_session(response, session_id, session)
-            return response
-        request.session_data = session
-        request.session_id = session_id
+        if not request.session.get("instructor_name"):
+            return redirect("instructor_login")
         return view_func(request, *args, **kwargs)
 
     return wrapper
@@ -1103,20 +1068,15 @@ def manual_login_required(view_func):
 
 def manual_instructor_required(view_func):
     def wrapper(request, *args, **kwargs):
-        session_id, session = load_session(request)
-        if session.get("role") != "instructor":
-            response = HttpResponse("Access Denied: Instructors only.", status=403)
-            save_session(response, session_id, session)
-            return response
-        request.session_data = session
-        request.session_id = session_id
+        if request.session.get("role") != "instructor":
+            return HttpResponse("Access Denied: Instructors only.", status=403)
         return view_func(request, *args, **kwargs)
 
     return wrapper
 
 
 def get_instructor_context(request):
-    session_data = request.session_data if hasattr(request, 'session_data') else load_session(request)[1]
+    session_data = request.session
     return {
         'instructor_name': session_data.get('instructor_name', ''),
         'instructor_photo': session_data.get('instructor_photo', ''),
@@ -1126,10 +1086,9 @@ def get_instructor_context(request):
 # Instructor Login - add logging
 @csrf_protect
 def instructor_login(request):
-    db, conn = get_db()
+    db = get_db()
     try:
         users_collection = db["users"]
-        session_id, session = load_session(request)
 
         if request.method == "POST":
             username = request.POST.get("username", "").strip()
@@ -1143,13 +1102,13 @@ def instructor_login(request):
             })
 
             if user_doc and bcrypt.checkpw(password.encode(), user_doc["password"].encode()):
-                session.update({
+                request.session.update({
                     "user_id": str(user_doc["_id"]),
                     "username": user_doc["username"],
                     "role": user_doc["role"],
                     "instructor_name": user_doc.get("username", ""),
                     "instructor_email": user_doc.get("email", ""),
-                    "instructor_photo": user_doc.get("profile_photo", "")
+                    "instructor_photo": images.variant(user_doc, "profile_photo") or ""
                 })
 
                 users_collection.update_one(
@@ -1166,29 +1125,20 @@ def instructor_login(request):
                     performed_by="system"
                 )
 
-                response = redirect("instructor_dashboard")
-                save_session(response, session_id, session)
-                return response
+                return redirect("instructor_dashboard")
             else:
                 context = {"error_message": "Invalid username, email, or password."}
-                response = render(request, "users/instructor_login.html", context)
-                save_session(response, session_id, session)
-                return response
+                return render(request, "users/instructor_login.html", context)
 
         context = {}
-        response = render(request, "users/instructor_login.html", context)
-        save_session(response, session_id, session)
-        return response
+        return render(request, "users/instructor_login.html", context)
     except Exception as e:
         return HttpResponse(f"Database connection error: {e}", status=500)
-    finally:
-        if conn:
-            conn.close()
 
 # Instructor Logout - add logging
 def instructor_logout(request):
-    session_id, session = load_session(request)
-    
+    session = request.session
+
     # Log logout before clearing session
     if session.get("user_id"):
         try:
@@ -1203,18 +1153,15 @@ def instructor_logout(request):
         except:
             pass  # Don't fail logout if logging fails
     
-    session.clear()
-    response = redirect("instructor_login")
-    save_session(response, session_id, session)
-    return response
+    session.flush()
+    return redirect("instructor_login")
 
 
 @csrf_protect
 def instructor_register_view(request):
-    db, conn = get_db()
+    db = get_db()
     try:
         users_collection = db["users"]
-        session_id, session = load_session(request)
 
         if request.method == 'POST':
             form = InstructorRegistrationForm(request.POST, request.FILES)
@@ -1222,24 +1169,16 @@ def instructor_register_view(request):
             if form.is_valid():
                 profile_photo_file = form.cleaned_data.get('profile_photo')
                 profile_photo_path = None
-                file_path_on_disk = None
 
                 if profile_photo_file:
-                    upload_dir = os.path.join(settings.MEDIA_ROOT, 'users_profile_photos')
-                    os.makedirs(upload_dir, exist_ok=True)
-
-                    unique_filename = f"{uuid.uuid4().hex}_{profile_photo_file.name}"
-                    file_path_on_disk = os.path.join(upload_dir, unique_filename)
-
-                    with open(file_path_on_disk, 'wb+') as destination:
-                        for chunk in profile_photo_file.chunks():
-                            destination.write(chunk)
-
-                    profile_photo_path = os.path.join('users_profile_photos', unique_filename).replace('\\', '/')
+                    # Content-addressed media store (core.media_store)
+                    profile_photo_path = media_store.save(profile_photo_file, 'users_profile_photos')
 
                 if users_collection is not None:
                     try:
                         user_id = form.save(users_collection, profile_photo_path)
+                        if profile_photo_path:
+                            images.record_variants("users", user_id, "profile_photo", profile_photo_path, "profile")
                         
                         # Log the new instructor registration
                         log_user_activity(
@@ -1252,12 +1191,9 @@ def instructor_register_view(request):
                         
                         # Add success message and redirect to login page
                         messages.success(request, f"Registration successful! Welcome {form.cleaned_data['username']}. Please login with your credentials.")
-                        response = redirect('instructor_login')
-                        save_session(response, session_id, session)
-                        return response
+                        return redirect('instructor_login')
                     except Exception as e:
-                        if file_path_on_disk and os.path.exists(file_path_on_disk):
-                            os.remove(file_path_on_disk)
+                        media_store.release(profile_photo_path)
                         form.add_error(None, str(e))
                 else:
                     form.add_error(None, "Database connection failed.")
@@ -1265,22 +1201,16 @@ def instructor_register_view(request):
             form = InstructorRegistrationForm()
 
         context = {'form': form}
-        response = render(request, 'users/instructor_register.html', context)
-        save_session(response, session_id, session)
-        return response
+        return render(request, 'users/instructor_register.html', context)
     except Exception as e:
         return HttpResponse(f"Database connection error: {e}", status=500)
-    finally:
-        if conn:
-            conn.close()
 
 
 @csrf_protect
 def forgot_password_view(request):
-    db, conn = get_db()
+    db = get_db()
     try:
         users_collection = db["users"]
-        session_id, session = load_session(request)
 
         if request.method == 'POST':
             form = ForgotPasswordForm(request.POST)
@@ -1290,35 +1220,23 @@ def forgot_password_view(request):
                     'message': f"If an account with {email} exists, a password reset link has been sent.",
                     'form': ForgotPasswordForm()
                 }
-                response = render(request, 'users/forgot_password.html', context)
-                save_session(response, session_id, session)
-                return response
+                return render(request, 'users/forgot_password.html', context)
         else:
             form = ForgotPasswordForm()
 
         context = {'form': form}
-        response = render(request, 'users/forgot_password.html', context)
-        save_session(response, session_id, session)
-        return response
+        return render(request, 'users/forgot_password.html', context)
     except Exception as e:
         return HttpResponse(f"Database connection error: {e}", status=500)
-    finally:
-        if conn:
-            conn.close()
 
 
 @manual_login_required
 @manual_instructor_required
 def instructor_dashboard_view(request):
-    db, conn = get_db()
-    if db is None:
-        return HttpResponse("Database connection failed. Please check if MongoDB is running.", status=500)
+    db = get_db()
 
     try:
-        session_id, session_data = load_session(request)
-        request.session_data = session_data
-        request.session_id = session_id
-        instructor_id = request.session_data.get("user_id")
+        instructor_id = request.session.get("user_id")
 
         if not instructor_id:
             return redirect('instructor_login')
@@ -1329,42 +1247,37 @@ def instructor_dashboard_view(request):
             return HttpResponse("Invalid user ID format. Please log in again.", status=400)
 
         courses_collection = db['courses']
-        enrollments_collection = db['enrollments']
-        earnings_summary_collection = db['instructor_earnings_summary']
 
         # Fetch instructor data for the sidebar
         context = get_instructor_context(request)
 
-        # 1. Get total course count
-        my_course_count = courses_collection.count_documents({"instructor_id": instructor_object_id})
-        context['my_course_count'] = my_course_count
-
-        # 2. Get total earnings (course earnings only - no admin salary)
-        from payments.views import get_instructor_earnings
-        earnings_summary = get_instructor_earnings(db, instructor_object_id)
-        total_earnings = earnings_summary['earnings_from_courses']
-        context['total_earnings'] = total_earnings
-
-        # 3. Get total enrollments for all of the instructor's courses
-        instructor_course_ids = [c["_id"] for c in courses_collection.find({"instructor_id": instructor_object_id}, {"_id": 1})]
-        total_enrollments = enrollments_collection.count_documents({
-            "course_id": {"$in": instructor_course_ids},
-            "approval_status": "Approved"
-        })
-        context['total_enrollments'] = total_enrollments
-
-        # 4. Get the top 3 most recent courses
-        top_courses_cursor = courses_collection.find(
-            {"instructor_id": instructor_object_id}
-        ).sort("created_at", -1).limit(3)
-        top_courses = list(top_courses_cursor)
+        from core.fanout import gather
+        from payments.balances import get_instructor_balance
+
+        # The four numbers are independent, so they are queried concurrently
+        results = gather({
+            # 1. Total course count
+            "course_count": lambda: courses_collection.count_documents({"instructor_id": instructor_object_id}),
+            # 2. Total earnings (course earnings only - no admin salary)
+            "earnings": lambda: get_instructor_balance(instructor_object_id)['earnings_from_courses'],
+            # 3. Approved enrollments across the instructor's courses (maintained counter)
+            "enrollments": lambda: counters.instructor_approved_enrollments(instructor_object_id),
+            # 4. The top 3 most recent courses
+            "top_courses": lambda: list(
+                courses_collection.find({"instructor_id": instructor_object_id}).sort("created_at", -1).limit(3)
+            ),
+        }, defaults={"course_count": 0, "earnings": 0, "enrollments": 0, "top_courses": []})
+        context['my_course_count'] = results["course_count"]
+        context['total_earnings'] = results["earnings"]
+        context['total_enrollments'] = results["enrollments"]
+        top_courses = results["top_courses"]
 
         # Convert ObjectIds to strings and set the correct photo URL for the template
         for course in top_courses:
             course['id_str'] = str(course['_id'])
             # Here is the fix: Check if the photo field is a non-empty string.
             # The database field is correctly named 'course_photo'.
-            photo_path = course.get('course_photo')
+            photo_path = images.variant(course, 'course_photo')
             if photo_path and photo_path.strip():
                 # Correctly set the full URL for the template
                 course['photo_url'] = photo_path
@@ -1374,38 +1287,28 @@ def instructor_dashboard_view(request):
 
         context['top_courses'] = top_courses
 
-        response = render(request, "users/instructor_dashboard.html", context)
-        save_session(response, request.session_id, request.session_data)
-        return response
+        return render(request, "users/instructor_dashboard.html", context)
 
     except Exception as e:
         print(f"FATAL ERROR in instructor_dashboard_view: {e}")
         return HttpResponse("An internal server error occurred. Please check the server logs for details.", status=500)
-    finally:
-        if conn:
-            conn.close()
 
 # Instructor Profile View - add logging for profile updates
 @csrf_protect
 @manual_login_required
 @manual_instructor_required
 def instructor_profile_view(request):
-    db, conn = get_db()
+    db = get_db()
     try:
         users_collection = db["users"]
-        session_id, session_data = load_session(request)
-        request.session_data = session_data
-        request.session_id = session_id
 
-        user_id = request.session_data.get("user_id")
+        user_id = request.session.get("user_id")
         user_doc = None
         if users_collection is not None:
             user_doc = users_collection.find_one({"_id": ObjectId(user_id)})
 
         if not user_doc:
-            response = Http404("User not found.")
-            save_session(response, session_id, session_data)
-            return response
+            return Http404("User not found.")
 
         initial_data = {
             "username": user_doc.get("username"),
@@ -1421,26 +1324,17 @@ def instructor_profile_view(request):
                 profile_photo_path = user_doc.get('profile_photo')
 
                 if profile_photo_file:
-                    upload_dir = os.path.join(settings.MEDIA_ROOT, 'users_profile_photos')
-                    os.makedirs(upload_dir, exist_ok=True)
-
-                    unique_filename = f"{uuid.uuid4().hex}_{profile_photo_file.name}"
-                    file_path_on_disk = os.path.join(upload_dir, unique_filename)
-
-                    from PIL import Image
-                    img = Image.open(profile_photo_file)
-                    img.save(file_path_on_disk)
-
-                    profile_photo_path = os.path.join('users_profile_photos', unique_filename).replace('\\', '/')
-
-                    old_photo_path = user_doc.get('profile_photo')
-                    if old_photo_path and old_photo_path != 'users/default.jpg':
-                        old_file_path_on_disk = os.path.join(settings.MEDIA_ROOT, old_photo_path)
-                        if os.path.exists(old_file_path_on_disk):
-                            os.remove(old_file_path_on_disk)
+                    # Content-addressed media store (core.media_store)
+                    profile_photo_path = media_store.save(profile_photo_file, 'users_profile_photos')
 
                 try:
                     form.save(profile_photo_path=profile_photo_path)
+                    if profile_photo_file:
+                        variants = images.record_variants("users", ObjectId(user_id), "profile_photo", profile_photo_path, "profile")
+                        instructor_photo = (variants or {}).get("thumb", profile_photo_path)
+                        media_store.release(user_doc.get('profile_photo'))
+                    else:
+                        instructor_photo = images.variant(user_doc, "profile_photo")
                     
                     # Log profile update
                     log_user_activity(
@@ -1451,16 +1345,16 @@ def instructor_profile_view(request):
                         performed_by="system"
                     )
                     
-                    request.session_data.update({
+                    request.session.update({
                         "username": form.cleaned_data["username"],
                         "instructor_name": form.cleaned_data["username"],
                         "instructor_email": form.cleaned_data["email"],
-                        "instructor_photo": profile_photo_path
+                        "instructor_photo": instructor_photo
                     })
-                    response = redirect("instructor_profile")
-                    save_session(response, request.session_id, request.session_data)
-                    return response
+                    return redirect("instructor_profile")
                 except Exception as e:
+                    if profile_photo_file:
+                        media_store.release(profile_photo_path)
                     form.add_error(None, str(e))
         else:
             form = InstructorProfileForm(initial=initial_data, user_id=user_id, users_collection=users_collection)
@@ -1471,11 +1365,6 @@ def instructor_profile_view(request):
             **get_instructor_context(request)
         }
 
-        response = render(request, "users/instructor_profile.html", context)
-        save_session(response, request.session_id, request.session_data)
-        return response
+        return render(request, "users/instructor_profile.html", context)
     except Exception as e:
         return HttpResponse(f"Database connection error: {e}", status=500)
-    finally:
-        if conn:
-            conn.close()